@@ -1,7 +1,26 @@
+import time
+import threading
 import lib.shared.rcon as rcon
 import lib.shared.colors as colors
 import godfingerinterface
 
+# Parses a colour stripped cvarlist line, "S A    name = "value"", returns ( flags, name, value ) or None for headers and totals
+def ParseCvarlistLine(line : str) -> tuple:
+    quoteStart = line.find("\"")
+    if quoteStart == -1:
+        return None
+    quoteEnd = line.rfind("\"")
+    value = line[quoteStart+1:quoteEnd] if quoteEnd > quoteStart else line[quoteStart+1:]
+    tokens = line[:quoteStart].split()
+    if len(tokens) > 0 and tokens[-1] == "=":
+        tokens.pop()
+    if len(tokens) == 0:
+        return None
+    flags = 0
+    for flag in tokens[:-1]:
+        flags |= Cvar.Flags.CharToFlag(flag)
+    return (flags, tokens[-1], value)
+
 class Cvar():
 
     CVAR_NONE           = 0x00000000
@@ -61,6 +80,7 @@ class Cvar():
         self._flags = Cvar.Flags()
         self._name = ""
         self._val = ""
+        self._updated = time.time() # last time the value was known to match the server
     
     def IsFlag(self, flag):
         return (self._flags.field & flag) == flag
@@ -75,22 +95,25 @@ class Cvar():
         s = str(v)
         if s != None:
             if self._val != s:
+                old = self._val
                 self._val = s
-                self._manager.OnCvarChange(self)
+                self._updated = time.time()
+                self._manager.OnCvarChange(self, old)
+
+    # value observed on the server, updates the local copy without writing it back
+    def _SetFromServer(self, v : str):
+        self._val = v
+        self._updated = time.time()
+
+    def GetAge(self) -> float:
+        return time.time() - self._updated
 
     def FromCvarlistString(self, cvarStr):
-        splitvarname = cvarStr.split("\"")
-        for s in splitvarname:
-            if s == "":
-                splitvarname.remove(s)
-        if len(splitvarname) > 0:
-            splitVar = splitvarname[0].split()
-            if len(splitVar) > 1:
-                flagsList = splitVar[0:-2]
-                for flag in flagsList:
-                    self._flags.field |= Cvar.Flags.CharToFlag(flag)
-                self._name = splitVar[-2]
-                self._val = splitvarname[-1]
+        parsed = ParseCvarlistLine(cvarStr)
+        if parsed != None:
+            self._flags.field |= parsed[0]
+            self._name = parsed[1]
+            self._val = parsed[2]
 
     def __str__(self):
         return f"Cvar {self._name} : {self._val} {self._flags}"
@@ -100,9 +123,28 @@ class Cvar():
 
 
 class CvarManager():
-    def __init__(self, iface : godfingerinterface.IServerInterface):
+    """
+    Authoritative cache of server cvars, seeded from cvarlist, refreshed from InitGame serverinfo and from writes done through the interface.
+    Values that can change out of band expire after a per-cvar TTL, expired or unknown cvars are read through the interface.
+    Lookups are case insensitive, like in the engine.
+    """
+
+    DEFAULT_TTL = 30.0
+    BATCH_VSTR = "gfcvarbatch" # server side cvar used as storage for batched writes
+
+    def __init__(self, iface : godfingerinterface.IServerInterface, defaultTtl : float = DEFAULT_TTL, ttls : dict[str, float] = None):
         self._cvars = dict[str, Cvar]()
+        self._index = dict[str, Cvar]() # lowercase name -> cvar
+        self._lock = threading.RLock()
         self._iface = iface
+        self._defaultTtl = defaultTtl
+        self._ttls = {k.lower() : v for k, v in ttls.items()} if ttls != None else {}
+        self._hits = 0
+        self._misses = 0
+        self._pendingChanges = dict[str, tuple]() # name -> ( old, new ), coalesced until PopChanges
+        self._cvarlistLines = dict[str, tuple]() # raw cvarlist line -> ( cvar, value ) from the previous fetch
+        if self._iface != None and hasattr(self._iface, "SetCvarCache"):
+            self._iface.SetCvarCache(self)
     
     def Initialize(self) -> bool:
         if self._iface == None:
@@ -111,33 +153,196 @@ class CvarManager():
             self._FetchCvars()
             return True
 
-    def _FetchCvars(self):
+    def _FetchCvars(self) -> dict[str, tuple]:
+        """
+        Diffs a fresh cvarlist against the known cvars in place, only new cvars are allocated. Returns the changes.
+        Lines identical to the previous fetch are matched by their text and skip parsing entirely.
+        """
+        changes = {}
         cvarStr = self._iface.CvarList()
         if cvarStr != "" and cvarStr != None:
             cvarsStr = colors.StripColorCodes(cvarStr)
-            parsed = {}
-            splitted = cvarsStr.splitlines()
-            for line in splitted:
-                cv = Cvar(self)
-                cv.FromCvarlistString(line)
-                parsed[cv.GetName()] = cv
-            for name in parsed:
-                if name not in self._cvars:
-                    self._cvars[name] = parsed[name]
-                else:
-                    self._cvars[name].SetValue(parsed[name].GetValue())
+            now = time.time()
+            with self._lock:
+                isInitial = len(self._cvars) == 0
+                previousLines = self._cvarlistLines
+                lines = {}
+                for line in cvarsStr.splitlines():
+                    known = previousLines.get(line)
+                    if known != None and known[0]._val == known[1]:
+                        known[0]._updated = now
+                        lines[line] = known
+                        continue
+                    parsed = ParseCvarlistLine(line)
+                    if parsed == None:
+                        continue
+                    flags, name, value = parsed
+                    cv = self._cvars.get(name)
+                    if cv == None:
+                        cv = self._Find(name)
+                    if cv == None:
+                        cv = Cvar(self)
+                        cv._flags.field = flags
+                        cv._name = name
+                        cv._val = value
+                        self._AddCvar(cv)
+                        if not isInitial:
+                            changes[name] = (None, value)
+                    elif cv._val != value:
+                        changes[cv._name] = (cv._val, value)
+                        cv._val = value
+                    cv._updated = now
+                    lines[line] = (cv, value)
+                self._cvarlistLines = lines
+                for name in changes:
+                    self._RecordChange(name, changes[name][0], changes[name][1])
+        return changes
+
+    def Refresh(self) -> dict[str, tuple]:
+        """ Re-reads cvarlist, returns { name : ( old, new ) } for every cvar that changed or appeared. """
+        if self._iface == None:
+            return {}
+        return self._FetchCvars()
+
+    def _RecordChange(self, name : str, old : str, new : str):
+        if old == new:
+            return
+        if name in self._pendingChanges:
+            old = self._pendingChanges[name][0]
+            if old == new:
+                del self._pendingChanges[name]
+                return
+        self._pendingChanges[name] = (old, new)
+
+    def PopChanges(self) -> dict[str, tuple]:
+        """ Returns and clears the changes accumulated since the last call, { name : ( old, new ) }. """
+        with self._lock:
+            changes = self._pendingChanges
+            self._pendingChanges = dict[str, tuple]()
+            return changes
+
+    def _AddCvar(self, cv : Cvar):
+        self._cvars[cv.GetName()] = cv
+        self._index[cv.GetName().lower()] = cv
+
+    def _Find(self, name : str) -> Cvar:
+        return self._index.get(name.lower())
 
     def GetAllCvars(self) -> dict[str, Cvar]:
-        return self._cvars.copy()
+        with self._lock:
+            return self._cvars.copy()
 
     def GetCvar(self, name : str) -> Cvar:
-        if self.IsCvar(name):
-            return self._cvars[name]
-        else:
-            return None
+        with self._lock:
+            return self._Find(name)
 
     def IsCvar(self, name : str) -> bool:
-        return name in self._cvars
+        with self._lock:
+            return self._Find(name) != None
+
+    def GetTtl(self, name : str) -> float:
+        return self._ttls.get(name.lower(), self._defaultTtl)
+
+    def SetTtl(self, name : str, ttl : float):
+        """ ttl in seconds, None never expires, 0 always reads through """
+        self._ttls[name.lower()] = ttl
+
+    def GetCachedValue(self, name : str) -> str:
+        """ Returns the cached value if it's known and not expired, None otherwise, counts hits and misses. """
+        with self._lock:
+            cv = self._Find(name)
+            ttl = self.GetTtl(name)
+            if cv != None and (ttl == None or cv.GetAge() < ttl):
+                self._hits += 1
+                return cv.GetValue()
+            self._misses += 1
+            return None
+
+    def GetValue(self, name : str, fresh : bool = False) -> str:
+        """ Cached value of a cvar, read through the interface when it's unknown, expired, or fresh is requested. """
+        if not fresh:
+            value = self.GetCachedValue(name)
+            if value != None:
+                return value
+        return self._iface.GetCvar(name, fresh = True)
+
+    def SetCvar(self, name : str, value : str):
+        self._iface.SetCvar(name, str(value))
+
+    @staticmethod
+    def _IsBatchable(value : str) -> bool:
+        # the engine re-tokenizes vstr contents, anything the tokenizer would alter has to go through a plain set
+        if len(value) == 0 or value.strip() != value or "  " in value:
+            return False
+        if "//" in value or "/*" in value:
+            return False
+        return not any(ch in value for ch in "\";\n\r\t")
+
+    def SetCvars(self, cvars : dict[str, str], vstrStorage : str = BATCH_VSTR):
+        """
+        Writes many cvars with a single vstr batch instead of one request per cvar.
+        Values that can't be expressed inside a vstr ( quotes, semicolons, line breaks ) are sent one by one.
+        """
+        batch = []
+        single = {}
+        for name, value in cvars.items():
+            value = str(value)
+            if not CvarManager._IsBatchable(value):
+                single[name] = value
+            else:
+                batch.append("set %s %s" % (name, value))
+        if len(batch) > 0:
+            self._iface.BatchExecute(vstrStorage, batch)
+            for name, value in cvars.items():
+                if name not in single:
+                    self.OnCvarObserved(name, str(value))
+        for name, value in single.items():
+            self._iface.SetCvar(name, value)
+
+    def OnCvarObserved(self, name : str, value : str):
+        """ Called by the interface whenever a cvar value is read from or written to the server. """
+        if value == None:
+            return
+        value = str(value)
+        with self._lock:
+            cv = self._Find(name)
+            if cv == None:
+                cv = Cvar(self)
+                cv._name = name
+                self._AddCvar(cv)
+                self._RecordChange(name, None, value)
+            else:
+                self._RecordChange(cv._name, cv._val, value)
+            cv._SetFromServer(value)
+
+    def OnServerInfo(self, vars : dict[str, str]):
+        """ InitGame carries the full serverinfo string, every cvar in it is current as of the map load. """
+        with self._lock:
+            for name, value in vars.items():
+                cv = self._Find(name)
+                if cv == None:
+                    cv = Cvar(self)
+                    cv._name = name
+                    cv._flags.field |= Cvar.CVAR_SERVERINFO
+                    self._AddCvar(cv)
+                    self._RecordChange(name, None, value)
+                else:
+                    self._RecordChange(cv._name, cv._val, value)
+                cv._SetFromServer(value)
+
+    def Invalidate(self, name : str = None):
+        """ Expires one cvar, or all of them if name is None, next read goes to the server. """
+        with self._lock:
+            targets = self._cvars.values() if name == None else [self._Find(name)]
+            for cv in targets:
+                if cv != None:
+                    cv._updated = 0
+
+    def GetCacheStats(self) -> dict:
+        with self._lock:
+            return { "hits" : self._hits, "misses" : self._misses, "size" : len(self._cvars) }
 
-    def OnCvarChange(self, cvar : Cvar):
+    def OnCvarChange(self, cvar : Cvar, oldValue : str = None):
+        with self._lock:
+            self._RecordChange(cvar.GetName(), oldValue, cvar.GetValue())
         self._iface.SetCvar(cvar.GetName(), cvar.GetValue())
@@ -1,11 +1,110 @@
+import logging
+import queue
 import sqlite3
-# import mysql.connector
+import threading
+import time
+from collections import deque, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import lib.shared.lazyimport as lazyimport
 
+asyncio = lazyimport.LazyModule("asyncio") # only AsyncSubmit needs it
+mysqlconnector = lazyimport.LazyModule("mysql.connector") # optional, only the MySQL backend needs it and DatabaseMySQL.Open reports it missing
+
+Log = logging.getLogger(__name__)
+
+# statements that only change data or schema, these can be deferred in write-behind mode
+MUTATING_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER")
+
+# statements that are safe to run on a pooled read connection
+READ_STATEMENTS = ("SELECT", "EXPLAIN")
+
+def _FirstKeyword(query : str) -> str:
+    words = query.lstrip().split(None, 1)
+    return words[0].upper() if len(words) > 0 else ""
+
+def IsMutatingQuery(query : str) -> bool:
+    return _FirstKeyword(query) in MUTATING_STATEMENTS
+
+def IsReadQuery(query : str) -> bool:
+    return _FirstKeyword(query) in READ_STATEMENTS
+
+DEFAULT_WORKERS = 4
+
+# Shared pool that runs submitted queries, created on first use
+_workerPool : ThreadPoolExecutor = None
+_workerPoolLock = threading.Lock()
+
+def GetWorkerPool() -> ThreadPoolExecutor:
+    global _workerPool
+    with _workerPoolLock:
+        if _workerPool == None:
+            _workerPool = ThreadPoolExecutor(max_workers=DEFAULT_WORKERS, thread_name_prefix="DatabaseWorker")
+        return _workerPool
+
+def ShutdownWorkers(wait : bool = True):
+    """ Finishes the queries already submitted and stops the pool, a later Submit starts a new one. """
+    global _workerPool
+    with _workerPoolLock:
+        pool = _workerPool
+        _workerPool = None
+    if pool != None:
+        pool.shutdown(wait=wait)
+
+class CallbackDispatcher():
+    """
+    Hands completed query futures back to the thread that owns the callbacks.
+    Worker threads Post, the owner calls Dispatch from its own loop and the callbacks run there.
+    """
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def Post(self, callback, future : Future):
+        self._queue.put((callback, future))
+
+    def Dispatch(self) -> int:
+        count = 0
+        while True:
+            try:
+                callback, future = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(future)
+            except Exception as ex:
+                Log.error("Exception in database callback %s : %s" % (str(callback), str(ex)))
+            count += 1
+        return count
+
+# Godfinger dispatches this one on the main loop, before plugins loop, so callbacks run where OnEvent / OnLoop do
+MainDispatcher = CallbackDispatcher()
 
 class ADatabase():
-    def __init__(self, path : str, name : str):
+    """
+    Base of the database backends.
+
+    With writeBehind enabled, mutating statements that don't ask for a response are queued and applied by a writer thread,
+    grouped into one transaction per flushInterval seconds or per batchSize statements, whichever comes first.
+    Reads issued afterwards see the queued writes, Flush() commits immediately, Close() flushes before closing.
+    """
+
+    DEFAULT_FLUSH_INTERVAL = 0.5
+    DEFAULT_BATCH_SIZE = 256
+
+    def __init__(self, path : str, name : str, writeBehind : bool = False, flushInterval : float = DEFAULT_FLUSH_INTERVAL, batchSize : int = DEFAULT_BATCH_SIZE):
         self._name : str = name
         self._path : str = path
+        self._writeBehind = writeBehind
+        self._flushInterval = flushInterval
+        self._batchSize = batchSize
+        self._pending = deque() # ( query, params, isMany ) waiting for the writer
+        self._wakeup = threading.Event()
+        self._writer = None
+        self._writerStop = False
+        self._commits = 0
+        self._statementsWritten = 0
+        self._flushTimeTotal = 0.0
+        self._flushTimeMax = 0.0
+        self._flushTimeLast = 0.0
 
     def IsOpened(self) -> bool:
         pass
@@ -16,8 +115,41 @@ class ADatabase():
     def Close(self):
         pass
 
-    def ExecuteQuery(self, query : str):
+    def ExecuteQuery(self, query : str, withResponse = False, params = None) -> list[any]:
+        """
+        Executes a single statement, params binds values to "?" placeholders, a tuple or a list.
+        Prefer params over formatting values into the query, bound statements are parsed once and reused from the statement cache.
+        """
+        pass
+
+    def ExecuteMany(self, query : str, seqOfParams) -> None:
+        """ Executes one statement for every params tuple in seqOfParams. """
         pass
+
+    def ExecuteTransaction(self, statements : list[tuple]) -> bool:
+        """
+        Executes ( query, params ) pairs in a single transaction, params can be None.
+        Either all of them are committed or, if one fails, none, returns whether they were committed.
+        Deferred writes are flushed first, the transaction isn't deferred.
+        """
+        return False
+
+    def Submit(self, query : str, *, withResponse = True, params = None, callback = None, dispatcher : CallbackDispatcher = None) -> Future:
+        """
+        Runs ExecuteQuery on the database worker pool and returns a Future of its result.
+        Arguments after query are keyword only, in ExecuteQuery order, so a positional ExecuteQuery call can't bind to the wrong one.
+        callback( future ) is called once it's done, from dispatcher ( MainDispatcher by default, the plugin loop thread )
+        rather than from the worker thread, so it can safely touch plugin state and the server interface.
+        """
+        future = GetWorkerPool().submit(self.ExecuteQuery, query, withResponse, params)
+        if callback != None:
+            target = MainDispatcher if dispatcher == None else dispatcher
+            future.add_done_callback(lambda done : target.Post(callback, done))
+        return future
+
+    async def ExecuteQueryAsync(self, query : str, *, withResponse = True, params = None) -> list[any]:
+        """ Awaitable Submit for asyncio plugins, the result is delivered on the awaiting event loop. """
+        return await asyncio.wrap_future(self.Submit(query, withResponse = withResponse, params = params))
     
     def FetchQuery(self):
         print("Fetch query unimplemented")
@@ -25,14 +157,95 @@ class ADatabase():
     def LoadExtension(self, extpath : str):
         pass
 
+    def Flush(self):
+        """ Commits deferred writes, no-op for databases that write through. """
+        pass
+
+    def GetStats(self) -> dict:
+        return {
+            "name" : self._name,
+            "writeBehind" : self._writeBehind,
+            "pending" : len(self._pending),
+            "commits" : self._commits,
+            "statementsWritten" : self._statementsWritten,
+            "flushTimeLastMs" : self._flushTimeLast * 1000,
+            "flushTimeAvgMs" : (self._flushTimeTotal / self._commits * 1000) if self._commits > 0 else 0.0,
+            "flushTimeMaxMs" : self._flushTimeMax * 1000,
+        }
+
     def GetName(self) -> str:
         return self._name
 
-# Good enough, but not good in general.
+    def _Defer(self, query : str, params, isMany : bool):
+        self._pending.append((query, params, isMany))
+        if len(self._pending) >= self._batchSize:
+            self._wakeup.set()
+
+    def _RecordCommit(self, elapsed : float, statements : int):
+        self._commits += 1
+        self._statementsWritten += statements
+        self._flushTimeLast = elapsed
+        self._flushTimeTotal += elapsed
+        if elapsed > self._flushTimeMax:
+            self._flushTimeMax = elapsed
+
+    def _StartWriter(self):
+        if self._writeBehind and self._writer == None:
+            self._writerStop = False
+            self._writer = threading.Thread(target=self._WriterThreadHandler, daemon=True, name="%s writer %s" % (type(self).__name__, self._name))
+            self._writer.start()
+
+    def _StopWriter(self):
+        if self._writer != None:
+            self._writerStop = True
+            self._wakeup.set()
+            self._writer.join()
+            self._writer = None
+
+    def _WriterThreadHandler(self):
+        while not self._writerStop:
+            self._wakeup.wait(self._flushInterval)
+            self._wakeup.clear()
+            try:
+                self.Flush()
+            except Exception as ex:
+                Log.error("Write-behind flush failed on %s : %s" % (self._name, str(ex)))
+
 class DatabaseLite(ADatabase):
-    def __init__(self, path : str, name : str):
-        super().__init__(path, name)
+    """
+    SQLite database.
+
+    In write-behind mode every statement that isn't deferred first applies the queued ones on the same connection,
+    so reads see pending writes even before they are committed.
+
+    There is a single writer connection, shared by every thread under a lock, and one read connection per thread
+    that runs SELECTs while nothing is pending, so plugin threads read concurrently with each other and with the writer.
+    Every connection gets the pragma profile, by default WAL with synchronous=NORMAL which makes commits cheap
+    and lets readers run alongside the writer. Profile keys other than PROFILE_PRAGMAS are ignored.
+    """
+
+    DEFAULT_STATEMENT_CACHE_SIZE = 256
+    PROFILE_PRAGMAS = ("journal_mode", "synchronous", "mmap_size", "cache_size", "busy_timeout", "temp_store", "foreign_keys")
+    DEFAULT_PROFILE = {
+        "journal_mode" : "WAL",
+        "synchronous" : "NORMAL",
+        "mmap_size" : 64 * 1024 * 1024,
+        "cache_size" : -8192, # negative is KiB
+        "busy_timeout" : 5000, # ms
+    }
+
+    def __init__(self, path : str, name : str, writeBehind : bool = False, flushInterval : float = ADatabase.DEFAULT_FLUSH_INTERVAL, batchSize : int = ADatabase.DEFAULT_BATCH_SIZE, statementCacheSize : int = DEFAULT_STATEMENT_CACHE_SIZE, profile : dict = None):
+        super().__init__(path, name, writeBehind, flushInterval, batchSize)
         self._connection = None
+        self._profile = DatabaseLite.DEFAULT_PROFILE if profile == None else profile
+        self._isMemory = path == ":memory:" or path.startswith("file::memory:") # every connection would get its own database
+        self._local = threading.local() # per thread read connection
+        self._readConnections = [] # ( thread, connection ) of all read connections, closed with the database
+        self._readLock = threading.Lock()
+        self._generation = 0 # bumped on close so threads drop read connections of a previous Open
+        self._statementCacheSize = statementCacheSize # bounded LRU of compiled statements kept by the sqlite3 module, keyed by query text
+        self._lock = threading.RLock() # guards the connection, shared by the caller threads and the writer
+        self._uncommitted = 0 # statements applied since the last commit
 
     def IsOpened(self) -> bool:
         return self._connection != None
@@ -40,37 +253,183 @@ class DatabaseLite(ADatabase):
     def Open(self) -> bool:
         if self.IsOpened():
             self.Close()
-        self._connection = sqlite3.connect(self._path)
+        # the writer thread shares the connection, access is serialized by self._lock
+        self._connection = self._Connect()
         if self.IsOpened():
+            self._StartWriter()
             return True
         else:
             return False
 
     def Close(self):
         if self.IsOpened():
-            self._connection.close()
-            self._connection = None
+            self._StopWriter()
+            self.Flush()
+            with self._readLock:
+                self._generation += 1
+                for thread, connection in self._readConnections:
+                    connection.close()
+                self._readConnections.clear()
+            with self._lock:
+                self._connection.close()
+                self._connection = None
 
-    def ExecuteQuery(self, query : str, withResponse = False) -> list[any]:
-        if self.IsOpened():
-            cursor = self._connection.cursor()
+    def _Connect(self) -> sqlite3.Connection:
+        # connections are shared or closed across threads, access is serialized by the owner
+        connection = sqlite3.connect(self._path, check_same_thread = False, cached_statements = self._statementCacheSize)
+        for pragma in DatabaseLite.PROFILE_PRAGMAS:
+            if pragma in self._profile:
+                value = self._profile[pragma]
+                if pragma == "journal_mode" and self._isMemory:
+                    continue
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, int) or (isinstance(value, str) and value.isalnum()):
+                    connection.execute("PRAGMA %s = %s" % (pragma, value))
+                else:
+                    Log.warning("Ignoring invalid value %s for pragma %s on %s" % (str(value), pragma, self._name))
+        return connection
+
+    def _GetReadConnection(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, "generation", -1) != self._generation or local.connection == None:
+            with self._readLock:
+                # connections of threads that have exited are never used again
+                alive = []
+                for thread, connection in self._readConnections:
+                    if thread.is_alive():
+                        alive.append((thread, connection))
+                    else:
+                        connection.close()
+                self._readConnections = alive
+                local.connection = self._Connect()
+                local.generation = self._generation
+                self._readConnections.append((threading.current_thread(), local.connection))
+        return local.connection
+
+    def _ExecuteRead(self, query : str, params) -> list[any]:
+        cursor = self._GetReadConnection().cursor()
+        if params == None:
             cursor.execute(query)
-            self._connection.commit()
-            if withResponse:
-                a = cursor.fetchall()
-                cursor.close()
-                return a
-            else:
-                cursor.close()
+        else:
+            cursor.execute(query, params)
+        result = cursor.fetchall()
+        cursor.close()
+        return result
+
+    def ExecuteQuery(self, query : str, withResponse = False, params = None) -> list[any]:
+        if self.IsOpened():
+            if self._writeBehind and not withResponse and IsMutatingQuery(query):
+                self._Defer(query, params, False)
+                return None
+            # pending or uncommitted writes are only visible on the writer connection. Checked without the lock,
+            # _ApplyPending counts a statement as uncommitted before it leaves the queue, so one in flight is never missed
+            if withResponse and not self._isMemory and len(self._pending) == 0 and self._uncommitted == 0 and IsReadQuery(query):
+                return self._ExecuteRead(query, params)
+            with self._lock:
+                self._ApplyPending()
+                cursor = self._connection.cursor()
+                if params == None:
+                    cursor.execute(query)
+                else:
+                    cursor.execute(query, params)
+                if not self._writeBehind:
+                    self._uncommitted += 1
+                    self._Commit()
+                elif IsMutatingQuery(query):
+                    self._uncommitted += 1
+                if withResponse:
+                    a = cursor.fetchall()
+                    cursor.close()
+                    return a
+                else:
+                    cursor.close()
+                    return None
+        return None
+
+    def ExecuteMany(self, query : str, seqOfParams) -> None:
+        if self.IsOpened():
+            if self._writeBehind and IsMutatingQuery(query):
+                self._Defer(query, list(seqOfParams), True)
                 return None
+            with self._lock:
+                self._ApplyPending()
+                self._connection.executemany(query, seqOfParams)
+                self._uncommitted += 1
+                if not self._writeBehind:
+                    self._Commit()
         return None
 
+    def ExecuteTransaction(self, statements : list[tuple]) -> bool:
+        if not self.IsOpened():
+            return False
+        with self._lock:
+            self.Flush()
+            try:
+                # explicit BEGIN, the sqlite3 module doesn't open a transaction on its own for DDL
+                self._connection.execute("BEGIN")
+                for query, params in statements:
+                    if params == None:
+                        self._connection.execute(query)
+                    else:
+                        self._connection.execute(query, params)
+                    self._uncommitted += 1
+                self._Commit()
+                return True
+            except sqlite3.Error as ex:
+                self._connection.rollback()
+                self._uncommitted = 0
+                Log.error("Transaction failed on %s, rolled back : %s" % (self._name, str(ex)))
+                return False
+
+    # executes queued statements inside the open transaction, caller holds self._lock
+    def _ApplyPending(self):
+        while len(self._pending) > 0:
+            query, params, isMany = self._pending[0]
+            self._uncommitted += 1
+            self._pending.popleft()
+            try:
+                if isMany:
+                    self._connection.executemany(query, params)
+                elif params == None:
+                    self._connection.execute(query)
+                else:
+                    self._connection.execute(query, params)
+            except sqlite3.Error as ex:
+                Log.error("Deferred statement failed on %s : %s ( %s )" % (self._name, str(ex), query))
+
+    def Flush(self):
+        if not self.IsOpened():
+            return
+        with self._lock:
+            if self._connection == None:
+                return
+            self._ApplyPending()
+            if self._uncommitted == 0 and not self._connection.in_transaction:
+                return
+            self._Commit()
+
+    # caller holds self._lock
+    def _Commit(self):
+        start = time.perf_counter()
+        self._connection.commit()
+        self._RecordCommit(time.perf_counter() - start, self._uncommitted)
+        self._uncommitted = 0
+
+    def GetStats(self) -> dict:
+        with self._lock:
+            stats = super().GetStats()
+            stats["pending"] += self._uncommitted
+            stats["readConnections"] = len(self._readConnections)
+            return stats
+
     def LoadExtension(self, extpath : str):
         if self.IsOpened():
             print("Loading db ext : " + extpath)
-            self._connection.enable_load_extension(True)
-            self._connection.load_extension(extpath)
-            self._connection.enable_load_extension(False)
+            with self._lock:
+                self._connection.enable_load_extension(True)
+                self._connection.load_extension(extpath)
+                self._connection.enable_load_extension(False)
 
 class DatabaseMySQL(ADatabase):
     """
@@ -82,54 +441,383 @@ class DatabaseMySQL(ADatabase):
     - user: MySQL username
     - password: MySQL password
     - database: Database name
+
+    Queries run on a bounded pool of connections, opened on demand. A connection idle for longer than HEALTH_CHECK_INTERVAL
+    is pinged before use, a connection that fails is dropped and the statement retried on a new one.
+    New connections back off exponentially while the server is unreachable, queries fail fast in the meantime.
+    In write-behind mode a batch that fails on a lost connection goes back to the queue, and reads flush pending writes first,
+    since other pooled connections can't see uncommitted ones.
     """
-    def __init__(self, config : dict, name : str):
+
+    DEFAULT_STATEMENT_CACHE_SIZE = 64
+    DEFAULT_POOL_SIZE = 4
+    HEALTH_CHECK_INTERVAL = 30.0 # seconds
+    CHECKOUT_TIMEOUT = 10.0 # seconds to wait for a free pooled connection
+    MIN_BACKOFF = 0.5
+    MAX_BACKOFF = 30.0
+    MAX_ATTEMPTS = 3
+
+    class Unavailable(Exception):
+        pass
+
+    class _PooledConnection():
+        def __init__(self, connection, statementCacheSize : int):
+            self.connection = connection
+            self.lastUsed = time.time()
+            self._statementCacheSize = statementCacheSize
+            self._statements = OrderedDict() # query -> prepared cursor, least recently used first
+
+        # Server side prepared statements, one cursor per distinct query, the oldest one is closed once the cache is full.
+        # Prepared cursors take "?" placeholders, same as sqlite, so queries are portable between the backends.
+        def GetPrepared(self, query : str):
+            cursor = self._statements.get(query)
+            if cursor != None:
+                self._statements.move_to_end(query)
+                return cursor
+            cursor = self.connection.cursor(prepared=True)
+            self._statements[query] = cursor
+            if len(self._statements) > self._statementCacheSize:
+                _, evicted = self._statements.popitem(last=False)
+                evicted.close()
+            return cursor
+
+        def Close(self):
+            for query in self._statements:
+                try:
+                    self._statements[query].close()
+                except Exception:
+                    pass
+            self._statements.clear()
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+
+    def __init__(self, config : dict, name : str, statementCacheSize : int = DEFAULT_STATEMENT_CACHE_SIZE, poolSize : int = DEFAULT_POOL_SIZE,
+                 writeBehind : bool = False, flushInterval : float = ADatabase.DEFAULT_FLUSH_INTERVAL, batchSize : int = ADatabase.DEFAULT_BATCH_SIZE):
         # For MySQL, path is stored as a string representation of config
-        super().__init__(str(config), name)
-        self._connection = None
+        super().__init__(str(config), name, writeBehind, flushInterval, batchSize)
         self._config = config
+        self._statementCacheSize = statementCacheSize
+        self._poolSize = poolSize
+        self._idle = deque() # most recently used on the right
+        self._slots = threading.BoundedSemaphore(poolSize)
+        self._poolLock = threading.Lock()
+        self._flushLock = threading.Lock()
+        self._isOpened = False
+        self._backoff = 0.0
+        self._retryAt = 0.0
+        self._connections = 0
+        self._reconnects = 0
+        self._connectFailures = 0
 
     def IsOpened(self) -> bool:
-        return self._connection != None and self._connection.is_connected()
+        return self._isOpened
 
     def Open(self) -> bool:
         if self.IsOpened():
             self.Close()
+        if not mysqlconnector.IsAvailable():
+            print("Failed to connect to MySQL: mysql-connector-python is not installed")
+            return False
         try:
-            self._connection = mysql.connector.connect(**self._config)
-            return True
+            self._idle.append(self._CreateConnection())
         except Exception as e:
             print(f"Failed to connect to MySQL: {e}")
             return False
+        self._isOpened = True
+        self._StartWriter()
+        return True
 
     def Close(self):
         if self.IsOpened():
-            self._connection.close()
-            self._connection = None
+            self._StopWriter()
+            self._retryAt = 0.0
+            self.Flush()
+            if len(self._pending) > 0:
+                Log.warning("MySQL %s closed with %i unwritten statements" % (self._name, len(self._pending)))
+                self._pending.clear()
+            self._isOpened = False
+            with self._poolLock:
+                while len(self._idle) > 0:
+                    self._idle.pop().Close()
+                    self._connections -= 1
+
+    def _CreateConnection(self) -> _PooledConnection:
+        now = time.time()
+        if now < self._retryAt:
+            raise DatabaseMySQL.Unavailable("MySQL %s unreachable, next attempt in %.1f seconds" % (self._name, self._retryAt - now))
+        try:
+            connection = mysqlconnector.connect(**self._config)
+        except mysqlconnector.Error as ex:
+            self._connectFailures += 1
+            self._backoff = min(max(self._backoff * 2, DatabaseMySQL.MIN_BACKOFF), DatabaseMySQL.MAX_BACKOFF)
+            self._retryAt = time.time() + self._backoff
+            raise DatabaseMySQL.Unavailable("MySQL %s connect failed, retrying in %.1f seconds : %s" % (self._name, self._backoff, str(ex)))
+        self._backoff = 0.0
+        self._retryAt = 0.0
+        with self._poolLock:
+            self._connections += 1
+        return DatabaseMySQL._PooledConnection(connection, self._statementCacheSize)
+
+    def _IsHealthy(self, pooled : _PooledConnection) -> bool:
+        if time.time() - pooled.lastUsed < DatabaseMySQL.HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            pooled.connection.ping(reconnect=False)
+            return True
+        except mysqlconnector.Error:
+            return False
+
+    def _Checkout(self) -> _PooledConnection:
+        if not self._slots.acquire(timeout=DatabaseMySQL.CHECKOUT_TIMEOUT):
+            raise DatabaseMySQL.Unavailable("No free MySQL connection for %s in %.0f seconds" % (self._name, DatabaseMySQL.CHECKOUT_TIMEOUT))
+        try:
+            while True:
+                with self._poolLock:
+                    pooled = self._idle.pop() if len(self._idle) > 0 else None
+                if pooled == None:
+                    return self._CreateConnection()
+                if self._IsHealthy(pooled):
+                    return pooled
+                self._Discard(pooled)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _Checkin(self, pooled : _PooledConnection):
+        pooled.lastUsed = time.time()
+        with self._poolLock:
+            self._idle.append(pooled)
+        self._slots.release()
+
+    def _Discard(self, pooled : _PooledConnection):
+        pooled.Close()
+        with self._poolLock:
+            self._connections -= 1
+        self._reconnects += 1
 
-    def ExecuteQuery(self, query : str, withResponse = False) -> list[any]:
+    # Runs function( pooledConnection ) on a healthy connection, _Checkout replaces idle connections that fail their ping.
+    # A connection lost midway is retried on a new one only when isRead, a write may have been applied before
+    # the connection dropped and running it again could apply it twice, so the error is raised to the caller.
+    # Statement errors ( syntax, constraints ) are not retried.
+    def _Run(self, function, isRead : bool = False):
+        lastError = None
+        for attempt in range(DatabaseMySQL.MAX_ATTEMPTS):
+            pooled = self._Checkout()
+            try:
+                result = function(pooled)
+            except (mysqlconnector.errors.OperationalError, mysqlconnector.errors.InterfaceError) as ex:
+                lastError = ex
+                self._Discard(pooled)
+                self._slots.release()
+                if not isRead:
+                    Log.warning("MySQL connection of %s lost during a write, not retried ( %s )" % (self._name, str(ex)))
+                    raise
+                Log.warning("MySQL connection of %s lost ( %s ), attempt %i of %i" % (self._name, str(ex), attempt + 1, DatabaseMySQL.MAX_ATTEMPTS))
+                continue
+            except Exception:
+                try:
+                    pooled.connection.rollback()
+                except Exception:
+                    pass
+                self._Checkin(pooled)
+                raise
+            self._Checkin(pooled)
+            return result
+        raise DatabaseMySQL.Unavailable("MySQL %s failed after %i attempts : %s" % (self._name, DatabaseMySQL.MAX_ATTEMPTS, str(lastError)))
+
+    @staticmethod
+    def _Execute(pooled : _PooledConnection, query : str, withResponse, params) -> list[any]:
+        if params == None:
+            cursor = pooled.connection.cursor()
+            cursor.execute(query)
+        else:
+            cursor = pooled.GetPrepared(query)
+            cursor.execute(query, tuple(params))
+        result = None
+        if withResponse:
+            result = cursor.fetchall()
+        elif cursor.with_rows:
+            cursor.fetchall() # a prepared cursor has to be drained before it's reused
+        if params == None:
+            cursor.close()
+        pooled.connection.commit()
+        return result
+
+    def ExecuteQuery(self, query : str, withResponse = False, params = None) -> list[any]:
         if self.IsOpened():
+            if self._writeBehind and not withResponse and IsMutatingQuery(query):
+                self._Defer(query, params, False)
+                return None
+            if len(self._pending) > 0:
+                self.Flush()
             try:
-                cursor = self._connection.cursor()
-                cursor.execute(query)
-                self._connection.commit()
-                if withResponse:
-                    result = cursor.fetchall()
-                    cursor.close()
-                    return result
-                else:
-                    cursor.close()
-                    return None
+                return self._Run(lambda pooled : DatabaseMySQL._Execute(pooled, query, withResponse, params), IsReadQuery(query))
             except Exception as e:
                 print(f"Query execution failed: {e}")
                 return None
         return None
 
+    def ExecuteMany(self, query : str, seqOfParams) -> None:
+        if self.IsOpened():
+            if self._writeBehind and IsMutatingQuery(query):
+                self._Defer(query, list(seqOfParams), True)
+                return None
+            if len(self._pending) > 0:
+                self.Flush()
+            rows = [tuple(params) for params in seqOfParams]
+            def ExecuteManyOn(pooled):
+                pooled.GetPrepared(query).executemany(query, rows)
+                pooled.connection.commit()
+            try:
+                self._Run(ExecuteManyOn)
+            except Exception as e:
+                print(f"Query execution failed: {e}")
+        return None
+
+    # MySQL commits implicitly around DDL ( CREATE, ALTER, DROP ), only the data statements of a transaction are atomic
+    def ExecuteTransaction(self, statements : list[tuple]) -> bool:
+        if not self.IsOpened():
+            return False
+        if len(self._pending) > 0:
+            self.Flush()
+        def ExecuteTransactionOn(pooled):
+            for query, params in statements:
+                if params == None:
+                    cursor = pooled.connection.cursor()
+                    cursor.execute(query)
+                    cursor.close()
+                else:
+                    pooled.GetPrepared(query).execute(query, tuple(params))
+            pooled.connection.commit()
+        start = time.perf_counter()
+        try:
+            self._Run(ExecuteTransactionOn)
+        except Exception as ex:
+            Log.error("Transaction failed on %s, rolled back : %s" % (self._name, str(ex)))
+            return False
+        self._RecordCommit(time.perf_counter() - start, len(statements))
+        return True
+
+    # applies a batch of deferred statements in one transaction, a statement that fails on its own is logged and skipped
+    def _ApplyBatch(self, pooled : _PooledConnection, batch : list):
+        for query, params, isMany in batch:
+            try:
+                if isMany:
+                    pooled.GetPrepared(query).executemany(query, [tuple(row) for row in params])
+                elif params == None:
+                    cursor = pooled.connection.cursor()
+                    cursor.execute(query)
+                    cursor.close()
+                else:
+                    pooled.GetPrepared(query).execute(query, tuple(params))
+            except (mysqlconnector.errors.OperationalError, mysqlconnector.errors.InterfaceError):
+                raise
+            except mysqlconnector.Error as ex:
+                Log.error("Deferred statement failed on %s : %s ( %s )" % (self._name, str(ex), query))
+        pooled.connection.commit()
+
+    def Flush(self):
+        if not self.IsOpened() or time.time() < self._retryAt:
+            return # while the server is unreachable the queue is kept until the backoff expires
+        with self._flushLock:
+            batch = []
+            while len(self._pending) > 0:
+                batch.append(self._pending.popleft())
+            if len(batch) == 0:
+                return
+            start = time.perf_counter()
+            try:
+                self._Run(lambda pooled : self._ApplyBatch(pooled, batch))
+            except Exception as ex:
+                # keep the order, the batch goes in front of anything queued meanwhile
+                self._pending.extendleft(reversed(batch))
+                Log.error("Write-behind flush of %i statements failed on %s, kept for retry : %s" % (len(batch), self._name, str(ex)))
+                return
+            self._RecordCommit(time.perf_counter() - start, len(batch))
+
+    def GetStats(self) -> dict:
+        stats = super().GetStats()
+        with self._poolLock:
+            stats["poolSize"] = self._poolSize
+            stats["connections"] = self._connections
+            stats["idleConnections"] = len(self._idle)
+        stats["reconnects"] = self._reconnects
+        stats["connectFailures"] = self._connectFailures
+        stats["backoff"] = self._backoff
+        return stats
+
     def LoadExtension(self, extpath : str):
         # MySQL doesn't use extensions in the same way as SQLite
         print("LoadExtension not supported for MySQL")
         pass
 
+class MigrationRunner():
+    """
+    Versioned schema migrations for one component ( usually a plugin ) of a database.
+    Steps are registered with increasing versions and Run applies the ones newer than the recorded version, in order,
+    each in its own transaction together with its record in the schema_migrations table.
+    Versions are kept per component, so plugins sharing a database migrate independently.
+
+    Example :
+        migrations = MigrationRunner(db, "banking")
+        migrations.Register(1, "banking table", ["CREATE TABLE IF NOT EXISTS banking ( user_id INTEGER PRIMARY KEY, credits INTEGER DEFAULT 0 )"])
+        migrations.Register(2, "index credits", ["CREATE INDEX IF NOT EXISTS idx_banking_credits ON banking ( credits )"])
+        migrations.Run()
+    """
+
+    TABLE = "schema_migrations"
+
+    def __init__(self, db : ADatabase, component : str):
+        self._db = db
+        self._component = component
+        self._migrations : dict[int, tuple] = {} # version -> ( description, statements )
+
+    def Register(self, version : int, description : str, statements : list[str]):
+        """ statements are plain queries or ( query, params ) pairs. Versions start at 1. """
+        if version < 1 or version in self._migrations:
+            raise ValueError("Invalid or duplicate migration version %i for %s" % (version, self._component))
+        self._migrations[version] = (description, [(st, None) if isinstance(st, str) else st for st in statements])
+        return self
+
+    def _EnsureTable(self) -> bool:
+        return self._db.ExecuteTransaction([("CREATE TABLE IF NOT EXISTS %s ("
+                                             " component VARCHAR(64) NOT NULL,"
+                                             " version INTEGER NOT NULL,"
+                                             " description TEXT,"
+                                             " applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,"
+                                             " PRIMARY KEY ( component, version ) )" % MigrationRunner.TABLE, None)])
+
+    def GetVersion(self) -> int:
+        """ Latest applied version, 0 if none, None if it can't be read. """
+        result = self._db.ExecuteQuery("SELECT MAX(version) FROM %s WHERE component = ?" % MigrationRunner.TABLE, True, (self._component,))
+        if result == None:
+            return None
+        if len(result) == 0 or result[0][0] == None:
+            return 0
+        return int(result[0][0])
+
+    def Run(self) -> bool:
+        """ Applies pending migrations, stops at the first one that fails. Returns whether the schema is up to date. """
+        if not self._EnsureTable():
+            return False
+        current = self.GetVersion()
+        if current == None:
+            return False
+        for version in sorted(self._migrations):
+            if version <= current:
+                continue
+            description, statements = self._migrations[version]
+            record = ("INSERT INTO %s ( component, version, description ) VALUES ( ?, ?, ? )" % MigrationRunner.TABLE, (self._component, version, description))
+            if not self._db.ExecuteTransaction(statements + [record]):
+                Log.error("Migration %s %i ( %s ) failed on %s, schema left at version %i" % (self._component, version, description, self._db.GetName(), current))
+                return False
+            Log.info("Migrated %s on %s to version %i : %s" % (self._component, self._db.GetName(), version, description))
+            current = version
+        return True
+
+
 class DatabaseManager():
 
     DBM_RESULT_ERROR = -2
@@ -137,26 +825,55 @@ class DatabaseManager():
     DBM_RESULT_OK = 0
     
 
-    def __init__(self):
+    def __init__(self, writeBehind : bool = False, flushInterval : float = ADatabase.DEFAULT_FLUSH_INTERVAL, batchSize : int = ADatabase.DEFAULT_BATCH_SIZE, profile : dict = None):
         self._databases : dict[str, ADatabase] = {}
+        self._lock = threading.RLock() # plugins create their databases from OnInitialize, which runs on several threads
+        # defaults for databases created by CreateDatabase
+        self._writeBehind = writeBehind
+        self._flushInterval = flushInterval
+        self._batchSize = batchSize
+        self._profile = profile
     
     def __del__(self):
-        for k in self._databases:
-            db = self._databases[k]
+        self.CloseAll()
+
+    def CloseAll(self):
+        for db in self._GetAll():
             db.Close()
 
-    def GetDatabase(self, name : str) -> ADatabase:
-        if name in self._databases:
-            return self._databases[name]
+    def _GetAll(self) -> list[ADatabase]:
+        with self._lock:
+            return list(self._databases.values())
+
+    def Flush(self, name : str = None):
+        """ Commits deferred writes of one database, or of all of them if name is None. """
+        if name != None:
+            db = self.GetDatabase(name)
+            if db != None:
+                db.Flush()
         else:
-            return None
+            for db in self._GetAll():
+                db.Flush()
+
+    def GetStats(self) -> list[dict]:
+        result = []
+        for db in self._GetAll():
+            stats = db.GetStats()
+            if stats != None:
+                result.append(stats)
+        return result
+
+    def GetDatabase(self, name : str) -> ADatabase:
+        with self._lock:
+            return self._databases.get(name)
 
     def AddDatabase(self, db : ADatabase) -> int:
-        if self.GetDatabase(db.GetName()) != None:
-            return DatabaseManager.DBM_RESULT_ALREADY_EXISTS
-        else:
-            self._databases[db.GetName()] = db
-            return DatabaseManager.DBM_RESULT_OK
+        with self._lock:
+            if self.GetDatabase(db.GetName()) != None:
+                return DatabaseManager.DBM_RESULT_ALREADY_EXISTS
+            else:
+                self._databases[db.GetName()] = db
+                return DatabaseManager.DBM_RESULT_OK
 
     def CreateDatabase(self, path : str, name : str) -> int:
         """
@@ -168,17 +885,19 @@ class DatabaseManager():
 
         :return: DBM_RESULT_OK | DBM_RESULT_ALREADY_EXISTS | DBM_RESULT_ERROR
         """
-        if self.GetDatabase(name) != None:
-            return DatabaseManager.DBM_RESULT_ALREADY_EXISTS
-        else:
-            newdb = DatabaseLite(path, name)
-            if newdb.Open():
-                self.AddDatabase(newdb)
+        # lookup, open and insert under one lock, so a racing create of the same name can't open a second connection
+        with self._lock:
+            if self.GetDatabase(name) != None:
+                return DatabaseManager.DBM_RESULT_ALREADY_EXISTS
             else:
-                return DatabaseManager.DBM_RESULT_ERROR
-            return DatabaseManager.DBM_RESULT_OK
+                newdb = DatabaseLite(path, name, self._writeBehind, self._flushInterval, self._batchSize, profile = self._profile)
+                if newdb.Open():
+                    self.AddDatabase(newdb)
+                else:
+                    return DatabaseManager.DBM_RESULT_ERROR
+                return DatabaseManager.DBM_RESULT_OK
     
-    def CreateDatabaseMySQL(self, host : str, user : str, password : str, database : str, name : str, port : int = 3306) -> int:
+    def CreateDatabaseMySQL(self, host : str, user : str, password : str, database : str, name : str, port : int = 3306, poolSize : int = DatabaseMySQL.DEFAULT_POOL_SIZE) -> int:
         """
         Creates a MySQL database connection for multi-server shared database access.
         Created databases will keep their connections opened.
@@ -189,22 +908,25 @@ class DatabaseManager():
         :param database: Database name
         :param name: A name of database for internal storage and referencing, used in searching
         :param port: MySQL server port (default: 3306)
+        :param poolSize: Maximum number of concurrent connections (default: 4)
 
         :return: DBM_RESULT_OK | DBM_RESULT_ALREADY_EXISTS | DBM_RESULT_ERROR
         """
-        if self.GetDatabase(name) != None:
-            return DatabaseManager.DBM_RESULT_ALREADY_EXISTS
-        else:
-            config = {
-                'host': host,
-                'port': port,
-                'user': user,
-                'password': password,
-                'database': database
-            }
-            newdb = DatabaseMySQL(config, name)
-            if newdb.Open():
-                self.AddDatabase(newdb)
+        # held through Open, like CreateDatabase
+        with self._lock:
+            if self.GetDatabase(name) != None:
+                return DatabaseManager.DBM_RESULT_ALREADY_EXISTS
             else:
-                return DatabaseManager.DBM_RESULT_ERROR
-            return DatabaseManager.DBM_RESULT_OK
+                config = {
+                    'host': host,
+                    'port': port,
+                    'user': user,
+                    'password': password,
+                    'database': database
+                }
+                newdb = DatabaseMySQL(config, name, poolSize = poolSize, writeBehind = self._writeBehind, flushInterval = self._flushInterval, batchSize = self._batchSize)
+                if newdb.Open():
+                    self.AddDatabase(newdb)
+                else:
+                    return DatabaseManager.DBM_RESULT_ERROR
+                return DatabaseManager.DBM_RESULT_OK
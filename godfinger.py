@@ -6,7 +6,6 @@ import json
 import threading
 import traceback
 import io
-import psutil
 import logging
 import argparse
 import signal
@@ -46,11 +45,15 @@ Argparser = argparse.ArgumentParser(prog="Godfinger", description="The universal
 Argparser.add_argument("-d", "--debug", action="store_true")
 Argparser.add_argument("-lf", "--logfile")
 Argparser.add_argument("-mbiicmd")
+Argparser.add_argument("-ip", "--importprofile", action="store_true", help="time every import, per plugin, and log the heaviest")
 Args = Argparser.parse_args()
 
 Log = logging.getLogger(__name__)
 
 # custom imports
+import lib.shared.importprofile as importprofile
+if Args.importprofile:
+    importprofile.Install()
 import lib.shared.config as config
 import lib.shared.rcon as rcon
 import lib.shared.serverdata as serverdata
@@ -60,6 +63,8 @@ import godfingerAPI
 import lib.shared.client as client
 import lib.shared.clientmanager as clientmanager
 import lib.shared.pk3 as pk3
+import lib.shared.assetcatalog as assetcatalog
+import lib.shared.pk3watcher as pk3watcher
 # queue imported at top
 import database
 import plugin
@@ -71,6 +76,7 @@ import cvar
 import godfingerinterface
 import lib.shared.timeout as timeout
 import lib.shared.pswd as pswd
+import lib.shared.telemetry as telemetry
 import lib.shared.observer as observer
 
 INVALID_ID = -1
@@ -86,6 +92,29 @@ CONFIG_FALLBACK = \
     "serverPath":"your/path/here/",
     "serverFileName":"mbiided.x86.exe",
     "logicDelay":0.016,
+    "statusReconcileInterval":30,
+    "cvarCacheTtl":30,
+    "cvarRefreshInterval":300,
+    "pk3IndexCache":"pk3index.db",
+    "pk3ScanWorkers":8,
+    "pk3LazyOpen":true,
+    "pk3ContentCacheSize":33554432,
+    "pk3Watch":true,
+    "pk3WatchPollInterval":5,
+    "teamConfigPreloadWorkers":4,
+    "pluginInitWorkers":4,
+    "telemetry": {
+        "enabled": true,
+        "interval": 5,
+        "capacity": 720,
+        "sustain": 2,
+        "thresholds": {
+            "cpu": 90,
+            "rss": 0,
+            "threads": 0,
+            "files": 0
+        }
+    },
     "restartOnCrash": false,
     "watchdog": {
         "enabled": false,
@@ -97,6 +126,18 @@ CONFIG_FALLBACK = \
         "soft": false,
         "seconds": 1.5
     },
+    "database": {
+        "writeBehind": false,
+        "flushInterval": 0.5,
+        "batchSize": 256,
+        "profile": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "mmap_size": 67108864,
+            "cache_size": -8192,
+            "busy_timeout": 5000
+        }
+    },
 
     "interfaces":
     {
@@ -224,6 +265,7 @@ class MBIIServer:
         self._isRunning = False
         self._isRestarting = False
         self._pluginManager = None
+        self._dbManager = None
         self._svInterfaces = [] # NEW: List of interfaces
         self._primarySvInterface = None # NEW: Primary interface for status/commands
         self._gatheringExitData = False
@@ -324,14 +366,33 @@ class MBIIServer:
                 Log.warning("Failed to set console title: %s", str(e))
 
         # Databases
-        self._dbManager = database.DatabaseManager()
+        dbConfig = self._config.GetValue("database", {})
+        self._dbManager = database.DatabaseManager(dbConfig.get("writeBehind", False),
+                                                   dbConfig.get("flushInterval", database.DatabaseLite.DEFAULT_FLUSH_INTERVAL),
+                                                   dbConfig.get("batchSize", database.DatabaseLite.DEFAULT_BATCH_SIZE),
+                                                   dbConfig.get("profile", None))
         r = self._dbManager.CreateDatabase("Godfinger.db", "Godfinger")
         self._database = self._dbManager.GetDatabase("Godfinger")
         self._database.Open()
 
         # Archives
-        self._pk3Manager = pk3.Pk3Manager()
-        self._pk3Manager.Initialize([self._config.cfg["MBIIPath"]])
+        # base loads before the mod, like in the engine, so MBII archives override it
+        mbiiPath = self._config.cfg["MBIIPath"]
+        self._pk3Manager = pk3.Pk3Manager(self._config.GetValue("pk3IndexCache", "pk3index.db"),
+                                          self._config.GetValue("pk3ScanWorkers", pk3.Pk3Manager.DEFAULT_SCAN_WORKERS),
+                                          self._config.GetValue("pk3LazyOpen", True),
+                                          self._config.GetValue("pk3ContentCacheSize", pk3.ContentCache.DEFAULT_BUDGET))
+        self._pk3Manager.Initialize([os.path.normpath(os.path.join(mbiiPath, "..", "base")), mbiiPath])
+        self._assetCatalog = assetcatalog.AssetCatalog(self._pk3Manager)
+        self._assetCatalog.Build()
+        Log.info("Asset catalog built : %s" % str(self._assetCatalog.GetStats()))
+        startTime = time.time()
+        preloaded = self._assetCatalog.PreloadTeamConfigs(self._config.GetValue("teamConfigPreloadWorkers", assetcatalog.AssetCatalog.DEFAULT_PRELOAD_WORKERS))
+        Log.info("Parsed %i team configs in %.1f ms" % (preloaded, (time.time() - startTime) * 1000))
+        self._pk3Watcher = None
+        if self._config.GetValue("pk3Watch", True):
+            self._pk3Watcher = pk3watcher.Pk3Watcher(self._pk3Manager.GetDirs(), self._config.GetValue("pk3WatchPollInterval", pk3watcher.Pk3Watcher.DEFAULT_POLL_INTERVAL),
+                                                   onChange = self._pk3Manager.ClosePk3)
 
         # NEW: Open all interfaces
         for interface in self._svInterfaces:
@@ -342,7 +403,7 @@ class MBIIServer:
             interface.WaitUntilReady()
 
         # Cvars
-        self._cvarManager = cvar.CvarManager(self._primarySvInterface) # Use primary interface for Cvars
+        self._cvarManager = cvar.CvarManager(self._primarySvInterface, self._config.GetValue("cvarCacheTtl", cvar.CvarManager.DEFAULT_TTL)) # Use primary interface for Cvars
 
         # Client management
         self._clientManager = clientmanager.ClientManager()
@@ -361,7 +422,11 @@ class MBIIServer:
         exportAPI.GetDatabase       = self.API_GetDatabase
         exportAPI.GetPlugin         = self.API_GetPlugin
         exportAPI.Restart           = self.Restart
-        self._serverData = serverdata.ServerData(self._pk3Manager, self._cvarManager, exportAPI, self._primarySvInterface, Args) # Use primary interface
+        exportAPI.GetRconStats      = self.API_GetRconStats
+        exportAPI.FlushDatabases    = self.API_FlushDatabases
+        exportAPI.GetDatabaseStats  = self.API_GetDatabaseStats
+        exportAPI.ReloadPlugin      = self.API_ReloadPlugin
+        self._serverData = serverdata.ServerData(self._pk3Manager, self._cvarManager, exportAPI, self._primarySvInterface, Args, self._assetCatalog) # Use primary interface
         extralives_path = os.path.join(os.path.dirname(__file__), "data", "extralives.json")
         try:
             with open(extralives_path, "r") as f:
@@ -384,15 +449,27 @@ class MBIIServer:
         # Technical
         # Plugins
         self._pluginManager = plugin.PluginManager()
-        result = self._pluginManager.Initialize(self._config.cfg["Plugins"], self._serverData)
+        result = self._pluginManager.Initialize(self._config.cfg["Plugins"], self._serverData, self._config.GetValue("pluginInitWorkers", plugin.PluginManager.DEFAULT_INIT_WORKERS))
         if not result:
             self._status = MBIIServer.STATUS_PLUGIN_ERROR
             return
+        # built in smod commands, listed by !help along with the ones plugins register
+        reloadHelp = "!<reloadplugin | rp> <plugin> - reloads a plugin by its path or file name without restarting"
+        self._serverData.RegisterCommands("registeredSmodCommands", [("reloadplugin", reloadHelp), ("rp", reloadHelp)])
         self._logicDelayS = self._config.cfg["logicDelay"]
 
         self._isFinished = False
         self._isRunning = False
         self._isRestarting = False
+        self._statusSnapshots = queue.Queue()
+        self._telemetryEvents = queue.Queue() # threshold changes from the process monitor thread
+        self._telemetryObserver = observer.Observer(self._telemetryEvents.put)
+        self._telemetryProcessName = None
+        self._statusMismatches = set()
+        self._statusReconcilerControl = threadcontrol.ThreadControl()
+        self._statusReconcilerThread = None
+        self._cvarRefreshControl = threadcontrol.ThreadControl()
+        self._cvarRefreshThread = None
         self._lastRestartTick = 0.0
         self._restartTimeout = timeout.Timeout()
         self.restartOnCrash = self._config.cfg["restartOnCrash"]
@@ -483,6 +560,13 @@ class MBIIServer:
             # Only attempt to finish _pluginManager if it was successfully initialized.
             if self._pluginManager is not None:
                 self._pluginManager.Finish()
+            # plugins may still write while finishing, flush after them
+            if self._dbManager is not None:
+                database.ShutdownWorkers()
+                self._dbManager.Flush()
+                for stats in self._dbManager.GetStats():
+                    if stats["writeBehind"]:
+                        Log.info("Database %s : %i commits, %i statements, flush avg %.2f ms max %.2f ms" % (stats["name"], stats["commits"], stats["statementsWritten"], stats["flushTimeAvgMs"], stats["flushTimeMaxMs"]))
             self._status = MBIIServer.STATUS_FINISHED
             self._isFinished = True
             Log.info("Finished Godfinger.")
@@ -504,70 +588,88 @@ class MBIIServer:
     # status notrunc
     def _FetchStatus(self):
         # NEW: Use primary interface for status
-        statusStr = self._primarySvInterface.Status()
-        if statusStr != None:
-            Log.debug(statusStr)
-            splitted = statusStr.splitlines()
-            
-            if len(splitted) > 2 and splitted[1].strip().startswith("hostname:"):
-                import lib.shared.colors as colors
-                hostName = splitted[1].split(":", 1)[1].strip()
-                self._serverData.name = colors.StripColorCodes(hostName)
-            else:
-                self._serverData.name = "Unknown Godfinger Server"
-                
-            versionSplit = splitted[2].split()
-            version = versionSplit[2] + "_" + versionSplit[3]
-            gameType = splitted[3].split()[2]
-            mapLine = splitted[5]
-            splittedMap = mapLine.split()
-            mapName = splittedMap[2]
-            mode    = int(splittedMap[3][splittedMap[3].find("(")+1:splittedMap[3].rfind(")")])
-            Log.info("Version %s, GameType %s, Mapname %s, Mode %i" %(version, gameType, mapName, mode))
-            self._serverData.version = version
-            self._serverData.gameType = gameType
-            self._serverData.mapName = mapName
-            self._serverData.mode = mode
-            l = len( splitted )
-            if l > 10:
-                for i in range (10, l):
-                    line = splitted[i]
-                    playerSplit = line.split()
-                    if len(playerSplit) >= 6: # hardcode
-                        addr = playerSplit[-2]
-                        id = int(playerSplit[0])
-                        extraName = len(playerSplit) - 6
-                        name = playerSplit[3]
-                        for i in range(extraName):
-                            name += " " + playerSplit[4 + i]
-                        if name[-2] == "^" and name[-1] == "7":
-                            name = name[:-2].strip()
-                        if name[0] == '(' and name[-1] == ')':
-                            name = name[1:-1]   # strip only first and last '(' and ')' chars
-                        Log.debug("Status client info addr %s, id %s, name \"%s\"" %(addr, id, name))
-                        existing = self._clientManager.GetClientById(id)
-                        if existing == None:
-                            newClient = client.Client(id, name, addr)
-                            self._clientManager.AddClient(newClient)
-                        else:
-                            if existing.GetName() != name:
-                                existing._name = name
-                            if existing.GetAddress() != addr:
-                                existing._address = addr
-            playersLine = splitted[6]
-            startIndex = playersLine.find("(")
-            endIndex = playersLine.find(" max")
-            if startIndex != -1 and endIndex != -1:
-                self._serverData.maxPlayers = int(playersLine[startIndex+1:endIndex])
-                Log.debug("Status players max count %d"%self._serverData.maxPlayers)
-            else:
-                self._serverData.maxPlayers = 32
-                Log.warning("Server status is having invalid format, setting default values to status data.")
+        snapshot = self._primarySvInterface.GetStatusSnapshot(0)
+        if snapshot != None and snapshot.isValid:
+            Log.debug(str(snapshot))
+            self._serverData.name = snapshot.hostName if snapshot.hostName != "" else "Unknown Godfinger Server"
+            Log.info("Version %s, GameType %s, Mapname %s, Mode %i" %(snapshot.version, snapshot.gameType, snapshot.mapName, snapshot.mode))
+            self._serverData.version = snapshot.version
+            self._serverData.gameType = snapshot.gameType
+            self._serverData.mapName = snapshot.mapName
+            self._serverData.mode = snapshot.mode
+            self._serverData.maxPlayers = snapshot.maxPlayers
+            Log.debug("Status players max count %d"%self._serverData.maxPlayers)
+            for player in snapshot.players.values():
+                Log.debug("Status client info addr %s, id %s, name \"%s\"" %(player.address, player.id, player.name))
+                existing = self._clientManager.GetClientById(player.id)
+                if existing == None:
+                    newClient = client.Client(player.id, player.name, player.address)
+                    self._clientManager.AddClient(newClient)
+                else:
+                    if existing.GetName() != player.name:
+                        existing._name = player.name
+                    if existing.GetAddress() != player.address:
+                        existing._address = player.address
         else:
+            self._serverData.name = "Unknown Godfinger Server"
             self._serverData.maxPlayers = 32
-            Log.warning("Server status is unreachable, setting default values to status data.")
-        pass
+            Log.warning("Server status is unreachable or has invalid format, setting default values to status data.")
 
+    def _StatusReconcilerThreadHandler(self, control, interval):
+        while not control.stop:
+            time.sleep(interval)
+            if control.stop:
+                break
+            try:
+                snapshot = self._primarySvInterface.GetStatusSnapshot()
+                if snapshot != None and snapshot.isValid:
+                    self._statusSnapshots.put(snapshot)
+            except Exception as ex:
+                Log.error("Status reconciler failed to fetch status : %s" % str(ex))
+
+    def _CvarRefreshThreadHandler(self, control, interval):
+        # changes are collected by the cvar manager and dispatched from the main loop
+        while not control.stop:
+            time.sleep(interval)
+            if control.stop:
+                break
+            try:
+                self._cvarManager.Refresh()
+            except Exception as ex:
+                Log.error("Cvar refresh failed : %s" % str(ex))
+
+    def _ReconcileStatus(self, snapshot):
+        """
+        Diffs a status snapshot against the client manager and fixes drift caused by missed log lines.
+        A slot has to disagree in two consecutive snapshots before it's corrected, so clients whose log lines are still in flight aren't touched.
+        Runs on the main loop thread, emits only corrective connect/disconnect events.
+        """
+        mismatched = set()
+        known = {cl.GetId() : cl for cl in self._clientManager.GetAllClients()}
+        for id, cl in known.items():
+            player = snapshot.GetPlayer(id)
+            if player == None or player.address != cl.GetAddress():
+                mismatched.add(id)
+        for id in snapshot.players:
+            if id not in known:
+                mismatched.add(id)
+
+        confirmed = mismatched & self._statusMismatches
+        self._statusMismatches = mismatched
+        for id in confirmed:
+            cl = known.get(id)
+            player = snapshot.GetPlayer(id)
+            if cl != None:
+                Log.warning("Status reconcile : client %s is not on the server anymore, disconnecting." % str(cl))
+                self._pluginManager.Event( godfingerEvent.ClientDisconnectEvent( cl, { "reconciled" : True } ) )
+                self._clientManager.RemoveClient(cl)
+            if player != None:
+                Log.warning("Status reconcile : client %s was missing, connecting." % str(player))
+                newClient = client.Client(player.id, player.name, player.address)
+                self._clientManager.AddClient(newClient)
+                self._pluginManager.Event( godfingerEvent.ClientConnectEvent( newClient, { "reconciled" : True } ) )
+        if len(confirmed) > 0 and len(known) > 0 and self._clientManager.GetClientCount() == 0:
+            self._pluginManager.Event( godfingerEvent.ServerEmptyEvent() )
 
     def Restart(self, timeout = 60):
         if not self._isRestarting:
@@ -583,13 +685,14 @@ class MBIIServer:
         try:
             # check for server process running first
             sv_fname = self._config.cfg["serverFileName"]
-            if not sv_fname in (p.name() for p in psutil.process_iter()):
+            if not pswd.SharedMonitor.IsRunning(sv_fname):
                 self._status = MBIIServer.STATUS_SERVER_NOT_RUNNING
                 if not Args.debug:
                     Log.error("Server is not running, start the server first, terminating...")
                     return
                 else:
                     Log.debug("Running in debug mode and server is offline, consider server data invalid.")
+            self._StartTelemetry(sv_fname)
 
             # Use primary interface for CvarManager
             if not self._cvarManager.Initialize():
@@ -607,6 +710,18 @@ class MBIIServer:
 
             if not self._pluginManager.Start():
                 return
+            reconcileInterval = self._config.GetValue("statusReconcileInterval", 30)
+            if reconcileInterval > 0:
+                self._statusReconcilerControl.stop = False
+                self._statusReconcilerThread = threading.Thread(target=self._StatusReconcilerThreadHandler, daemon=True, args=(self._statusReconcilerControl, reconcileInterval))
+                self._statusReconcilerThread.start()
+            cvarRefreshInterval = self._config.GetValue("cvarRefreshInterval", 300)
+            if cvarRefreshInterval > 0:
+                self._cvarRefreshControl.stop = False
+                self._cvarRefreshThread = threading.Thread(target=self._CvarRefreshThreadHandler, daemon=True, args=(self._cvarRefreshControl, cvarRefreshInterval))
+                self._cvarRefreshThread.start()
+            if self._pk3Watcher != None and self._pk3Watcher.Start():
+                Log.info("Watching game directories for pk3 changes ( %s )" % self._pk3Watcher.GetMode())
             self._isRunning = True
             self._status = MBIIServer.STATUS_RUNNING
             # Use primary interface for SvSay
@@ -631,6 +746,11 @@ class MBIIServer:
             if self._primarySvInterface:
                 self._primarySvInterface.SvSay("^1 {text}.".format(text = self._config.cfg["epilogueMessage"]))
             self._status = MBIIServer.STATUS_STOPPING
+            self._statusReconcilerControl.stop = True
+            self._cvarRefreshControl.stop = True
+            if self._pk3Watcher != None:
+                self._pk3Watcher.Stop()
+            self._StopTelemetry()
             # NEW: Close all interfaces
             for interface in self._svInterfaces:
                 interface.Close()
@@ -659,9 +779,62 @@ class MBIIServer:
                 message = messages.get()
                 self._ParseMessage(message)
 
+        while not self._statusSnapshots.empty():
+            self._ReconcileStatus(self._statusSnapshots.get())
+
+        database.MainDispatcher.Dispatch()
+
+        cvarChanges = self._cvarManager.PopChanges()
+        if len(cvarChanges) > 0:
+            self._pluginManager.Event(godfingerEvent.CvarsChangedEvent(cvarChanges))
+
+        if self._pk3Watcher != None and self._pk3Watcher.PopChanged():
+            self._RefreshAssets()
+
+        while not self._telemetryEvents.empty():
+            processName, metric, isHigh, value, limit = self._telemetryEvents.get()
+            if isHigh:
+                Log.warning("Server %s %s is high : %.1f over %.1f" % (processName, metric, value, limit))
+            else:
+                Log.info("Server %s %s is back to normal : %.1f" % (processName, metric, value))
+            self._pluginManager.Event(godfingerEvent.ServerResourceEvent(processName, metric, isHigh, value, limit))
 
         self._pluginManager.Loop()
 
+    # samples the server process on the shared process monitor thread, threshold changes reach plugins as ServerResourceEvent
+    def _StartTelemetry(self, processName : str):
+        telemetryCfg = self._config.GetValue("telemetry", {})
+        if not telemetryCfg.get("enabled", True) or self._telemetryProcessName != None:
+            return
+        pswd.SharedMonitor.EnableTelemetry(processName,
+                                           telemetryCfg.get("interval", telemetry.ProcessTelemetry.DEFAULT_INTERVAL),
+                                           telemetryCfg.get("capacity", telemetry.ProcessTelemetry.DEFAULT_CAPACITY),
+                                           telemetryCfg.get("thresholds", {}),
+                                           telemetryCfg.get("sustain", telemetry.ProcessTelemetry.DEFAULT_SUSTAIN))
+        pswd.SharedMonitor.SubscribeTelemetry(self._telemetryObserver)
+        pswd.SharedMonitor.Watch(processName)
+        self._telemetryProcessName = processName
+
+    def _StopTelemetry(self):
+        if self._telemetryProcessName != None:
+            pswd.SharedMonitor.UnsubscribeTelemetry(self._telemetryObserver)
+            pswd.SharedMonitor.Unwatch(self._telemetryProcessName)
+            self._telemetryProcessName = None
+
+    # applies archive changes seen by the watcher, the index and the catalog are only touched from the main loop
+    def _RefreshAssets(self):
+        startTime = time.time()
+        changes = self._pk3Manager.Refresh()
+        archives = { k : changes[k] for k in ("added", "removed", "modified") }
+        if sum(len(archives[k]) for k in archives) == 0:
+            return
+        assets = self._assetCatalog.Update(changes["paths"])
+        if assetcatalog.AssetCatalog.TEAMS in assets:
+            self._assetCatalog.PreloadTeamConfigs(self._config.GetValue("teamConfigPreloadWorkers", assetcatalog.AssetCatalog.DEFAULT_PRELOAD_WORKERS))
+        Log.info("Pk3 archives changed %s, %i paths reindexed in %.1f ms, assets %s" % (str(archives), len(changes["paths"]), (time.time() - startTime) * 1000,
+                 str({ kind : { k : len(assets[kind][k]) for k in assets[kind] } for kind in assets })))
+        self._pluginManager.Event(godfingerEvent.AssetsChangedEvent(archives, assets))
+
     def _ParseMessage(self, message : logMessage.LogMessage):
 
         line = message.content
@@ -685,9 +858,11 @@ class MBIIServer:
                 self._pluginManager.Event(godfingerEvent.Event(godfingerEvent.GODFINGER_EVENT_TYPE_WD_STARTED,None))
                 self._HandleWatchdogEvent("started")
             elif line == "wd_died":
+                self._cvarManager.Invalidate()
                 self._pluginManager.Event(godfingerEvent.Event(godfingerEvent.GODFINGER_EVENT_TYPE_WD_DIED,None))
                 self._HandleWatchdogEvent("died")
             elif line == "wd_restarted":
+                self._cvarManager.Invalidate()
                 self._pluginManager.Event(godfingerEvent.Event(godfingerEvent.GODFINGER_EVENT_TYPE_WD_RESTARTED,None))
                 self._HandleWatchdogEvent("restarted")
             return
@@ -1067,6 +1242,25 @@ class MBIIServer:
                 self._primarySvInterface.SmSay('^1[Godfinger]: ^7' + commandStr)
         return True
 
+    def HandleSmodReloadPlugin(self, playerName, smodID, adminIP, cmdArgs):
+        """Handle !reloadplugin command for smod, cmdArgs keep their case since plugin paths are case sensitive"""
+        if len(cmdArgs) < 2:
+            self._primarySvInterface.SmSay("^1[Godfinger]: ^7Usage: !reloadplugin <plugin path or file name>")
+            return False
+        matches = self._pluginManager.FindPlugins(cmdArgs[1])
+        if len(matches) != 1:
+            reason = "No loaded plugin matches" if len(matches) == 0 else "Several plugins match"
+            self._primarySvInterface.SmSay(f"^1[Godfinger]: ^7{reason} {cmdArgs[1]}")
+            return False
+        Log.info(f"SMOD {playerName} (adminID: {smodID}, IP: {adminIP}) reloads plugin {matches[0]}")
+        def OnReloaded(name, isReloaded):
+            self._primarySvInterface.SmSay(f"^1[Godfinger]: ^7Plugin {name} {'reloaded' if isReloaded else 'failed to reload, check logs'}")
+        if not self._pluginManager.ReloadPlugin(matches[0], OnReloaded):
+            self._primarySvInterface.SmSay(f"^1[Godfinger]: ^7Plugin {matches[0]} is already reloading")
+            return False
+        self._primarySvInterface.SmSay(f"^1[Godfinger]: ^7Reloading plugin {matches[0]}...")
+        return True
+
     def OnKill(self, logMessage : logMessage.LogMessage):
         textified = logMessage.content
         Log.debug("Kill log entry %s", textified)
@@ -1283,6 +1477,9 @@ class MBIIServer:
         for index in range (0, len(splitted) - 1, 2):
             vars[splitted[index]] = splitted[index+1]
 
+        if not logMessage.isStartup: # retrospect lines are older than the cvarlist fetched on start
+            self._cvarManager.OnServerInfo(vars)
+
         if "mapname" in vars:
             if vars["mapname"] != self._serverData.mapName:
                 Log.debug("mapname cvar parsed, applying " + vars["mapname"] + " : OLD " + self._serverData.mapName)
@@ -1290,7 +1487,7 @@ class MBIIServer:
                     self.OnMapChange(vars["mapname"], self._serverData.mapName)
                 self._serverData.mapName = vars["mapname"]
         else:
-            self._serverData.mapName = self._primarySvInterface.GetCurrentMap()
+            self._serverData.mapName = self._primarySvInterface.GetCurrentMap(fresh = True)
 
         Log.info("Current map name on init : %s", self._serverData.mapName)
 
@@ -1333,6 +1530,9 @@ class MBIIServer:
                 if command.lower() == "help":
                     self.HandleSmodHelp(senderName, smodID, senderIP, cmdArgs)
                     return True  # Command handled, don't pass to plugins
+                elif command in ("reloadplugin", "rp"):
+                    self.HandleSmodReloadPlugin(senderName, smodID, senderIP, message.split())
+                    return True
             self._pluginManager.Event(godfingerEvent.SmodSayEvent(senderName, int(smodID), senderIP, message, isStartup = logMessage.isStartup))
         else:
             pass
@@ -1492,6 +1692,18 @@ class MBIIServer:
     def API_Restart(self, timeout = 60):
         self.Restart(timeout)
 
+    def API_GetRconStats(self) -> list[dict]:
+        return [stats for stats in (interface.GetRttStats() for interface in self._svInterfaces) if stats != None]
+
+    def API_FlushDatabases(self, name = None):
+        self._dbManager.Flush(name)
+
+    def API_GetDatabaseStats(self) -> list[dict]:
+        return self._dbManager.GetStats()
+
+    def API_ReloadPlugin(self, name, callback = None) -> bool:
+        return self._pluginManager.ReloadPlugin(name, callback)
+
     def IsRestarting(self) -> bool:
         return self._isRestarting
 
@@ -1531,6 +1743,8 @@ def main():
     Log.info("Godfinger entry point.")
     global Server
     Server = MBIIServer()
+    if importprofile.Active != None:
+        importprofile.Active.Report()
     int_status = Server.GetStatus()
     runAgain = True
     if int_status == MBIIServer.STATUS_INIT:
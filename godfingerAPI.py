@@ -12,3 +12,7 @@ class API():
         self.GetDatabase        = None
         self.GetPlugin          = None # plugName, returns plugin object ptr, None if not found
         self.Restart            = None
+        self.GetRconStats       = None # returns a list of per-remote RTT/timeout statistics dicts, one per server interface
+        self.FlushDatabases     = None # name = None, commits deferred writes of one or all databases created through the API
+        self.GetDatabaseStats   = None # returns a list of per-database commit count / flush latency dicts
+        self.ReloadPlugin       = None # plugName, callback( plugName, isReloaded ) = None, reloads a plugin in place, False if it isn't loaded or is already reloading
@@ -23,6 +23,9 @@ GODFINGER_EVENT_TYPE_OBJECTIVE          = 19 # An event that fires if any object
 GODFINGER_EVENT_TYPE_ONNAMECHANGE       = 20 # NameChangeEvent - fires immediately on name change via broadcast message
 GODFINGER_EVENT_TYPE_BANNED_ENTRY_ATTEMPT = 21 # BannedEntryAttemptEvent - fires when qconsole logs a banned ip connection attempt
 GODFINGER_EVENT_TYPE_SERVER_SAY         = 22 # ServerSayEvent - fires when the server broadcasts a message
+GODFINGER_EVENT_TYPE_CVARS_CHANGED      = 23 # CvarsChangedEvent : changes : dict name -> ( old, new ), all cvar changes seen since the previous tick, old is None for new cvars
+GODFINGER_EVENT_TYPE_ASSETS_CHANGED     = 24 # AssetsChangedEvent : archives : dict "added"/"removed"/"modified" -> pk3 paths, assets : dict kind -> { "added", "removed", "changed" -> [ Asset ] }
+GODFINGER_EVENT_TYPE_SERVER_RESOURCE    = 25 # ServerResourceEvent : processName, metric : telemetry.METRIC_*, isHigh, value, limit, fired when a sampled server metric crosses its configured threshold
 
 GODFINGER_EVENT_TYPE_WD_UNAVAILABLE     = 1000 # watchdog raised event, game process is not active, happens only upon startup of GF
 GODFINGER_EVENT_TYPE_WD_EXISTING        = 1001 # watchdog raised event, game process is exiting upon GF startup
@@ -144,4 +147,28 @@ class ServerSayEvent(Event):
     """Event fired when the server broadcasts a chat message."""
     def __init__(self, message : str, isStartup = False):
         self.message = message
-        super().__init__(GODFINGER_EVENT_TYPE_SERVER_SAY, {}, isStartup)
\ No newline at end of file
+        super().__init__(GODFINGER_EVENT_TYPE_SERVER_SAY, {}, isStartup)
+
+class CvarsChangedEvent(Event):
+    """Event fired once per tick with every cvar change the cvar manager observed since the previous one."""
+    def __init__(self, changes : dict, isStartup = False):
+        self.changes = changes
+        super().__init__(GODFINGER_EVENT_TYPE_CVARS_CHANGED, changes, isStartup)
+
+class AssetsChangedEvent(Event):
+    """Event fired when pk3 archives were added, removed or replaced in the game directories while running, after the index and the asset catalog were updated."""
+    def __init__(self, archives : dict, assets : dict, isStartup = False):
+        self.archives = archives
+        self.assets = assets
+        super().__init__(GODFINGER_EVENT_TYPE_ASSETS_CHANGED, assets, isStartup)
+
+class ServerResourceEvent(Event):
+    """Event fired when a resource metric of the server process goes above its threshold ( isHigh ) or back under it.
+    The full time series is available from pswd.SharedMonitor.GetTelemetry(processName)."""
+    def __init__(self, processName : str, metric : str, isHigh : bool, value : float, limit : float, isStartup = False):
+        self.processName = processName
+        self.metric = metric
+        self.isHigh = isHigh
+        self.value = value
+        self.limit = limit
+        super().__init__(GODFINGER_EVENT_TYPE_SERVER_RESOURCE, {"metric": metric, "isHigh": isHigh, "value": value, "limit": limit}, isStartup)
@@ -7,7 +7,6 @@ import lib.shared.remoteconsole as remoteconsole
 import io
 import queue
 import logMessage
-from file_read_backwards import FileReadBackwards
 from typing import Any, Self
 import re
 import lib.shared.colors as colors
@@ -16,17 +15,17 @@ import lib.shared.client as client
 import math
 import lib.shared.pswd as pswd
 import lib.shared.observer as observer
-import psutil
+import lib.shared.serverstatus as serverstatus
+import lib.shared.lazyimport as lazyimport
 
 IsUnix = (os.name == "posix")
 IsWindows = (os.name == "nt")
 
 Log = logging.getLogger(__name__)
 
-if IsUnix:
-    import pty as ptym
-elif IsWindows:
-    import winpty as ptym
+# only the log reader and the pty interface need these, imported on first use
+filereadbackwards = lazyimport.LazyModule("file_read_backwards")
+ptym = lazyimport.LazyModule("winpty" if IsWindows else "pty")
 
 IFACE_TYPE_RCON = 0
 IFACE_TYPE_PTY = 1
@@ -78,7 +77,7 @@ class IServerInterface():
     def SetCvar(self, cvarName : str, value : str) -> str:
         return "Not implemented"
     
-    def GetCvar(self, cvarName : str) -> str:
+    def GetCvar(self, cvarName : str, fresh : bool = False) -> str:
         return "Not implemented"
 
     def SetTeam1(self, teamStr : str) -> str:
@@ -93,20 +92,23 @@ class IServerInterface():
     def ExecVstr(self, vstrName : str) -> str:
         return "Not implemented"
     
-    def GetTeam1(self) -> str:
+    def GetTeam1(self, fresh : bool = False) -> str:
         return "Not implemented"
     
-    def GetTeam2(self) -> str:
+    def GetTeam2(self, fresh : bool = False) -> str:
         return "Not implemented"
     
     def MapReload(self, mapname : str) -> str:
         return "Not implemented"
     
-    def GetCurrentMap(self) -> str:
+    def GetCurrentMap(self, fresh : bool = False) -> str:
         return "Not implemented"
     
     def Status(self) -> str:
         return "Not implemented"
+
+    def GetStatusSnapshot(self, maxAge : float = None) -> serverstatus.ServerStatus:
+        return None
     
     def CvarList(self) -> str:
         return "Not implemented"
@@ -159,6 +161,12 @@ class IServerInterface():
     def UnmarkTK(self, player_id : int) -> str:
         return
 
+    def GetRttStats(self) -> dict:
+        return None
+
+    def SetCvarCache(self, cache):
+        pass
+
 class AServerInterface(IServerInterface):
 
     def __init__(self):
@@ -168,6 +176,8 @@ class AServerInterface(IServerInterface):
         self._isOpened = False
         self._isReady = False
         self._it = self.TypeToEnum(type(self))
+        self._statusCache = serverstatus.StatusCache(self.Status)
+        self._cvarCache = None # cvar.CvarManager, serves GetCvar reads while the values are fresh
     
     def Open(self) -> bool:
         if self._isOpened:
@@ -204,10 +214,28 @@ class AServerInterface(IServerInterface):
     def IsReady(self) -> bool:
         return self._isReady
 
+    def GetStatusSnapshot(self, maxAge : float = None) -> serverstatus.ServerStatus:
+        """ Parsed status, served from a short TTL cache so concurrent callers share one request. """
+        if not self.IsOpened():
+            return None
+        return self._statusCache.Get(maxAge)
+
     def WaitUntilReady(self):
         while not self.IsReady():
             time.sleep(0.001)
 
+    def SetCvarCache(self, cache):
+        self._cvarCache = cache
+
+    def _GetCachedCvar(self, cvarName : str) -> str:
+        if self._cvarCache != None:
+            return self._cvarCache.GetCachedValue(cvarName)
+        return None
+
+    def _ObserveCvar(self, cvarName : str, value):
+        if self._cvarCache != None and isinstance(value, str):
+            self._cvarCache.OnCvarObserved(cvarName, value)
+
 
 class RconInterface(AServerInterface):
     def __init__(self, ipAddress : str, port : str, bindAddr : tuple, password : str, logPath : str, readDelay : int = 0.01, testRetrospect = False, procName = "mbiided.i386" if IsUnix else "mbiided.x86.exe", qconsolePath : str = None):
@@ -228,6 +256,7 @@ class RconInterface(AServerInterface):
 
         self._rcon = remoteconsole.RCON((ipAddress, port), bindAddr, password)
         self._testRetrospect = testRetrospect
+        self._initGameEvent = threading.Event() # set by the log reader on every InitGame line, used to detect map load completion
 
         self._wdObserver = observer.Observer(self._OnWDEvent)
         self._watchdog = pswd.ProcessWatchdog(procName)
@@ -313,27 +342,41 @@ class RconInterface(AServerInterface):
 
     def SetCvar(self, cvarName : str, value : str) -> str:
         if self.IsOpened():
-            return self._rcon.SetCvar(cvarName, value)
+            result = self._rcon.SetCvar(cvarName, value)
+            self._ObserveCvar(cvarName, str(value))
+            return result
         return None
     
-    def GetCvar(self, cvarName : str) -> str:
+    def GetCvar(self, cvarName : str, fresh : bool = False) -> str:
         if self.IsOpened():
-            return self._rcon.GetCvar(cvarName)
+            if not fresh:
+                cached = self._GetCachedCvar(cvarName)
+                if cached != None:
+                    return cached
+            value = self._rcon.GetCvar(cvarName)
+            self._ObserveCvar(cvarName, value)
+            return value
         return None
 
     def SetTeam1(self, teamStr : str) -> str:
         if self.IsOpened():
-            return self._rcon.SetTeam1(teamStr)
+            result = self._rcon.SetTeam1(teamStr)
+            self._ObserveCvar("g_siegeTeam1", teamStr)
+            return result
         return None
     
     def SetTeam2(self, teamStr : str) -> str:
         if self.IsOpened():
-            return self._rcon.SetTeam2(teamStr)
+            result = self._rcon.SetTeam2(teamStr)
+            self._ObserveCvar("g_siegeTeam2", teamStr)
+            return result
         return None
     
     def SetVstr(self, vstrName : str, value : str) -> str:
         if self.IsOpened():
-            return self._rcon.SetVstr(vstrName, value)
+            result = self._rcon.SetVstr(vstrName, value)
+            self._ObserveCvar(vstrName, value)
+            return result
         return None
     
     def ExecVstr(self, vstrName : str) -> str:
@@ -341,24 +384,48 @@ class RconInterface(AServerInterface):
             return self._rcon.ExecVstr(vstrName)
         return None
     
-    def GetTeam1(self) -> str:
+    def GetTeam1(self, fresh : bool = False) -> str:
         if self.IsOpened():
-            return self._rcon.GetTeam1()
+            cached = None if fresh else self._GetCachedCvar("g_siegeTeam1")
+            if cached != None:
+                return cached
+            value = self._rcon.GetTeam1()
+            self._ObserveCvar("g_siegeTeam1", value)
+            return value
         return None
     
-    def GetTeam2(self) -> str:
+    def GetTeam2(self, fresh : bool = False) -> str:
         if self.IsOpened():
-            return self._rcon.GetTeam2()
+            cached = None if fresh else self._GetCachedCvar("g_siegeTeam2")
+            if cached != None:
+                return cached
+            value = self._rcon.GetTeam2()
+            self._ObserveCvar("g_siegeTeam2", value)
+            return value
         return None
     
-    def MapReload(self, mapname : str) -> str:
+    def MapReload(self, mapname : str, timeout : float = 120) -> str:
         if self.IsOpened():
-            return self._rcon.MapReload(mapname)
+            # one deadline for the reply and the InitGame after it
+            deadline = time.monotonic() + timeout
+            self._initGameEvent.clear()
+            response = self._rcon.MapReload(mapname, timeout)
+            if not self._initGameEvent.wait(max(0.0, deadline - time.monotonic())):
+                Log.warning("No InitGame seen in the log %.0f seconds after map reload to %s." % (timeout, mapname))
+            return response
         return None
+
+    def GetRttStats(self) -> dict:
+        return self._rcon.GetRttStats()
     
-    def GetCurrentMap(self) -> str:
+    def GetCurrentMap(self, fresh : bool = False) -> str:
         if self.IsOpened():
-            return self._rcon.GetCurrentMap()
+            cached = None if fresh else self._GetCachedCvar("mapname")
+            if cached != None:
+                return cached
+            value = self._rcon.GetCurrentMap()
+            self._ObserveCvar("mapname", value)
+            return value
         return None
     
     def Status(self) -> str:
@@ -452,6 +519,8 @@ class RconInterface(AServerInterface):
                                 if len(line) > 0:
                                     if not is_qconsole:
                                         line = line[7:]
+                                        if line.startswith("InitGame:"):
+                                            self._initGameEvent.set()
                                         self._workingMessageQueue.put(logMessage.LogMessage(line))
                                     else:
                                         if line.startswith("SV packet ") or line.startswith("Game rejected "):
@@ -481,9 +550,9 @@ class RconInterface(AServerInterface):
         logFile = None
         try:
             if IsUnix:
-                logFile = FileReadBackwards(self._logPath, encoding="latin-1")
+                logFile = filereadbackwards.FileReadBackwards(self._logPath, encoding="latin-1")
             else:
-                logFile = FileReadBackwards(self._logPath, encoding="latin-1")
+                logFile = filereadbackwards.FileReadBackwards(self._logPath, encoding="latin-1")
 
 
             for line in logFile:
@@ -934,14 +1003,22 @@ class PtyInterface(AServerInterface):
         if self.IsOpened():
             cmdStr = "%s %s" % (cvarName, value)
             proc = PtyInterface.SetCvarProcessor(cmdStr)
-            return self.ExecuteCommand(cmdStr, proc)
+            result = self.ExecuteCommand(cmdStr, proc)
+            self._ObserveCvar(cvarName, str(value))
+            return result
         return None
     
-    def GetCvar(self, cvarName : str) -> str:
+    def GetCvar(self, cvarName : str, fresh : bool = False) -> str:
         if self.IsOpened():
+            if not fresh:
+                cached = self._GetCachedCvar(cvarName)
+                if cached != None:
+                    return cached
             cmdStr = "%s" % cvarName
             proc = PtyInterface.GetCvarProcessor(cmdStr)
-            return self.ExecuteCommand(cmdStr, proc)
+            value = self.ExecuteCommand(cmdStr, proc)
+            self._ObserveCvar(cvarName, value)
+            return value
         return None
 
     def SetTeam1(self, teamStr : str) -> str:
@@ -961,17 +1038,17 @@ class PtyInterface(AServerInterface):
     
     def ExecVstr(self, vstrName : str) -> str:
         if self.IsOpened():
-            return self.GetCvar(vstrName)
+            return self.GetCvar(vstrName, True) # must reach the server, never served from the cvar cache
         return None
     
-    def GetTeam1(self) -> str:
+    def GetTeam1(self, fresh : bool = False) -> str:
         if self.IsOpened():
-            return self.GetCvar("g_siegeteam1")
+            return self.GetCvar("g_siegeteam1", fresh)
         return None
     
-    def GetTeam2(self) -> str:
+    def GetTeam2(self, fresh : bool = False) -> str:
         if self.IsOpened():
-            return self.GetCvar("g_siegeteam2")
+            return self.GetCvar("g_siegeteam2", fresh)
         return None
     
     def MapReload(self, mapname : str) -> str:
@@ -981,9 +1058,9 @@ class PtyInterface(AServerInterface):
             return self.ExecuteCommand(cmdStr, proc)
         return None
     
-    def GetCurrentMap(self) -> str:
+    def GetCurrentMap(self, fresh : bool = False) -> str:
         if self.IsOpened():
-            return self.GetCvar("mapname")
+            return self.GetCvar("mapname", fresh)
         return None
     
     def Status(self) -> str:
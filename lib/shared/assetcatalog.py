@@ -0,0 +1,328 @@
+import bisect;
+import logging;
+import threading;
+import concurrent.futures;
+import lib.shared.pk3 as pk3;
+import lib.shared.teamconfig as teamconfig;
+import lib.shared.campaignrotation as campaignrotation;
+
+Log = logging.getLogger(__name__);
+
+class Asset():
+    def __init__(self, name : str, path : str, filename : str, pk3Manager : pk3.Pk3Manager):
+        self._name = name;
+        self._path = path;
+        self._filename = filename;
+        self._pk3Manager = pk3Manager;
+
+    # map name for maps ( path under maps/ without extension ), file name without extension for the rest, original case
+    def GetName(self) -> str:
+        return self._name;
+
+    # normalized virtual path, the index key
+    def GetPath(self) -> str:
+        return self._path;
+
+    # path as stored in the archive, original case
+    def GetFilename(self) -> str:
+        return self._filename;
+
+    def GetPk3(self) -> pk3.Pk3:
+        info = self._pk3Manager.GetFileInfo(self._path);
+        return info[0] if info != None else None;
+
+    def Read(self) -> pk3.PK3Bindata:
+        return self._pk3Manager.GetFile(self._path);
+
+    def __str__(self):
+        return "Asset %s : %s" % (self._name, self._path);
+
+    def __repr__(self):
+        return self.__str__();
+
+class AssetCollection():
+    """ Assets of one kind, sorted by path, looked up by name case insensitively. When names collide the first path wins. """
+    def __init__(self, kind : str, extension : str, prefix : str = ""):
+        self._kind = kind;
+        self._extension = extension;
+        self._prefix = prefix;
+        self._assets = dict[str, Asset](); # lower case name -> asset
+        self._candidates = dict[str, list[str]](); # lower case name -> every path with that name, sorted
+
+    def GetKind(self) -> str:
+        return self._kind;
+
+    def Accepts(self, path : str) -> bool:
+        return path.endswith(self._extension) and path.startswith(self._prefix);
+
+    def _NameOf(self, filename : str) -> str:
+        if self._prefix != "":
+            return filename[len(self._prefix):-len(self._extension)];
+        return filename[filename.rfind("/") + 1:-len(self._extension)];
+
+    def _Add(self, path : str, filename : str, pk3Manager : pk3.Pk3Manager):
+        name = self._NameOf(filename.replace("\\", "/"));
+        key = name.lower();
+        self._candidates.setdefault(key, []).append(path);
+        if not key in self._assets:
+            self._assets[key] = Asset(name, path, filename, pk3Manager);
+
+    # path was added to or removed from the index, returns the name it affects
+    def _Track(self, path : str, isPresent : bool) -> str:
+        key = self._NameOf(path);
+        candidates = self._candidates.setdefault(key, []);
+        i = bisect.bisect_left(candidates, path);
+        isTracked = i < len(candidates) and candidates[i] == path;
+        if isPresent and not isTracked:
+            candidates.insert(i, path);
+        elif not isPresent and isTracked:
+            del candidates[i];
+        if len(candidates) == 0:
+            del self._candidates[key];
+        return key;
+
+    # picks the asset of a name again, returns ( old, new ), either is None when the name appeared or disappeared
+    def _Resolve(self, key : str, pk3Manager : pk3.Pk3Manager) -> tuple:
+        old = self._assets.pop(key, None);
+        candidates = self._candidates.get(key);
+        if candidates == None:
+            return (old, None);
+        path = candidates[0];
+        filename = pk3Manager.GetFileInfo(path)[1].filename;
+        if old != None and old.GetPath() == path and old.GetFilename() == filename:
+            self._assets[key] = old;
+            return (old, old);
+        new = Asset(self._NameOf(filename.replace("\\", "/")), path, filename, pk3Manager);
+        self._assets[key] = new;
+        return (old, new);
+
+    def _Clear(self):
+        self._assets.clear();
+        self._candidates.clear();
+
+    def Get(self, name : str) -> Asset:
+        return self._assets.get(name.lower());
+
+    def Has(self, name : str) -> bool:
+        return name.lower() in self._assets;
+
+    def GetAll(self) -> list[Asset]:
+        return list(self._assets.values());
+
+    def GetNames(self) -> list[str]:
+        return [self._assets[k].GetName() for k in self._assets];
+
+    def __len__(self):
+        return len(self._assets);
+
+    def __iter__(self):
+        return iter(list(self._assets.values()));
+
+class ParseCache():
+    """
+    Parsed asset contents keyed by ( kind, crc, size ) of the archive entry, so every copy of the same file is parsed once
+    no matter which archive or catalog it comes from. Values are shared between callers and must not be modified.
+    """
+    def __init__(self):
+        self._parsed = dict[tuple, object]();
+        self._lock = threading.Lock();
+        self._hits = 0;
+        self._misses = 0;
+
+    def Get(self, key : tuple):
+        with self._lock:
+            parsed = self._parsed.get(key);
+            if parsed != None:
+                self._hits += 1;
+            else:
+                self._misses += 1;
+            return parsed;
+
+    def Has(self, key : tuple) -> bool:
+        with self._lock:
+            return key in self._parsed;
+
+    def Put(self, key : tuple, parsed):
+        with self._lock:
+            self._parsed[key] = parsed;
+
+    def Clear(self):
+        with self._lock:
+            self._parsed.clear();
+
+    def GetStats(self) -> dict:
+        with self._lock:
+            return { "entries" : len(self._parsed), "hits" : self._hits, "misses" : self._misses };
+
+SharedParseCache = ParseCache();
+
+# pool worker and LoadTeamConfig, a malformed file shouldn't fail the whole preload or the caller
+def _ParseTeamConfigOrNone(data : bytes) -> tuple:
+    try:
+        return teamconfig.ParseTeamConfig(data);
+    except (ValueError, UnicodeDecodeError):
+        return None;
+
+class AssetCatalog():
+    """
+    Typed view of the game assets in the merged pk3 index, shared by plugins through ServerData.
+    Collections are built in a single pass over the index at startup, Update applies the paths a Pk3Manager.Refresh reported.
+    """
+
+    MAPS = "maps";
+    TEAMS = "teams";
+    CAMPAIGNS = "campaigns";
+    CHARACTERS = "characters";
+    DEFAULT_PRELOAD_WORKERS = 4;
+    PRELOAD_POOL_MIN = 4096; # parsing a team config takes ~15 us, fewer files than this are done before a process pool has started
+
+    def __init__(self, pk3Manager : pk3.Pk3Manager, parseCache : ParseCache = None):
+        self._pk3Manager = pk3Manager;
+        self._parseCache = parseCache if parseCache != None else SharedParseCache;
+        self._collections = {
+            AssetCatalog.MAPS : AssetCollection(AssetCatalog.MAPS, ".bsp", "maps/"),
+            AssetCatalog.TEAMS : AssetCollection(AssetCatalog.TEAMS, ".mbtc"),
+            AssetCatalog.CAMPAIGNS : AssetCollection(AssetCatalog.CAMPAIGNS, ".mbcr"),
+            AssetCatalog.CHARACTERS : AssetCollection(AssetCatalog.CHARACTERS, ".mbch"),
+        };
+        self._isBuilt = False;
+
+    def Build(self):
+        collections = list(self._collections.values());
+        for collection in collections:
+            collection._Clear();
+        for path in self._pk3Manager.GetAllPaths():
+            for collection in collections:
+                if collection.Accepts(path):
+                    info = self._pk3Manager.GetFileInfo(path);
+                    collection._Add(path, info[1].filename, self._pk3Manager);
+                    break;
+        self._isBuilt = True;
+
+    def Update(self, paths : list[str]) -> dict:
+        """
+        Applies changed index paths, returns { kind : { "added" : [Asset], "removed" : [Asset], "changed" : [Asset] } }
+        for the kinds that changed, removed holds the assets as they were, changed the new ones.
+        """
+        if not self._isBuilt:
+            self.Build();
+            return {};
+        collections = list(self._collections.values());
+        touched = dict[str, set]();
+        for path in paths:
+            for collection in collections:
+                if collection.Accepts(path):
+                    isPresent = self._pk3Manager.GetFileInfo(path) != None;
+                    touched.setdefault(collection.GetKind(), set()).add(collection._Track(path, isPresent));
+                    break;
+        result = {};
+        for kind in touched:
+            collection = self._collections[kind];
+            diff = { "added" : [], "removed" : [], "changed" : [] };
+            for key in sorted(touched[kind]):
+                old, new = collection._Resolve(key, self._pk3Manager);
+                if old is new:
+                    continue;
+                elif old == None:
+                    diff["added"].append(new);
+                elif new == None:
+                    diff["removed"].append(old);
+                else:
+                    diff["changed"].append(new);
+            if len(diff["added"]) + len(diff["removed"]) + len(diff["changed"]) > 0:
+                result[kind] = diff;
+        return result;
+
+    def IsBuilt(self) -> bool:
+        return self._isBuilt;
+
+    def GetCollection(self, kind : str) -> AssetCollection:
+        return self._collections.get(kind);
+
+    def GetMaps(self) -> AssetCollection:
+        return self._collections[AssetCatalog.MAPS];
+
+    def GetTeams(self) -> AssetCollection:
+        return self._collections[AssetCatalog.TEAMS];
+
+    def GetCampaigns(self) -> AssetCollection:
+        return self._collections[AssetCatalog.CAMPAIGNS];
+
+    def GetCharacters(self) -> AssetCollection:
+        return self._collections[AssetCatalog.CHARACTERS];
+
+    # ( ( kind, crc, size ), ( Pk3, ZipInfo ) ) of the winning copy of an asset, None if it's gone from the index
+    def _GetParseKey(self, kind : str, asset : Asset) -> tuple:
+        info = self._pk3Manager.GetFileInfo(asset.GetPath());
+        if info == None:
+            return None;
+        return ((kind, info[1].CRC, info[1].file_size), info);
+
+    # parsed content of an asset from the parse cache, parser runs on the archive bytes on a miss, a None result isn't cached
+    def _GetParsed(self, kind : str, asset : Asset, parser):
+        found = self._GetParseKey(kind, asset);
+        if found == None:
+            return None;
+        key, info = found;
+        parsed = self._parseCache.Get(key);
+        if parsed == None:
+            parsed = parser(info[0].ReadInfo(info[1]).bytes);
+            if parsed != None:
+                self._parseCache.Put(key, parsed);
+        return parsed;
+
+    def LoadTeamConfig(self, name : str) -> teamconfig.TeamConfig:
+        asset = self.GetTeams().Get(name);
+        if asset == None:
+            return None;
+        parsed = self._GetParsed(AssetCatalog.TEAMS, asset, _ParseTeamConfigOrNone);
+        if parsed == None:
+            Log.warning("Team config %s is malformed or no longer in the archives." % asset.GetPath());
+            return None;
+        tc = teamconfig.TeamConfig(asset.GetName(), asset.GetFilename());
+        tc.LoadParsed(parsed);
+        return tc;
+
+    def LoadCampaignRotation(self, name : str) -> campaignrotation.CampaignRotation:
+        asset = self.GetCampaigns().Get(name);
+        if asset == None:
+            return None;
+        parsed = self._GetParsed(AssetCatalog.CAMPAIGNS, asset, campaignrotation.ParseCampaignRotation);
+        if parsed == None:
+            return None;
+        cr = campaignrotation.CampaignRotation(asset.GetName(), 0, None, asset.GetPk3());
+        cr.LoadParsed(parsed);
+        return cr;
+
+    def PreloadTeamConfigs(self, workers : int = DEFAULT_PRELOAD_WORKERS) -> int:
+        """
+        Parses every team config that isn't in the parse cache yet, returns how many were parsed.
+        Contents are read here, parsing goes to a pool of worker processes when there are at least PRELOAD_POOL_MIN of them.
+        """
+        keys = [];
+        seen = set[tuple]();
+        datas = [];
+        for asset in self.GetTeams():
+            found = self._GetParseKey(AssetCatalog.TEAMS, asset);
+            if found == None or self._parseCache.Has(found[0]) or found[0] in seen:
+                continue;
+            seen.add(found[0]);
+            keys.append(found[0]);
+            datas.append(bytes(found[1][0].ReadInfo(found[1][1]).bytes));
+        if workers > 1 and len(datas) >= AssetCatalog.PRELOAD_POOL_MIN:
+            with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as pool:
+                results = list(pool.map(_ParseTeamConfigOrNone, datas, chunksize = 256));
+        else:
+            results = [_ParseTeamConfigOrNone(data) for data in datas];
+        count = 0;
+        for key, parsed in zip(keys, results):
+            if parsed != None:
+                self._parseCache.Put(key, parsed);
+                count += 1;
+        return count;
+
+    def GetParseCacheStats(self) -> dict:
+        return self._parseCache.GetStats();
+
+    def GetStats(self) -> dict:
+        return { k : len(self._collections[k]) for k in self._collections };
@@ -1,16 +1,24 @@
-
 import pickle;
+import struct;
 import sys;
 from typing import Self;
 
 BE = sys.byteorder == 'big';
 
+# Integer helpers are stored in network ( big endian ) order
+_INT16 = struct.Struct(">h");
+_UINT16 = struct.Struct(">H");
+_INT32 = struct.Struct(">i");
+_UINT32 = struct.Struct(">I");
+
 class Buffer():
 
     DEFAULT_SIZE = 128;
 
     def __init__(self, approxSize = DEFAULT_SIZE, target : bytearray = None):
         if target != None:
+            if not isinstance(target, bytearray):
+                target = bytearray(target);
             self._bytes = target;
         else:
             self._bytes = bytearray(approxSize);
@@ -18,18 +26,18 @@ class Buffer():
         self._readPos = 0;
         self._writePos = 0;
 
+    # Amortised growth, at least doubles the storage so N writes cost O(N) copies in total.
+    # A new bytearray is allocated instead of resizing in place, so memoryviews handed out by Read/Peek stay valid.
     def _Grow(self, size = DEFAULT_SIZE):
-        nbytes = bytearray(self._size + size);
-        l = len(self._bytes);
-        for i in range (l):
-            nbytes[i] = self._bytes[i];
-        del self._bytes;
+        newSize = max(self._size * 2, self._size + size, Buffer.DEFAULT_SIZE);
+        nbytes = bytearray(newSize);
+        nbytes[:self._writePos] = self._bytes[:self._writePos];
         self._bytes = nbytes;
-        self._size += size;
-    
+        self._size = newSize;
+
     def __repr__(self):
         return "[Read/Write Buffer] bytes:" + str(self._bytes) + " size : " + str(self._size) + " read/write pos : " + str(self._readPos) + ";" + str(self._writePos);
-    
+
     def GetSize(self):
         return self._size;
 
@@ -51,7 +59,7 @@ class Buffer():
            self.Clear();
         self._readPos = 0;
         self._writePos = 0;
-    
+
     # Drops then creates new buffer as if was constructed
     def Reset(self):
         self.Drop();
@@ -59,52 +67,47 @@ class Buffer():
         self._size = Buffer.DEFAULT_SIZE;
 
     def Clear(self):
-        l = len(self._bytes);
-        for i in range(l):
-            self._bytes[i] = 0;
+        self._bytes[:] = bytes(self._size);
 
     def WriteGrow(self, size = DEFAULT_SIZE):
         if size + self._writePos >= self._size:
-            self._Grow(128 + size);
+            self._Grow(size);
 
     def Write(self, b : bytes):
         l = len(b);
         self.WriteGrow(l);
-        for i in range(l):
-            self._bytes[self._writePos+i] = b[i];
+        self._bytes[self._writePos:self._writePos + l] = b;
         self._writePos += l;
-    
+
     def WriteBool(self, b):
         self.WriteGrow(1);
-        self._bytes[self._writePos] = b;
+        self._bytes[self._writePos] = 1 if b else 0;
         self._writePos += 1;
-    
+
     def WriteInt8(self, i8):
         self.WriteGrow(1);
-        self._bytes[self._writePos] = i8;
+        self._bytes[self._writePos] = i8 & 0xFF;
         self._writePos += 1;
-    
+
     def WriteInt16(self, i16):
         self.WriteGrow(2);
-        for i in range(2):
-            self._bytes[self._writePos] = ( i16 >> ( 8 - ( i * 8 ) ) & 0xFF );
-            self._writePos += 1;
-        
+        _UINT16.pack_into(self._bytes, self._writePos, i16 & 0xFFFF);
+        self._writePos += 2;
+
     def WriteInt32(self, i32):
         self.WriteGrow(4);
-        for i in range(4):
-            self._bytes[self._writePos] = ( i32 >> ( 24 - ( i * 8 ) ) & 0xFF );
-            self._writePos += 1;
-    
+        _UINT32.pack_into(self._bytes, self._writePos, i32 & 0xFFFFFFFF);
+        self._writePos += 4;
+
     def WriteString(self, stringus : str, encoding = "utf-8"):
-        l = len(stringus);
-        self.WriteInt32(l); # store size
-        self.Write(stringus.encode(encoding));
-    
+        encoded = stringus.encode(encoding);
+        self.WriteInt32(len(encoded)); # store size in bytes, not characters
+        self.Write(encoded);
+
     def __lshift__(self, other):
         bb = pickle.dumps(other);
         self.Write(bb);
-    
+
     def CanRead(self, length):
         if self._readPos + length >= self._size:
             return False;
@@ -114,12 +117,14 @@ class Buffer():
     def HasToRead(self) -> bool:
         return self.GetEffective() > 0;
 
-    def Read(self, length) -> bytearray:
+    # Zero-copy view into the internal storage, valid until the buffer is written over again.
+    # Wrap in bytes() if the data has to outlive the next Write/Drop.
+    def Read(self, length) -> memoryview:
         result = None;
         if not self.CanRead(length):
             return result;
 
-        result = self._bytes[self._readPos:self._readPos + length];
+        result = memoryview(self._bytes)[self._readPos:self._readPos + length];
         self._readPos += length;
         return result;
 
@@ -132,7 +137,10 @@ class Buffer():
 
     # creates a buffer copy with working set of internal buffer slice with len of length
     def ReadAsBuf(self, length) -> Self:
-        result = Self(target = self.Read(length));
+        ba = self.Read(length);
+        if ba == None:
+            return None;
+        result = Buffer(target = bytearray(ba));
         return result;
 
     # size of 1 byte, 0 and less is false, more is true
@@ -141,7 +149,7 @@ class Buffer():
         if not self.CanRead(1):
             return result;
         else:
-            result = self._bytes[self._readPos];
+            result = self._bytes[self._readPos] > 0;
             self._readPos += 1;
         return result;
 
@@ -161,9 +169,8 @@ class Buffer():
         if not self.CanRead(2):
             return result;
         else:
-            for i in range(2):
-                result |= int(self._bytes[self._readPos]) >> (i * 8);
-                self._readPos += 1;
+            result = _INT16.unpack_from(self._bytes, self._readPos)[0];
+            self._readPos += 2;
         return result;
 
     # size of 4 byte
@@ -172,16 +179,17 @@ class Buffer():
         if not self.CanRead(4):
             return result;
         else:
-            for i in range(4):
-                result |= int(self._bytes[self._readPos]) >> (i * 8);
-                self._readPos += 1;
+            result = _INT32.unpack_from(self._bytes, self._readPos)[0];
+            self._readPos += 4;
         return result;
 
     def ReadString(self, encoding = "utf-8") ->str:
         result = "";
         l = self.ReadInt32();
         if l > 0:
-            result += self.Read(l).decode(encoding);
+            view = self.Read(l);
+            if view != None:
+                result += str(view, encoding);
         return result;
 
     # def __rshift__(self, other):
@@ -189,9 +197,9 @@ class Buffer():
     #     bb = self.Read(size);
     #     other = pickle.loads(bb);
 
-    def Peek(self, length) -> bytearray:
+    def Peek(self, length) -> memoryview:
         result = None;
-        readPos = self._readPos;
-        result = self.Read(length);
-        self._readPos = readPos;
+        if not self.CanRead(length):
+            return result;
+        result = memoryview(self._bytes)[self._readPos:self._readPos + length];
         return result;
@@ -1,12 +1,23 @@
 import traceback
+import lib.shared.pk3 as pk3;
 
+# Parses .mbcr content in a single pass, returns the key -> value pairs, lines without a value are skipped
+def ParseCampaignRotation(byte_buffer) -> dict[str, str]:
+    vars = {};
+    for line in str(byte_buffer, "utf-8").splitlines():
+        splitted = line.split(None, 2);
+        if len(splitted) > 1:
+            vars[splitted[0]] = splitted[1];
+    return vars;
 
 class CampaignRotation:
-    def __init__(self, name, id, vars = {}, srcPk = None):
+    __slots__ = ("_id", "_srcPk", "_filename", "_vars", "_isLoaded");
+
+    def __init__(self, name, id, vars = None, srcPk = None):
         self._id = id;
         self._srcPk = srcPk;
         self._filename = name.removesuffix(".mbcr");
-        self._vars = vars;
+        self._vars = vars if vars != None else {};
         self._isLoaded = False;
     
     def __key(self):
@@ -17,16 +28,36 @@ class CampaignRotation:
 
     # byte array loading, for archives and stuff in-memory, no streaming support yet, only bulk data blocks
     def LoadBytes(self, byte_buffer) -> bool: 
-        strContents = byte_buffer.decode();
-        lines = strContents.splitlines();
-        for line in lines:
-            splitted = line.strip().split();
-            self._vars[splitted[0]] = splitted[1];
+        return self.LoadParsed(ParseCampaignRotation(byte_buffer)); # bytes or a memoryview straight from the archive
+
+    # parsed is a ParseCampaignRotation result, possibly shared through a cache, so it's copied
+    def LoadParsed(self, parsed : dict[str, str]) -> bool:
+        self._vars.update(parsed);
         self._isLoaded = True;
         return True;
 
-    def LoadFromPk3(self, pk3Path, filename):
-        return False; # TODO IMPLEMENT THIS
+    def IsLoaded(self) -> bool:
+        return self._isLoaded;
+
+    def GetVars(self) -> dict[str, str]:
+        return self._vars;
+
+    # pk3Path is a path to the archive or an already loaded pk3.Pk3
+    def LoadFromPk3(self, pk3Path, filename) -> bool:
+        if not self._isLoaded:
+            srcPk = pk3Path;
+            if not isinstance(srcPk, pk3.Pk3):
+                srcPk = pk3.Pk3();
+                if not srcPk.Load(pk3Path):
+                    print("Failed on opening archive for campaign load " + str(pk3Path));
+                    return False;
+            zInfo = srcPk.GetInfo(pk3.NormalizePath(filename));
+            if zInfo == None:
+                print("Campaign %s not found in %s" % (filename, srcPk.GetPath()));
+                return False;
+            self._srcPk = srcPk;
+            return self.LoadBytes(srcPk.ReadInfo(zInfo).bytes);
+        return True;
 
     def LoadFile(self, filename) -> bool:
         if not self._isLoaded:
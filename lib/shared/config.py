@@ -2,7 +2,9 @@ import json;
 from typing import Self;
 import logging;
 import os;
-import yaml;
+import lib.shared.lazyimport as lazyimport;
+
+yaml = lazyimport.LazyModule("yaml"); # optional, only YAML configs need it
 
 
 Log = logging.getLogger(__name__);
@@ -143,7 +145,7 @@ class JsonConfig(Config):
 class YamlConfig(Config):
     @classmethod
     def from_file(cls, yamlPath, default : str = None, validate : bool = True):
-        if yaml == None:
+        if not yaml.IsAvailable():
             Log.error("PyYAML is not installed, cannot load YAML config.");
             return None;
         try:
@@ -181,7 +183,7 @@ class YamlConfig(Config):
     @classmethod
     def from_string(cls, target : str) -> Self:
         if target != None:
-            if yaml == None:
+            if not yaml.IsAvailable():
                 Log.error("PyYAML is not installed, cannot create config from YAML string.");
                 return None;
             try:
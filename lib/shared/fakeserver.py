@@ -0,0 +1,441 @@
+import argparse;
+import heapq;
+import itertools;
+import logging;
+import os;
+import random;
+import socket;
+import threading;
+import time;
+import lib.shared.threadcontrol as threadcontrol;
+
+Log = logging.getLogger(__name__);
+
+# A stand-in for the MBII dedicated server rcon endpoint, speaks the connectionless "\xff\xff\xff\xffrcon <pw> <cmd>" protocol
+# and answers with "print\n" packets formatted the way the engine does, so RCON/RconInterface and the parsers built on top of them
+# can be exercised without a game binary. Optionally appends the log lines the real server would produce into a fake server.log.
+
+OOB_HEADER = b"\xff\xff\xff\xff";
+PRINT_HEADER = OOB_HEADER + b"print\n";
+RCON_PREFIX = OOB_HEADER + b"rcon ";
+
+# engine flushes redirected prints in chunks of this size, each chunk is its own datagram
+OUTPUT_CHUNK = 1008;
+
+DEFAULT_CVARS = {
+    "sv_hostname"       : ("S A", "Godfinger Fake Server"),
+    "mapname"           : ("S R", "mb2_dotf"),
+    "g_gametype"        : ("S   L", "7"),
+    "sv_maxclients"     : ("S A L", "32"),
+    "sv_privateClients" : ("S A", "0"),
+    "g_siegeTeam1"      : ("    A", "LegendsOfTheGalaxy_Republic"),
+    "g_siegeTeam2"      : ("    A", "LegendsOfTheGalaxy_Separatists"),
+    "g_authenticity"    : ("S A", "0"),
+    "g_anticheat"       : ("    A", "1"),
+    "sv_extended"       : ("S R", "0"),
+    "version"           : ("S R", "JAmp: v1.0.1.1 linux-i386 Nov 11 2023"),
+    "fs_game"           : ("S s I", "MBII"),
+};
+
+class FakeClient():
+    def __init__(self, id : int, name : str, address : str, score = 0, ping = 50):
+        self.id = id;
+        self.name = name;
+        self.address = address;
+        self.score = score;
+        self.ping = ping;
+        self.team = 3; # TEAM_SPEC
+
+class FakeServer():
+    def __init__(self, address = ("127.0.0.1", 0), password = "fakepassword", logPath : str = None,
+                 latency = 0.0, jitter = 0.0, loss = 0.0, rateLimit = 0, cvars : dict = None, seed = None):
+        """
+        :param address: (ip, port) to bind, port 0 lets the OS pick one, see GetAddress
+        :param password: rcon password, anything else is answered with "Bad rconpassword."
+        :param logPath: when set, log lines the real server would write are appended to this file
+        :param latency: seconds to delay every response
+        :param jitter: extra uniformly distributed random delay in seconds
+        :param loss: probability 0..1 of silently dropping an incoming request
+        :param rateLimit: maximum requests per second per source ip ( sv_maxOOBRateIP ), 0 disables limiting
+        """
+        self._bindAddress = address;
+        self._password = password;
+        self._logPath = logPath;
+        self.latency = latency;
+        self.jitter = jitter;
+        self.loss = loss;
+        self.rateLimit = rateLimit;
+        self._random = random.Random(seed);
+        self._lock = threading.RLock();
+        self._cvars = dict[str, list]();
+        for name, (flags, value) in (cvars if cvars != None else DEFAULT_CVARS).items():
+            self._cvars[name.lower()] = [name, flags, value];
+        self._clients = dict[int, FakeClient]();
+        self._startTime = time.time();
+        self._sock = None;
+        self._control = threadcontrol.ThreadControl();
+        self._recvThread = None;
+        self._sendThread = None;
+        self._sendQueue = [];
+        self._sendCond = threading.Condition();
+        self._sendSeq = itertools.count();
+        self._buckets = dict[str, list]();
+        self._commands = {
+            "status"        : self._CmdStatus,
+            "cvarlist"      : self._CmdCvarlist,
+            "set"           : self._CmdSet,
+            "seta"          : self._CmdSet,
+            "unset"         : self._CmdUnset,
+            "vstr"          : self._CmdVstr,
+            "dumpuser"      : self._CmdDumpuser,
+            "map"           : self._CmdMap,
+            "mbmode"        : self._CmdMbmode,
+            "say"           : self._CmdSay,
+            "svsay"         : self._CmdSay,
+            "svtell"        : self._CmdSvtell,
+            "smsay"         : self._CmdSmsay,
+            "clientkick"    : self._CmdClientkick,
+            "echo"          : self._CmdEcho,
+        };
+        self.requestsReceived = 0;
+        self.requestsDropped = 0;
+        self.requestsRateLimited = 0;
+        self.commandsExecuted = list[str]();
+
+    def GetAddress(self) -> tuple:
+        if self._sock != None:
+            return self._sock.getsockname();
+        return self._bindAddress;
+
+    def GetPassword(self) -> str:
+        return self._password;
+
+    def Start(self):
+        if self._sock == None:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM);
+            self._sock.bind(self._bindAddress);
+            self._sock.settimeout(0.05);
+            self._control.stop = False;
+            self._recvThread = threading.Thread(target=self._RecvThreadHandler, daemon=True);
+            self._sendThread = threading.Thread(target=self._SendThreadHandler, daemon=True);
+            self._recvThread.start();
+            self._sendThread.start();
+            Log.info("Fake server listening on %s:%i" % self.GetAddress());
+
+    def Stop(self):
+        if self._sock != None:
+            self._control.stop = True;
+            with self._sendCond:
+                self._sendCond.notify_all();
+            self._recvThread.join();
+            self._sendThread.join();
+            self._sock.close();
+            self._sock = None;
+
+    # Game state manipulation, mirrors what would happen on a real server and writes matching log lines
+
+    def GetCvar(self, name : str) -> str:
+        with self._lock:
+            entry = self._cvars.get(name.lower());
+            return entry[2] if entry != None else None;
+
+    def SetCvar(self, name : str, value : str):
+        with self._lock:
+            entry = self._cvars.get(name.lower());
+            if entry == None:
+                self._cvars[name.lower()] = [name, "?", value];
+            else:
+                entry[2] = value;
+
+    def GetClients(self) -> list[FakeClient]:
+        with self._lock:
+            return list(self._clients.values());
+
+    def ConnectClient(self, name : str, address : str = None, id : int = None, writeLog = True) -> FakeClient:
+        with self._lock:
+            if id == None:
+                id = 0;
+                while id in self._clients:
+                    id += 1;
+            if address == None:
+                address = "10.0.%i.%i:29071" % (id // 250, id % 250 + 1);
+            cl = FakeClient(id, name, address);
+            self._clients[id] = cl;
+        if writeLog:
+            self.WriteLog("ClientConnect: %s (id: %i) (IP: %s)" % (name, id, address),
+                          "ClientUserinfoChanged: %i n\\%s\\t\\%i" % (id, name, cl.team),
+                          "ClientBegin: %i" % id);
+        return cl;
+
+    def DisconnectClient(self, id : int, writeLog = True) -> bool:
+        with self._lock:
+            cl = self._clients.pop(id, None);
+        if cl != None and writeLog:
+            self.WriteLog("ClientDisconnect: %i" % id);
+        return cl != None;
+
+    def WriteLog(self, *lines : str):
+        """ Appends lines with the engine's "mmm:ss " timestamp prefix, the same 7 characters the log reader strips. """
+        if self._logPath == None:
+            return;
+        uptime = int(time.time() - self._startTime);
+        prefix = "%3i:%02i " % (min(uptime // 60, 999), uptime % 60);
+        with self._lock:
+            with open(self._logPath, "a", encoding="utf-8") as f:
+                for line in lines:
+                    f.write(prefix + line + "\n");
+
+    def ChangeMap(self, mapName : str):
+        self.SetCvar("mapname", mapName);
+        serverInfo = "\\".join("%s\\%s" % (entry[0], entry[2]) for entry in self._cvars.values() if "S" in entry[1]);
+        self.WriteLog("ShutdownGame:", "-" * 60, "InitGame: \\" + serverInfo);
+        with self._lock:
+            clients = list(self._clients.values());
+        for cl in clients:
+            self.WriteLog("ClientConnect: %s (id: %i) (IP: %s)" % (cl.name, cl.id, cl.address), "ClientBegin: %i" % cl.id);
+
+    # Networking
+
+    def _IsRateLimited(self, ip : str) -> bool:
+        if self.rateLimit <= 0:
+            return False;
+        now = time.time();
+        bucket = self._buckets.get(ip);
+        if bucket == None:
+            bucket = [float(self.rateLimit), now];
+            self._buckets[ip] = bucket;
+        tokens = min(float(self.rateLimit), bucket[0] + (now - bucket[1]) * self.rateLimit);
+        bucket[1] = now;
+        if tokens < 1.0:
+            bucket[0] = tokens;
+            return True;
+        bucket[0] = tokens - 1.0;
+        return False;
+
+    def _RecvThreadHandler(self):
+        while not self._control.stop:
+            try:
+                data, addr = self._sock.recvfrom(65536);
+            except socket.timeout:
+                continue;
+            except OSError:
+                break;
+            self.requestsReceived += 1;
+            if self.loss > 0 and self._random.random() < self.loss:
+                self.requestsDropped += 1;
+                continue;
+            if self._IsRateLimited(addr[0]):
+                self.requestsRateLimited += 1;
+                continue;
+            response = self._HandlePacket(data);
+            if response != None:
+                self._Schedule(response, addr);
+
+    def _Schedule(self, response : str, addr):
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter > 0 else 0);
+        encoded = response.encode("utf-8", "replace");
+        packets = [PRINT_HEADER + encoded[i:i + OUTPUT_CHUNK] for i in range(0, max(len(encoded), 1), OUTPUT_CHUNK)];
+        with self._sendCond:
+            heapq.heappush(self._sendQueue, (time.time() + delay, next(self._sendSeq), packets, addr));
+            self._sendCond.notify();
+
+    def _SendThreadHandler(self):
+        while True:
+            with self._sendCond:
+                while not self._control.stop and (len(self._sendQueue) == 0 or self._sendQueue[0][0] > time.time()):
+                    wait = None if len(self._sendQueue) == 0 else self._sendQueue[0][0] - time.time();
+                    self._sendCond.wait(wait);
+                if self._control.stop:
+                    break;
+                _, _, packets, addr = heapq.heappop(self._sendQueue);
+            for packet in packets:
+                try:
+                    self._sock.sendto(packet, addr);
+                except OSError:
+                    pass;
+
+    def _HandlePacket(self, data : bytes) -> str:
+        if not data.startswith(RCON_PREFIX):
+            return None;
+        text = data[len(RCON_PREFIX):].decode("utf-8", "replace").strip();
+        parts = text.split(" ", 1);
+        if len(parts) < 1 or parts[0] != self._password:
+            return "Bad rconpassword.\n";
+        cmdLine = parts[1] if len(parts) > 1 else "";
+        with self._lock:
+            self.commandsExecuted.append(cmdLine);
+        return self.Execute(cmdLine);
+
+    # Commands, responses are engine formatted text without the print header
+
+    def Execute(self, cmdLine : str) -> str:
+        args = cmdLine.split();
+        if len(args) == 0:
+            return "\n";
+        cmd = args[0].lower();
+        handler = self._commands.get(cmd);
+        if handler != None:
+            return handler(cmdLine, args);
+        with self._lock:
+            entry = self._cvars.get(cmd);
+        if entry != None:
+            if len(args) > 1:
+                self.SetCvar(entry[0], self._Unquote(cmdLine.split(" ", 1)[1]));
+                return "\n";
+            return self._PrintCvarCommand(entry);
+        # every other command the interface uses ( mute, marktk, snd, exec, ... ) just succeeds silently
+        return "\n";
+
+    @staticmethod
+    def _Unquote(value : str) -> str:
+        value = value.strip();
+        if len(value) > 1 and value[0] == "\"" and value[-1] == "\"":
+            value = value[1:-1];
+        return value;
+
+    def _PrintCvarCommand(self, entry) -> str:
+        if entry[0].lower() == "mapname":
+            return self._PrintCvar(entry);
+        return "\"%s\" is:\"%s^7\" default:\"%s^7\"\n" % (entry[0], entry[2], entry[2]);
+
+    @staticmethod
+    def _PrintCvar(entry) -> str:
+        return "^9Cvar ^7%s = ^9\"^7%s^9\"^7\n" % (entry[0], entry[2]);
+
+    def _CmdStatus(self, cmdLine, args) -> str:
+        with self._lock:
+            clients = sorted(self._clients.values(), key=lambda c: c.id);
+            maxClients = int(self.GetCvar("sv_maxclients") or 32) - int(self.GetCvar("sv_privateClients") or 0);
+            uptime = int(time.time() - self._startTime);
+            addr = self.GetAddress();
+            lines = [
+                "hostname: %s^7" % self.GetCvar("sv_hostname"),
+                "version : 1.0.1.1 26",
+                "game    : %s" % self.GetCvar("fs_game"),
+                "udp/ip  : %s:%i os(Linux) type(public dedicated)" % (addr[0], addr[1]),
+                "map     : %s gametype(%s)" % (self.GetCvar("mapname"), self.GetCvar("g_gametype")),
+                "players : %i humans, 0 bots (%i max)" % (len(clients), maxClients),
+                "uptime  : %ih%im%is" % (uptime // 3600, (uptime // 60) % 60, uptime % 60),
+                "cl score ping name            address                                 rate ",
+                "-- ----- ---- --------------- --------------------------------------- -----",
+            ];
+            for cl in clients:
+                lines.append("%2i %5i %4i (%s)^7 %s %5i" % (cl.id, cl.score, cl.ping, cl.name, cl.address, 25000));
+        return "\n".join(lines) + "\n\n";
+
+    def _CmdCvarlist(self, cmdLine, args) -> str:
+        with self._lock:
+            entries = sorted(self._cvars.values(), key=lambda e: e[0].lower());
+            lines = ["%-11s ^7%s = ^9\"^7%s^9\"^7" % (entry[1], entry[0], entry[2]) for entry in entries];
+        lines.append("");
+        lines.append("%i total cvars" % len(entries));
+        lines.append("%i cvar indexes" % len(entries));
+        return "\n".join(lines) + "\n";
+
+    def _CmdSet(self, cmdLine, args) -> str:
+        if len(args) < 2:
+            return "usage: set <variable> <value>\n";
+        if len(args) == 2:
+            with self._lock:
+                entry = self._cvars.get(args[1].lower());
+            if entry == None:
+                return "Cvar %s does not exist.\n" % args[1];
+            return self._PrintCvar(entry);
+        value = self._Unquote(cmdLine.split(None, 2)[2]);
+        self.SetCvar(args[1], value);
+        return "\n";
+
+    def _CmdUnset(self, cmdLine, args) -> str:
+        if len(args) > 1:
+            with self._lock:
+                self._cvars.pop(args[1].lower(), None);
+        return "\n";
+
+    def _CmdVstr(self, cmdLine, args) -> str:
+        if len(args) < 2:
+            return "vstr <variablename> : execute a variable command\n";
+        script = self.GetCvar(args[1]) or "";
+        output = "";
+        for sub in script.split(";"):
+            sub = sub.strip();
+            if len(sub) > 0:
+                output += self.Execute(sub).rstrip("\n");
+        return output + "\n";
+
+    def _CmdDumpuser(self, cmdLine, args) -> str:
+        if len(args) < 2:
+            return "Usage: dumpuser <userid>\n";
+        try:
+            with self._lock:
+                cl = self._clients.get(int(args[1]));
+        except ValueError:
+            cl = None;
+        if cl == None:
+            return "Bad player slot: %s\n" % args[1];
+        info = [("ip", cl.address), ("name", cl.name), ("team", str(cl.team)), ("rate", "25000"), ("snaps", "40"), ("model", "kyle/default")];
+        return "userinfo\n--------\n" + "".join("%-20s%s\n" % (k, v) for k, v in info);
+
+    def _CmdMap(self, cmdLine, args) -> str:
+        if len(args) < 2:
+            return "\n";
+        self.ChangeMap(args[1]);
+        return "\n";
+
+    def _CmdMbmode(self, cmdLine, args) -> str:
+        if len(args) > 1:
+            self.SetCvar("g_authenticity", args[1]);
+        if len(args) > 2:
+            self.ChangeMap(args[2]);
+        return "\n";
+
+    def _CmdSay(self, cmdLine, args) -> str:
+        message = cmdLine.split(" ", 1)[1] if len(args) > 1 else "";
+        self.WriteLog("say: Server: %s" % message);
+        return "broadcast: print \"Server: %s\\n\"\n" % message;
+
+    def _CmdSvtell(self, cmdLine, args) -> str:
+        return "\n";
+
+    def _CmdSmsay(self, cmdLine, args) -> str:
+        return "\n";
+
+    def _CmdClientkick(self, cmdLine, args) -> str:
+        if len(args) > 1:
+            try:
+                self.DisconnectClient(int(args[1]));
+            except ValueError:
+                pass;
+        return "\n";
+
+    def _CmdEcho(self, cmdLine, args) -> str:
+        return (cmdLine.split(" ", 1)[1] if len(args) > 1 else "") + "\n";
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="fakeserver", description="Local UDP stand-in for an MBII dedicated server rcon endpoint.");
+    parser.add_argument("--ip", default="127.0.0.1");
+    parser.add_argument("--port", type=int, default=29070);
+    parser.add_argument("--password", default="fakepassword");
+    parser.add_argument("--log", default=None, help="fake server.log path to append log lines to");
+    parser.add_argument("--latency", type=float, default=0.0);
+    parser.add_argument("--jitter", type=float, default=0.0);
+    parser.add_argument("--loss", type=float, default=0.0);
+    parser.add_argument("--rate", type=int, default=0, help="max requests per second per ip, 0 to disable");
+    parser.add_argument("--clients", type=int, default=0, help="number of fake clients connected on start");
+    args = parser.parse_args();
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)08s %(name)s %(message)s');
+    if args.log != None and not os.path.exists(args.log):
+        open(args.log, "w").close();
+    server = FakeServer((args.ip, args.port), args.password, args.log, args.latency, args.jitter, args.loss, args.rate);
+    for i in range(args.clients):
+        server.ConnectClient("Padawan%i" % i);
+    server.Start();
+    try:
+        while True:
+            time.sleep(1);
+    except KeyboardInterrupt:
+        pass;
+    server.Stop();
+
+if __name__ == "__main__":
+    main();
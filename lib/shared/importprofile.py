@@ -0,0 +1,155 @@
+import sys;
+import time;
+import logging;
+import threading;
+import contextlib;
+
+Log = logging.getLogger(__name__);
+
+CORE_OWNER = "godfinger";
+
+# the installed profiler, None unless godfinger was started with --importprofile
+Active = None;
+
+class _TimedLoader():
+    """ Wraps the loader of one module spec to time its execution, puts the real loader back once the module is executed. """
+    def __init__(self, loader, profiler, name : str):
+        self._loader = loader;
+        self._profiler = profiler;
+        self._name = name;
+
+    def create_module(self, spec):
+        spec.loader = self._loader;
+        try:
+            return self._loader.create_module(spec);
+        finally:
+            spec.loader = self;
+
+    def exec_module(self, module):
+        self._profiler._Enter(self._name);
+        try:
+            self._loader.exec_module(module);
+        finally:
+            self._profiler._Leave(self._name);
+            module.__loader__ = self._loader;
+            if getattr(module, "__spec__", None) != None:
+                module.__spec__.loader = self._loader;
+
+    def __getattr__(self, attr : str):
+        return getattr(self._loader, attr);
+
+class ImportProfiler():
+    """
+    Times every module import like python -X importtime, but attributes each one to whoever asked for it :
+    a plugin while PluginManager imports or initializes it, godfinger core otherwise.
+    Works as the first meta path finder, wrapping the loaders the other finders return.
+    """
+    def __init__(self):
+        self._local = threading.local();
+        self._lock = threading.Lock();
+        self._records = []; # ( owner, module, importing module, depth, self seconds, cumulative seconds )
+        self._isInstalled = False;
+
+    def Install(self):
+        if not self._isInstalled:
+            sys.meta_path.insert(0, self);
+            self._isInstalled = True;
+
+    def Uninstall(self):
+        if self._isInstalled:
+            sys.meta_path.remove(self);
+            self._isInstalled = False;
+
+    def find_spec(self, fullname, path, target = None):
+        local = self._local;
+        if getattr(local, "isFinding", False):
+            return None;
+        local.isFinding = True;
+        try:
+            spec = None;
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue;
+                spec = finder.find_spec(fullname, path, target);
+                if spec != None:
+                    break;
+        finally:
+            local.isFinding = False;
+        if spec == None or spec.loader == None or not hasattr(spec.loader, "exec_module"):
+            return spec;
+        spec.loader = _TimedLoader(spec.loader, self, fullname);
+        return spec;
+
+    @contextlib.contextmanager
+    def Attribute(self, owner : str):
+        previous = getattr(self._local, "owner", None);
+        self._local.owner = owner;
+        try:
+            yield;
+        finally:
+            self._local.owner = previous;
+
+    def _Enter(self, name : str):
+        stack = getattr(self._local, "stack", None);
+        if stack == None:
+            stack = self._local.stack = [];
+        stack.append([name, time.perf_counter(), 0.0]);
+
+    def _Leave(self, name : str):
+        stack = self._local.stack;
+        _, start, children = stack.pop();
+        elapsed = time.perf_counter() - start;
+        parent = None;
+        if len(stack) > 0:
+            stack[-1][2] += elapsed;
+            parent = stack[-1][0];
+        owner = getattr(self._local, "owner", None);
+        with self._lock:
+            self._records.append((owner if owner != None else CORE_OWNER, name, parent, len(stack), elapsed - children, elapsed));
+
+    def GetRecords(self) -> list[tuple]:
+        with self._lock:
+            return list(self._records);
+
+    # owner -> { "total", "modules", "heaviest" : [ ( module, cumulative seconds ) ] }, totals count top level imports only,
+    # a plugin's heaviest are the modules its own module imports rather than the plugin module itself
+    def GetSummary(self, heaviest : int = 5) -> dict:
+        summary = {};
+        for owner, name, parent, depth, selfTime, cumulative in self.GetRecords():
+            entry = summary.setdefault(owner, { "total" : 0.0, "modules" : 0, "heaviest" : [] });
+            entry["modules"] += 1;
+            if depth == 0:
+                entry["total"] += cumulative;
+            if (depth == 0 and name != owner) or parent == owner:
+                entry["heaviest"].append((name, cumulative));
+        for entry in summary.values():
+            entry["heaviest"] = sorted(entry["heaviest"], key = lambda x : x[1], reverse = True)[:heaviest];
+        return summary;
+
+    def Report(self):
+        summary = self.GetSummary();
+        lines = ["Import profile, heaviest first :"];
+        for owner in sorted(summary, key = lambda o : summary[o]["total"], reverse = True):
+            entry = summary[owner];
+            heaviest = ", ".join("%s %.1f" % (name, seconds * 1000) for name, seconds in entry["heaviest"]);
+            lines.append("  %-50s %8.1f ms in %4i modules : %s" % (owner, entry["total"] * 1000, entry["modules"], heaviest));
+        Log.info("\n".join(lines));
+        if Log.isEnabledFor(logging.DEBUG):
+            # same layout as -X importtime, in microseconds
+            details = ["import time: self [us] | cumulative | imported package | owner"];
+            for owner, name, parent, depth, selfTime, cumulative in self.GetRecords():
+                details.append("import time: %9i | %10i | %s%s | %s" % (selfTime * 1e6, cumulative * 1e6, "  " * depth, name, owner));
+            Log.debug("\n".join(details));
+
+def Install() -> ImportProfiler:
+    global Active;
+    if Active == None:
+        Active = ImportProfiler();
+        Active.Install();
+    return Active;
+
+# attributes imports done by this thread inside the block to owner, does nothing when profiling is off
+def Attribute(owner : str):
+    if Active == None:
+        return contextlib.nullcontext();
+    return Active.Attribute(owner);
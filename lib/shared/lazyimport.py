@@ -0,0 +1,50 @@
+import importlib;
+import importlib.util;
+import threading;
+
+class LazyModule():
+    """
+    Stands in for a module until one of its attributes is used, then imports it, once, under a lock.
+    Meant for heavy or optional third party modules that are only needed on some code paths :
+
+        yaml = lazyimport.LazyModule("yaml");
+        ...
+        if yaml.IsAvailable():
+            data = yaml.safe_load(text); # imported here, on first use
+
+    A missing module raises the usual ImportError on first use, IsAvailable tells without raising.
+    """
+    def __init__(self, name : str):
+        self._name = name;
+        self._module = None;
+        self._isAvailable = None;
+        self._lock = threading.Lock();
+
+    def Load(self):
+        if self._module == None:
+            with self._lock:
+                if self._module == None:
+                    self._module = importlib.import_module(self._name);
+                    self._isAvailable = True;
+        return self._module;
+
+    def IsLoaded(self) -> bool:
+        return self._module != None;
+
+    # true when the module can be imported, found without executing it
+    def IsAvailable(self) -> bool:
+        if self._isAvailable == None:
+            try:
+                self._isAvailable = self._module != None or importlib.util.find_spec(self._name) != None;
+            except (ImportError, ValueError):
+                self._isAvailable = False; # parent package of a dotted name is missing
+        return self._isAvailable;
+
+    def GetName(self) -> str:
+        return self._name;
+
+    def __getattr__(self, attr : str):
+        return getattr(self.Load(), attr);
+
+    def __repr__(self):
+        return "<lazy module %s%s>" % (self._name, "" if self._module == None else ", loaded");
@@ -1,9 +1,181 @@
-
-
 import os;
+import re;
+import bisect;
+import fnmatch;
+import marshal;
+import mmap;
+import sqlite3;
+import struct;
+import threading;
 import zipfile;
+import zlib;
+from collections import OrderedDict;
+from concurrent.futures import ThreadPoolExecutor;
 import lib.shared.bindata as bindata;
 
+WILDCARDS = "*?[";
+
+# Virtual paths are case insensitive and use forward slashes, like the engine's filesystem
+def NormalizePath(path : str) -> str:
+    return path.replace("\\", "/").lower();
+
+# Turns a query into ( literalPrefix, predicate ), predicate takes a normalized path.
+# A string is an exact path or a glob ( fnmatch rules, * also crosses "/" ), a compiled regex is searched in the normalized path,
+# anything else is called as matchFunction( path ) -> bool.
+def CompileMatch(match) -> tuple:
+    if isinstance(match, str):
+        pattern = NormalizePath(match);
+        wildcard = len(pattern);
+        for ch in WILDCARDS:
+            pos = pattern.find(ch);
+            if pos != -1 and pos < wildcard:
+                wildcard = pos;
+        if wildcard == len(pattern):
+            return (pattern, lambda path : path == pattern);
+        regex = re.compile(fnmatch.translate(pattern));
+        return (pattern[:wildcard], regex.match);
+    elif isinstance(match, re.Pattern):
+        return ("", lambda path : match.search(path) != None);
+    return ("", match);
+
+# ZipInfo fields kept by the index cache, enough to list an archive and locate its members without reading its central directory
+def EntryFromInfo(zInfo : zipfile.ZipInfo) -> tuple:
+    return (zInfo.filename, zInfo.header_offset, zInfo.compress_size, zInfo.file_size, zInfo.compress_type, zInfo.CRC, zInfo.flag_bits);
+
+def InfoFromEntry(entry : tuple) -> zipfile.ZipInfo:
+    zInfo = zipfile.ZipInfo(entry[0]);
+    zInfo.header_offset = entry[1];
+    zInfo.compress_size = entry[2];
+    zInfo.file_size = entry[3];
+    zInfo.compress_type = entry[4];
+    zInfo.CRC = entry[5];
+    zInfo.flag_bits = entry[6];
+    return zInfo;
+
+class Pk3IndexCache():
+    """
+    On disk cache of pk3 entry tables, so unchanged archives don't have their central directory read on every startup.
+    Entries are stored per archive as a compressed marshal blob, keyed by absolute path and validated by size and modification time.
+    """
+
+    FORMAT_VERSION = 1;
+
+    def __init__(self, path : str):
+        self._path = path;
+        self._connection = None;
+        self._hits = 0;
+        self._misses = 0;
+
+    def Open(self) -> bool:
+        try:
+            self._connection = sqlite3.connect(self._path, check_same_thread = False);
+            self._connection.execute("CREATE TABLE IF NOT EXISTS meta ( key TEXT PRIMARY KEY, value INTEGER )");
+            self._connection.execute("CREATE TABLE IF NOT EXISTS archives ( path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, entries BLOB )");
+            row = self._connection.execute("SELECT value FROM meta WHERE key = 'format'").fetchone();
+            if row == None or row[0] != Pk3IndexCache.FORMAT_VERSION:
+                self._connection.execute("DELETE FROM archives");
+                self._connection.execute("REPLACE INTO meta ( key, value ) VALUES ( 'format', ? )", (Pk3IndexCache.FORMAT_VERSION,));
+            self._connection.commit();
+            return True;
+        except sqlite3.Error as ex:
+            print("Unable to open pk3 index cache %s : %s" % (self._path, str(ex)));
+            self._connection = None;
+            return False;
+
+    def Close(self):
+        if self._connection != None:
+            self._connection.commit();
+            self._connection.close();
+            self._connection = None;
+
+    def IsOpened(self) -> bool:
+        return self._connection != None;
+
+    # entry tuples of the archive if it didn't change since it was stored, None otherwise
+    def Get(self, filePath : str, size : int, mtime : int) -> list[tuple]:
+        if self._connection != None:
+            row = self._connection.execute("SELECT size, mtime, entries FROM archives WHERE path = ?", (os.path.abspath(filePath),)).fetchone();
+            if row != None and row[0] == size and row[1] == mtime:
+                try:
+                    entries = marshal.loads(zlib.decompress(row[2]));
+                    self._hits += 1;
+                    return entries;
+                except (ValueError, EOFError, TypeError, zlib.error):
+                    pass;
+        self._misses += 1;
+        return None;
+
+    def Put(self, filePath : str, size : int, mtime : int, entries : list[tuple]):
+        if self._connection != None:
+            self._connection.execute("REPLACE INTO archives ( path, size, mtime, entries ) VALUES ( ?, ?, ?, ? )",
+                                     (os.path.abspath(filePath), size, mtime, zlib.compress(marshal.dumps(entries), 1)));
+
+    def Commit(self):
+        if self._connection != None:
+            self._connection.commit();
+
+    # drops archives that are no longer loaded, commits pending changes
+    def Prune(self, keepPaths : list[str]):
+        if self._connection != None:
+            keep = set(os.path.abspath(x) for x in keepPaths);
+            stale = [(row[0],) for row in self._connection.execute("SELECT path FROM archives") if row[0] not in keep];
+            self._connection.executemany("DELETE FROM archives WHERE path = ?", stale);
+            self._connection.commit();
+
+    def GetStats(self) -> dict:
+        return { "hits" : self._hits, "misses" : self._misses };
+
+class ContentCache():
+    """
+    Byte budgeted LRU of inflated pk3 members, shared by the archives of a Pk3Manager.
+    Keyed by ( archive path, member header offset ), entries of an archive are dropped when it's unloaded.
+    """
+
+    DEFAULT_BUDGET = 32 * 1024 * 1024;
+
+    def __init__(self, budget : int = DEFAULT_BUDGET):
+        self._budget = budget;
+        self._size = 0;
+        self._entries = OrderedDict(); # key -> bytes, least recently used first
+        self._lock = threading.Lock();
+        self._hits = 0;
+        self._misses = 0;
+        self._evictions = 0;
+
+    def Get(self, key : tuple) -> bytes:
+        with self._lock:
+            data = self._entries.get(key);
+            if data != None:
+                self._entries.move_to_end(key);
+                self._hits += 1;
+            else:
+                self._misses += 1;
+            return data;
+
+    def Put(self, key : tuple, data : bytes):
+        if len(data) > self._budget:
+            return;
+        with self._lock:
+            old = self._entries.pop(key, None);
+            if old != None:
+                self._size -= len(old);
+            self._entries[key] = data;
+            self._size += len(data);
+            while self._size > self._budget:
+                _, evicted = self._entries.popitem(last = False);
+                self._size -= len(evicted);
+                self._evictions += 1;
+
+    def Discard(self, filePath : str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == filePath]:
+                self._size -= len(self._entries.pop(key));
+
+    def GetStats(self) -> dict:
+        with self._lock:
+            return { "hits" : self._hits, "misses" : self._misses, "evictions" : self._evictions,
+                     "entries" : len(self._entries), "bytes" : self._size, "budget" : self._budget };
+
 class PK3Bindata(bindata.Bindata):
     def __init__(self, name, bytes, srcPk):
         super().__init__(name, bytes);
@@ -11,64 +183,235 @@ class PK3Bindata(bindata.Bindata):
 
 class Pk3():
 
-    def __init__(self):
+    LOCAL_HEADER = struct.Struct("<4s22xHH"); # signature, ..., file name length, extra field length
+    LOCAL_SIGNATURE = b"PK\x03\x04";
+
+    def __init__(self, contentCache : ContentCache = None):
         self._filePath = None;
-        self._zf = None;
+        self._zf = None; # only held while the index is read, and for members mmap reads don't handle
+        self._map = None;
+        self._stat = None; # ( size, mtime_ns ) the index was read with, mapped reads only happen while the file still has it
+        self._openLock = threading.Lock();
+        self._contentCache = contentCache;
         self._isLoaded = False;
         self._index = dict[ str, zipfile.ZipInfo ]();
-    
+        self._lookup = dict[ str, zipfile.ZipInfo ](); # normalized path -> info, directories left out
+        self._isRestored = False; # loaded from cached entries, _lookup holds entry tuples until they are used and _index is filled on demand
+
     def GetPath(self):
         return "" + self._filePath;
 
     def Unload(self):
         self._isLoaded = False;
-        self._zf = None;
+        self._isRestored = False;
+        self.Close();
+        if self._contentCache != None and self._filePath != None:
+            self._contentCache.Discard(self._filePath);
         self._index.clear();
+        self._lookup.clear();
+
+    def _AddInfo(self, zInfo : zipfile.ZipInfo):
+        fname = zInfo.filename;
+        self._index[fname] = zInfo;
+        if not zInfo.is_dir():
+            self._lookup[NormalizePath(fname)] = zInfo;
+
+    # Loads the index from cached ( paths, entries ) as returned by GetEntries, the archive itself is opened on first read.
+    # ZipInfos are only built for the paths that get used.
+    def LoadFromEntries(self, filePath, paths : list[str], entries : list[tuple], stat : tuple = None) -> bool:
+        if self._isLoaded:
+            self.Unload();
+        self._filePath = filePath;
+        self._stat = stat;
+        self._lookup = dict(zip(paths, entries));
+        self._isRestored = True;
+        self._isLoaded = True;
+        return True;
+
+    # ( normalized paths, entry tuples ) of the files in the archive, what the index cache stores
+    def GetEntries(self) -> tuple:
+        paths = list(self._lookup.keys());
+        return (paths, [EntryFromInfo(self.GetInfo(path)) for path in paths]);
+
+    # builds every remaining ZipInfo of a restored archive
+    def _Materialize(self):
+        if self._isRestored:
+            for path in self._lookup:
+                self.GetInfo(path);
+            self._isRestored = False;
+
+    # ZipInfo of a normalized path, None if the archive doesn't have it
+    def GetInfo(self, path : str) -> zipfile.ZipInfo:
+        zInfo = self._lookup.get(path);
+        if type(zInfo) is tuple:
+            zInfo = InfoFromEntry(zInfo);
+            self._lookup[path] = zInfo;
+            self._index[zInfo.filename] = zInfo;
+        return zInfo;
+
+    def HasPath(self, path : str) -> bool:
+        return path in self._lookup;
+
+    # normalized paths of every file in the archive
+    def GetPaths(self):
+        return self._lookup.keys();
+
+    # closes the archive handle, the index stays and the next read reopens it
+    def Close(self):
+        with self._openLock:
+            self._CloseLocked();
+
+    def _CloseLocked(self):
+        if self._zf != None:
+            self._zf.close();
+            self._zf = None;
+        if self._map != None:
+            try:
+                self._map.close();
+            except BufferError:
+                pass; # views a caller asked for are still alive, the mapping goes away with the last of them
+            self._map = None;
+
+    def IsOpened(self) -> bool:
+        return self._zf != None or self._map != None;
+
+    # Maps the archive if the file is still the one the index was read from, None otherwise.
+    # Reading a mapping of a file truncated in place kills the process with SIGBUS, so the file is checked before every mapped read
+    # and a changed one is only read through ZipFile, which raises instead, until the manager reloads it. Call with _openLock held.
+    def _GetMapLocked(self) -> mmap.mmap:
+        try:
+            st = os.stat(self._filePath);
+        except OSError:
+            st = None;
+        if st == None or (self._stat != None and (st.st_size, st.st_mtime_ns) != self._stat):
+            if self._map != None:
+                self._CloseLocked();
+            return None;
+        if self._map == None:
+            with open(self._filePath, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ);
+        return self._map;
+
+    def _GetZipFile(self) -> zipfile.ZipFile:
+        with self._openLock:
+            if self._zf == None:
+                self._zf = zipfile.ZipFile(self._filePath);
+            return self._zf;
 
     # It doesnt really loads all contents of zipfile into memory, that would be a waste, instead it loads zip's index for lookup later
-    def Load(self, filePath) -> bool:
+    # keepOpen = False closes the archive once the index is read, it's reopened on first read
+    def Load(self, filePath, keepOpen = True) -> bool:
         if self._isLoaded:
             if self._filePath != filePath:
                 # different pk
                 self.Unload();
-                
+
         self._filePath = filePath;
         fileTup = os.path.splitext(filePath);
-        if fileTup[1] == ".pk3":
+        if fileTup[1].lower() == ".pk3":
             # its a pk3, son.
             if zipfile.is_zipfile(filePath):
+                st = os.stat(filePath);
+                self._stat = (st.st_size, st.st_mtime_ns);
                 self._zf = zipfile.ZipFile(filePath);
                 zContentInfoList = self._zf.infolist();
                 for zInfo in zContentInfoList:
-                    fname = zInfo.filename;
-                    self._index[fname] = zInfo;
+                    self._AddInfo(zInfo);
+                self.Close();
+                if keepOpen:
+                    with self._openLock:
+                        self._GetMapLocked();
                 self._isLoaded = True;
                 return True;
         return False;
 
+    def IsLoaded(self) -> bool:
+        return self._isLoaded;
+
+    # archives restored from the cache have no directory entries
     def GetFilesIndex(self) -> dict[str, zipfile.ZipInfo]:
+        self._Materialize();
         return self._index.copy();
 
-    def GetFilesByMatch(self, matchFunction ) -> list[PK3Bindata]:
-        rslt = [];
+    # normalized path -> ZipInfo of every file in the archive
+    def GetLookup(self) -> dict[str, zipfile.ZipInfo]:
+        self._Materialize();
+        return self._lookup;
 
+    def GetFilesByMatch(self, matchFunction, count = 1024) -> list[PK3Bindata]:
+        rslt = [];
+        prefix, predicate = CompileMatch(matchFunction);
+        for path in self._lookup:
+            if len(rslt) >= count:
+                break;
+            if path.startswith(prefix) and predicate(path):
+                rslt.append(self.ReadInfo(self.GetInfo(path)));
         return rslt;
 
-    # TODO
     def IsFileByMatch(self, matchFunction ) -> bool:
+        prefix, predicate = CompileMatch(matchFunction);
+        for path in self._lookup:
+            if path.startswith(prefix) and predicate(path):
+                return True;
         return False;
 
+    # Member contents through an mmap of the archive, as bytes. asView returns stored members as a memoryview of the mapping
+    # instead of a copy, the caller must release it before the archive is closed or changes on disk.
+    # Deflated members are inflated once and kept in the content cache, anything else goes through ZipFile.
+    def ReadMember(self, zInfo : zipfile.ZipInfo, asView : bool = False):
+        if zInfo.flag_bits & 0x1 or not zInfo.compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            return self._ReadZipMember(zInfo); # encrypted, bzip2, lzma
+        key = (self._filePath, zInfo.header_offset);
+        if zInfo.compress_type == zipfile.ZIP_DEFLATED and self._contentCache != None:
+            data = self._contentCache.Get(key);
+            if data != None:
+                return data;
+        # copied out under the lock, so Close never unmaps while a read is in the mapping
+        with self._openLock:
+            fileMap = self._GetMapLocked();
+            if fileMap != None:
+                offset = zInfo.header_offset;
+                if offset + Pk3.LOCAL_HEADER.size > len(fileMap):
+                    raise zipfile.BadZipFile("Truncated local header of %s in %s" % (zInfo.filename, self._filePath));
+                signature, nameLength, extraLength = Pk3.LOCAL_HEADER.unpack_from(fileMap, offset);
+                if signature != Pk3.LOCAL_SIGNATURE:
+                    raise zipfile.BadZipFile("Bad local header of %s in %s" % (zInfo.filename, self._filePath));
+                start = offset + Pk3.LOCAL_HEADER.size + nameLength + extraLength;
+                if start + zInfo.compress_size > len(fileMap):
+                    raise zipfile.BadZipFile("Truncated data of %s in %s" % (zInfo.filename, self._filePath));
+                if asView and zInfo.compress_type == zipfile.ZIP_STORED:
+                    return memoryview(fileMap)[start:start + zInfo.compress_size];
+                raw = fileMap[start:start + zInfo.compress_size];
+        if fileMap == None:
+            return self._ReadZipMember(zInfo);
+        if zInfo.compress_type == zipfile.ZIP_STORED:
+            return raw;
+        data = zlib.decompress(raw, -zlib.MAX_WBITS, zInfo.file_size);
+        if zlib.crc32(data) != zInfo.CRC:
+            raise zipfile.BadZipFile("Bad CRC of %s in %s" % (zInfo.filename, self._filePath));
+        if self._contentCache != None:
+            self._contentCache.Put(key, data);
+        return data;
+
+    def _ReadZipMember(self, zInfo : zipfile.ZipInfo) -> bytes:
+        with self._GetZipFile().open(zInfo.filename) as stream:
+            return stream.read();
+
+    def ReadInfo(self, zInfo : zipfile.ZipInfo, asView : bool = False) -> PK3Bindata:
+        rslt = None;
+        if self._isLoaded:
+            rslt = PK3Bindata(zInfo.filename, self.ReadMember(zInfo, asView), self);
+        return rslt;
+
     def GetFile(self, fileName) -> PK3Bindata:
         rslt = None;
         if self._isLoaded:
             if self.IsFile(fileName):
-                stream = self._zf.open(self._index[fileName]);
-                if stream != None:
-                    rslt = PK3Bindata(fileName, stream.read(), self);
-                    stream.close();
+                rslt = self.ReadInfo(self._index[fileName]);
         return rslt;
 
     def IsFile(self, fileName) -> bool:
+        self._Materialize();
         return fileName in self._index;
 
     @staticmethod
@@ -76,50 +419,256 @@ class Pk3():
         return zipfile.is_zipfile(filePath);
 
 class Pk3Manager():
-    def __init__(self):
+    """
+    Keeps the pk3 archives of the game directories and a merged index of their contents, the same view the engine has.
+    Archives load in engine order, directories as given and pk3s of a directory sorted by name case insensitively,
+    when several archives have the same path the one loaded last wins.
+    The index maps every normalized path to its winning archive, so lookups by path are a single dict access,
+    and keeps the paths sorted, so a glob with a literal prefix such as "maps/*.bsp" only visits the paths under that prefix.
+    It's rebuilt on the first query after archives are loaded or unloaded, Refresh updates only the paths of the archives that changed.
+    With cachePath set, entry tables of unchanged archives come from a Pk3IndexCache instead of their central directories.
+    The other archives are scanned on a pool of scanWorkers threads, results are merged in load order.
+    With lazyOpen only the index is kept in memory, an archive is opened on its first read rather than held open from the start.
+    Reads go through an mmap of the archive, inflated members are kept in a ContentCache of contentCacheSize bytes.
+    ClosePk3 drops the mapping of one archive, call it as soon as it may be changing on disk, before Refresh.
+    """
+
+    DEFAULT_SCAN_WORKERS = 8;
+
+    def __init__(self, cachePath : str = None, scanWorkers : int = DEFAULT_SCAN_WORKERS, lazyOpen : bool = False, contentCacheSize : int = ContentCache.DEFAULT_BUDGET):
         self._dirs = [];
         self._pks : dict[str, Pk3]= {};
+        self._stats = dict[str, tuple](); # archive path -> ( size, mtime_ns ) it was loaded with
         self._isInit = False;
-    
+        self._merged = dict[str, Pk3](); # normalized path -> winning archive
+        self._sortedPaths = list[str]();
+        self._isIndexDirty = True;
+        self._cache = Pk3IndexCache(cachePath) if cachePath != None else None;
+        self._scanWorkers = scanWorkers;
+        self._lazyOpen = lazyOpen;
+        self._contentCache = ContentCache(contentCacheSize);
+
     def Initialize(self, dirs : list[str]):
         if not self._isInit:
             print("Initializing pk3 manager...")
+            if self._cache != None and not self._cache.Open():
+                self._cache = None;
             for dir in dirs:
                 if os.path.isdir(dir):
                     self.LoadDir(dir);
                     for pk in self._pks:
                         print(self._pks[pk].GetPath());
             print("Cached %s pk3 archives." % (str(len(self._pks.keys()))));
+            if self._cache != None:
+                self._cache.Prune(list(self._pks.keys()));
+                stats = self._cache.GetStats();
+                print("Pk3 index cache : %i unchanged, %i read." % (stats["hits"], stats["misses"]));
+            self._BuildIndex();
+            print("Indexed %s files." % (str(len(self._merged))));
             print("Pk3 manager initialized.");
             self._dirs.clear();
             self._dirs += dirs;
             self._isInit = True;
-    
+
     def Unload(self, filePath):
         if filePath in self._pks:
             self._pks[filePath].Unload();
-    
+            self._isIndexDirty = True;
+
     def UnloadAll(self):
-        for k in self._pks.keys:
+        for k in self._pks.keys():
             self._pks[k].Unload();
+        self._isIndexDirty = True;
+
+    # closes the handle and mapping of one archive, the next read of it reopens it
+    def ClosePk3(self, filePath):
+        pk = self._pks.get(filePath);
+        if pk != None:
+            pk.Close();
+
+    # closes every archive handle and mapping, the next read of an archive reopens it
+    def CloseAll(self):
+        for k in list(self._pks.keys()):
+            self._pks[k].Close();
 
     def LoadPk3(self, filePath) -> bool:
-        newPk = Pk3();
-        if newPk.Load(filePath):
-            self._pks[filePath] = newPk;
-            return True;
-        return False;
+        return self._LoadPk3s([filePath]) == 1;
 
     def LoadDir(self, dir : str) -> bool:
         if os.path.isdir(dir):
-            for file in os.listdir(dir):
+            # engine sorts pk3 names with Q_stricmp, the later ones override the earlier ones
+            filePaths = [];
+            for file in sorted(os.listdir(dir), key = str.lower):
                 fileTup = os.path.splitext(file);
                 if fileTup[1].lower() == ".pk3":
-                    filePath = os.path.join(dir,file);
-                    if Pk3.IsPk3(filePath):
-                        self.LoadPk3(filePath);
+                    filePaths.append(os.path.join(dir,file));
+            self._LoadPk3s(filePaths);
         return True; # stub
 
+    # Pool worker, reads one central directory
+    def _ScanPk3(self, filePath) -> Pk3:
+        newPk = Pk3(self._contentCache);
+        try:
+            if newPk.Load(filePath, not self._lazyOpen): # Load checks the zip itself
+                return newPk;
+        except (OSError, zipfile.BadZipFile) as ex:
+            print("Failed to read pk3 %s : %s" % (filePath, str(ex)));
+        return None;
+
+    # Loads archives in the given order, returns how many were loaded
+    def _LoadPk3s(self, filePaths : list[str]) -> int:
+        loaded = [None] * len(filePaths);
+        stats = [None] * len(filePaths);
+        toScan = [];
+        for i in range(len(filePaths)):
+            try:
+                stats[i] = os.stat(filePaths[i]);
+            except OSError:
+                continue;
+            if self._cache != None:
+                entries = self._cache.Get(filePaths[i], stats[i].st_size, stats[i].st_mtime_ns);
+                if entries != None:
+                    loaded[i] = Pk3(self._contentCache);
+                    loaded[i].LoadFromEntries(filePaths[i], entries[0], entries[1], (stats[i].st_size, stats[i].st_mtime_ns));
+                    continue;
+            toScan.append(i);
+
+        if len(toScan) > 1 and self._scanWorkers > 1:
+            with ThreadPoolExecutor(max_workers = min(self._scanWorkers, len(toScan)), thread_name_prefix = "Pk3Scan") as pool:
+                scanned = list(pool.map(self._ScanPk3, [filePaths[i] for i in toScan]));
+        else:
+            scanned = [self._ScanPk3(filePaths[i]) for i in toScan];
+
+        for i, newPk in zip(toScan, scanned):
+            loaded[i] = newPk;
+            if newPk != None and self._cache != None:
+                self._cache.Put(filePaths[i], stats[i].st_size, stats[i].st_mtime_ns, newPk.GetEntries());
+        if self._cache != None:
+            self._cache.Commit();
+
+        count = 0;
+        for i in range(len(filePaths)):
+            if loaded[i] != None:
+                old = self._pks.get(filePaths[i]);
+                if old != None:
+                    old.Unload();
+                # reloading an archive keeps its place in the load order
+                self._pks[filePaths[i]] = loaded[i];
+                self._stats[filePaths[i]] = (stats[i].st_size, stats[i].st_mtime_ns);
+                count += 1;
+        if count > 0:
+            self._isIndexDirty = True;
+        return count;
+
+    # archives of the game directories in engine order with their ( size, mtime_ns )
+    def _ListDirs(self) -> dict[str, tuple]:
+        listed = dict[str, tuple]();
+        for dir in self._dirs:
+            if not os.path.isdir(dir):
+                continue;
+            for file in sorted(os.listdir(dir), key = str.lower):
+                if os.path.splitext(file)[1].lower() == ".pk3":
+                    filePath = os.path.join(dir, file);
+                    try:
+                        st = os.stat(filePath);
+                    except OSError:
+                        continue;
+                    listed[filePath] = (st.st_size, st.st_mtime_ns);
+        return listed;
+
+    def Refresh(self) -> dict:
+        """
+        Rescans the game directories and applies what changed since the archives were loaded.
+        Returns { "added" : [archive], "removed" : [archive], "modified" : [archive], "paths" : [normalized path] },
+        paths are the virtual files whose winning archive changed, the index is updated for those only.
+        An archive that fails to load, usually because it's still being copied, counts as removed and is picked up by a later Refresh.
+        """
+        changes = { "added" : [], "removed" : [], "modified" : [], "paths" : [] };
+        if not self._isInit:
+            return changes;
+        listed = self._ListDirs();
+        dirs = set(os.path.normpath(dir) for dir in self._dirs);
+        for filePath in self._pks:
+            if not filePath in listed and os.path.normpath(os.path.dirname(filePath)) in dirs:
+                changes["removed"].append(filePath);
+        for filePath in listed:
+            if not filePath in self._pks:
+                changes["added"].append(filePath);
+            elif self._stats.get(filePath) != listed[filePath]:
+                changes["modified"].append(filePath);
+        if len(changes["added"]) + len(changes["removed"]) + len(changes["modified"]) == 0:
+            return changes;
+
+        wasDirty = self._isIndexDirty;
+        affected = set[str]();
+        for filePath in changes["removed"]:
+            pk = self._pks.pop(filePath);
+            affected.update(pk.GetPaths());
+            pk.Unload();
+            self._stats.pop(filePath, None);
+        previous = dict[str, Pk3]();
+        for filePath in changes["modified"]:
+            previous[filePath] = self._pks[filePath];
+            affected.update(previous[filePath].GetPaths());
+        self._LoadPk3s(changes["added"] + changes["modified"]);
+        for filePath in list(changes["added"]):
+            if not filePath in self._pks:
+                changes["added"].remove(filePath);
+        for filePath in list(changes["modified"]):
+            if self._pks[filePath] is previous[filePath]:
+                self._pks.pop(filePath).Unload();
+                self._stats.pop(filePath, None);
+                changes["modified"].remove(filePath);
+                changes["removed"].append(filePath);
+            else:
+                affected.update(self._pks[filePath].GetPaths());
+        for filePath in changes["added"]:
+            affected.update(self._pks[filePath].GetPaths());
+
+        # new archives went to the end, put them back in engine order, archives loaded from elsewhere stay last
+        ordered = { k : self._pks[k] for k in listed if k in self._pks };
+        for k in self._pks:
+            if not k in ordered:
+                ordered[k] = self._pks[k];
+        self._pks = ordered;
+        if self._cache != None:
+            self._cache.Prune(list(self._pks.keys()));
+
+        if wasDirty:
+            self._BuildIndex();
+            changes["paths"] = sorted(affected);
+        else:
+            changes["paths"] = self._UpdateIndex(affected);
+        return changes;
+
+    # recomputes the winning archive of the given paths only, returns the paths whose winner changed, sorted
+    def _UpdateIndex(self, paths) -> list[str]:
+        pks = [pk for pk in reversed(self._pks.values()) if pk.IsLoaded()];
+        changed = [];
+        for path in sorted(paths):
+            winner = None;
+            for pk in pks:
+                if pk.HasPath(path):
+                    winner = pk;
+                    break;
+            old = self._merged.get(path);
+            if winner is old:
+                continue;
+            changed.append(path);
+            if winner == None:
+                del self._merged[path];
+                i = bisect.bisect_left(self._sortedPaths, path);
+                del self._sortedPaths[i];
+            else:
+                if old == None:
+                    bisect.insort(self._sortedPaths, path);
+                self._merged[path] = winner;
+        self._isIndexDirty = False;
+        return changed;
+
+    def GetDirs(self) -> list[str]:
+        return self._dirs.copy();
+
     def GetPk3(self, filePath):
         if filePath in self._pks:
             return self._pks[filePath];
@@ -128,40 +677,84 @@ class Pk3Manager():
     def GetAllPk3(self):
         return self._pks.copy();
 
-    # THESE ARE PERF HEAVY
-    # count = how much pks we want to get, 1 would mean first in reverse order, since load order is first to last, then active file is last to first.
+    def GetContentCacheStats(self) -> dict:
+        return self._contentCache.GetStats();
+
+    def _BuildIndex(self):
+        merged = dict[str, Pk3]();
+        for k in self._pks:
+            pk = self._pks[k];
+            if pk.IsLoaded():
+                merged.update(dict.fromkeys(pk.GetPaths(), pk));
+        self._merged = merged;
+        self._sortedPaths = sorted(merged);
+        self._isIndexDirty = False;
+
+    def _GetIndex(self) -> dict[str, Pk3]:
+        if self._isIndexDirty:
+            self._BuildIndex();
+        return self._merged;
+
+    # normalized paths of every file in the index, sorted
+    def GetAllPaths(self) -> list[str]:
+        self._GetIndex();
+        return self._sortedPaths.copy();
+
+    # normalized paths passing the query, in sorted order
+    def FindFiles(self, matchFunction, count = 1024) -> list[str]:
+        self._GetIndex();
+        prefix, predicate = CompileMatch(matchFunction);
+        paths = self._sortedPaths;
+        rslt = [];
+        i = bisect.bisect_left(paths, prefix);
+        while i < len(paths) and len(rslt) < count:
+            path = paths[i];
+            if not path.startswith(prefix):
+                break;
+            if predicate(path):
+                rslt.append(path);
+            i += 1;
+        return rslt;
+
+    # ( Pk3, ZipInfo ) the engine would load filePath from, None if no archive has it
+    def GetFileInfo(self, filePath) -> tuple:
+        path = NormalizePath(filePath);
+        pk = self._GetIndex().get(path);
+        if pk == None:
+            return None;
+        return (pk, pk.GetInfo(path));
+
+    def IsFile(self, filePath) -> bool:
+        return self.GetFileInfo(filePath) != None;
+
+    # count = how much pks we want to get, 1 is the archive that wins
     def GetPksWithFile(self, matchFunction, count = 1024) -> list[Pk3]: # returns a list of PK3s with queried files to search, order of appearance from last pk3 in load order to first.
-        print("PK3Manager::GetPksWithFile is not implemented");
-        return None;
         rslt = [];
+        paths = self.FindFiles(matchFunction, len(self._merged));
+        if len(paths) == 0:
+            return rslt;
         for k in reversed(self._pks.keys()):
-            while count:
-                currentPk3 = self._pks[k];
-                if currentPk3.IsFileByMatch(matchFunction):
-                    rslt.append(currentPk3);
-                    count -= 1;
+            if len(rslt) >= count:
+                break;
+            currentPk3 = self._pks[k];
+            if not currentPk3.IsLoaded():
+                continue;
+            if any(currentPk3.HasPath(path) for path in paths):
+                rslt.append(currentPk3);
         return rslt;
 
-    # THESE ARE PERF HEAVY
-    # get all files from cached pks that pass matchfunction, order from last to first in load ordering
+    # winning copy of every file that passes the query, in path order
     def GetFiles(self, matchFunction, count = 1024) -> list[PK3Bindata]:
-        print("PK3Manager::GetFiles is not implemented");
-        return None;
         bindata = list[PK3Bindata]();
-        for k in reversed(self._pks.keys()):
-            while count:
-                currentPk3 = self._pks[k];
-                if currentPk3.IsFileByMatch(matchFunction):
-                    rslt = currentPk3.GetFileByMatch(matchFunction);
-                    count -= 1; 
+        for path in self.FindFiles(matchFunction, count):
+            pk = self._merged[path];
+            bindata.append(pk.ReadInfo(pk.GetInfo(path)));
         return bindata;
 
-    # return first file with filepath within cached PKs
-    def GetFile(self, filePath) -> bytes:
-        rslt = bytes();
-        for k in reversed(self._pks.keys()):
-            currentPk3 = self._pks[k];
-            if currentPk3.IsFile(filePath):
-                rslt = currentPk3.GetFile(filePath); 
-        return rslt;
-        
+    # return the file with filepath from the archive that wins it, None if no archive has it
+    def GetFile(self, filePath) -> PK3Bindata:
+        info = self.GetFileInfo(filePath);
+        if info == None:
+            return None;
+        return info[0].ReadInfo(info[1]);
+
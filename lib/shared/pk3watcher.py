@@ -0,0 +1,198 @@
+import os;
+import select;
+import struct;
+import threading;
+import time;
+import ctypes;
+import ctypes.util;
+import logging;
+import lib.shared.threadcontrol as threadcontrol;
+
+Log = logging.getLogger(__name__);
+
+# inotify(7)
+IN_MODIFY = 0x00000002; # an archive rewritten in place, the first write of it is reported to onChange
+IN_CLOSE_WRITE = 0x00000008;
+IN_MOVED_FROM = 0x00000040;
+IN_MOVED_TO = 0x00000080;
+IN_CREATE = 0x00000100;
+IN_DELETE = 0x00000200;
+IN_DELETE_SELF = 0x00000400;
+IN_MOVE_SELF = 0x00000800;
+IN_Q_OVERFLOW = 0x00004000;
+IN_NONBLOCK = 0o4000;
+IN_CLOEXEC = 0o2000000;
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF;
+EVENT_HEADER = struct.Struct("iIII"); # wd, mask, cookie, len
+
+class Pk3Watcher():
+    """
+    Watches the game directories for pk3 archives being added, removed or replaced.
+    Uses inotify where it's available and falls back to comparing directory listings every pollInterval seconds.
+    Copying a big archive takes a while, so a change is only reported once the directories stayed quiet for settleDelay seconds.
+    The watcher doesn't touch the pk3 manager, the owner polls PopChanged from its own loop and calls Pk3Manager.Refresh.
+    onChange( path ) is called from the watcher thread once when an existing archive starts being written, before the settle delay,
+    so the owner can drop its mapping of it ( Pk3Manager.ClosePk3 ). It's called again only after the write finished :
+    a close after writing or a move with inotify, a poll that found its size and mtime unchanged otherwise.
+    """
+
+    MODE_INOTIFY = "inotify";
+    MODE_POLL = "poll";
+    DEFAULT_POLL_INTERVAL = 5.0;
+    DEFAULT_SETTLE_DELAY = 2.0;
+    WAIT_STEP = 0.5; # how often the thread checks for stop
+
+    def __init__(self, dirs : list[str], pollInterval : float = DEFAULT_POLL_INTERVAL, settleDelay : float = DEFAULT_SETTLE_DELAY, useInotify : bool = True, onChange = None):
+        self._dirs = [dir for dir in dirs if os.path.isdir(dir)];
+        self._pollInterval = pollInterval;
+        self._settleDelay = settleDelay;
+        self._useInotify = useInotify;
+        self._onChange = onChange;
+        self._writing = set(); # archives reported to onChange whose write hasn't finished yet
+        self._watches = {}; # inotify watch descriptor -> dir
+        self._mode = None;
+        self._fd = -1;
+        self._changed = threading.Event();
+        self._lastChangeAt = None;
+        self._control = threadcontrol.ThreadControl();
+        self._thread = None;
+
+    def GetMode(self) -> str:
+        return self._mode;
+
+    def Start(self) -> bool:
+        if self._thread != None:
+            return True;
+        if len(self._dirs) == 0:
+            return False;
+        self._mode = Pk3Watcher.MODE_POLL;
+        if self._useInotify and self._OpenInotify():
+            self._mode = Pk3Watcher.MODE_INOTIFY;
+        self._control.stop = False;
+        self._thread = threading.Thread(target = self._ThreadHandler, args = (self._control,), daemon = True, name = "Pk3Watcher");
+        self._thread.start();
+        Log.debug("Watching %s for pk3 changes ( %s )" % (str(self._dirs), self._mode));
+        return True;
+
+    def Stop(self):
+        if self._thread != None:
+            self._control.stop = True;
+            self._thread.join();
+            self._thread = None;
+        if self._fd >= 0:
+            os.close(self._fd);
+            self._fd = -1;
+            self._watches.clear();
+
+    # True once after the directories changed and settled
+    def PopChanged(self) -> bool:
+        if self._changed.is_set():
+            self._changed.clear();
+            return True;
+        return False;
+
+    def _OpenInotify(self) -> bool:
+        if not hasattr(os, "uname"):
+            return False;
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno = True);
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC);
+        except (OSError, AttributeError):
+            return False;
+        if fd < 0:
+            return False;
+        for dir in self._dirs:
+            wd = libc.inotify_add_watch(fd, os.fsencode(dir), WATCH_MASK);
+            if wd < 0:
+                Log.warning("Can't watch %s with inotify ( errno %i ), polling instead" % (dir, ctypes.get_errno()));
+                os.close(fd);
+                self._watches.clear();
+                return False;
+            self._watches[wd] = dir;
+        self._fd = fd;
+        return True;
+
+    def _Touch(self):
+        self._lastChangeAt = time.monotonic();
+
+    # an archive is being written, reported once until _EndWrite
+    def _BeginWrite(self, path : str):
+        if path in self._writing:
+            return;
+        self._writing.add(path);
+        if self._onChange != None:
+            try:
+                self._onChange(path);
+            except Exception as e:
+                Log.error("pk3 change callback failed for %s : %s" % (path, str(e)));
+
+    def _EndWrite(self, path : str):
+        self._writing.discard(path);
+
+    def _Settle(self):
+        if self._lastChangeAt != None and time.monotonic() - self._lastChangeAt >= self._settleDelay:
+            self._lastChangeAt = None;
+            self._changed.set();
+
+    def _ReadInotify(self):
+        try:
+            data = os.read(self._fd, 65536);
+        except BlockingIOError:
+            return;
+        offset = 0;
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset);
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0");
+            offset += EVENT_HEADER.size + length;
+            if mask & (IN_Q_OVERFLOW | IN_DELETE_SELF | IN_MOVE_SELF) or name.lower().endswith(b".pk3"):
+                self._Touch();
+            if wd in self._watches and name.lower().endswith(b".pk3"):
+                path = os.path.join(self._watches[wd], os.fsdecode(name));
+                if mask & IN_MODIFY:
+                    self._BeginWrite(path);
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE):
+                    self._EndWrite(path);
+
+    def _Snapshot(self) -> dict:
+        snapshot = {};
+        for dir in self._dirs:
+            try:
+                with os.scandir(dir) as it:
+                    for entry in it:
+                        if entry.name.lower().endswith(".pk3"):
+                            try:
+                                st = entry.stat();
+                            except OSError:
+                                continue;
+                            snapshot[entry.path] = (st.st_size, st.st_mtime_ns);
+            except OSError:
+                continue;
+        return snapshot;
+
+    def _ThreadHandler(self, control : threadcontrol.ThreadControl):
+        snapshot = self._Snapshot() if self._mode == Pk3Watcher.MODE_POLL else None;
+        nextPoll = time.monotonic() + self._pollInterval;
+        while not control.stop:
+            try:
+                if self._mode == Pk3Watcher.MODE_INOTIFY:
+                    ready, _, _ = select.select([self._fd], [], [], Pk3Watcher.WAIT_STEP);
+                    if len(ready) > 0:
+                        self._ReadInotify();
+                else:
+                    time.sleep(Pk3Watcher.WAIT_STEP);
+                    if time.monotonic() >= nextPoll:
+                        nextPoll = time.monotonic() + self._pollInterval;
+                        current = self._Snapshot();
+                        for path in list(self._writing):
+                            if current.get(path) == snapshot.get(path):
+                                self._EndWrite(path); # stopped changing since the last poll
+                        for path in current:
+                            if path in snapshot and current[path] != snapshot[path]:
+                                self._BeginWrite(path);
+                        if current != snapshot:
+                            snapshot = current;
+                            self._Touch();
+                self._Settle();
+            except Exception as ex:
+                Log.error("Pk3 watcher failed : %s" % str(ex));
+                time.sleep(self._pollInterval);
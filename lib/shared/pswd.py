@@ -1,11 +1,11 @@
-
-
+import os;
 import psutil;
+import select;
 import threading;
 import lib.shared.threadcontrol as threadcontrol;
-import lib.shared.timeout as timeout;
 import time;
 import lib.shared.observer as observer;
+import lib.shared.telemetry as telemetry;
 
 
 WD_EVENT_PROCESS_UNAVAILABLE = -1; # not existing on start of watch
@@ -14,78 +14,301 @@ WD_EVENT_PROCESS_DIED        = 1; # was alive before but now dead
 WD_EVENT_PROCESS_STARTED     = 2; # died but then gone back online
 WD_EVENT_PROCESS_RESTARTED   = 3; # was alive, died, then started
 
+class ProcessMonitor:
+    """
+    Keeps track of processes by name for every watchdog and plugin of the platform, with a single thread.
+    Running processes are held as psutil.Process handles, on Linux their exit is waited on with pidfds,
+    elsewhere the handles are checked every frameTime, which doesn't enumerate the other processes of the machine.
+    Only a name without a live process needs a scan of the process list, the scans start minRescan after an exit
+    and back off exponentially up to maxRescan while the process stays down, one scan covers every name that is down.
+    Subscribers get ( name, isAlive ) on the monitor thread when a name goes down or comes back up.
+    Names with telemetry enabled are also sampled by the same thread, telemetry subscribers get
+    ( name, metric, isHigh, value, limit ) when a metric crosses its threshold.
+    """
+
+    DEFAULT_FRAME_TIME = 0.1;
+    DEFAULT_MIN_RESCAN = 0.1;
+    DEFAULT_MAX_RESCAN = 5.0;
+    WAIT_STEP = 0.5; # longest wait on pidfds, how often the thread checks for stop and new handles
+
+    def __init__(self, frameTime = DEFAULT_FRAME_TIME, minRescan = DEFAULT_MIN_RESCAN, maxRescan = DEFAULT_MAX_RESCAN):
+        self._frameTime = frameTime;
+        self._minRescan = minRescan;
+        self._maxRescan = maxRescan;
+        self._usePidfd = hasattr(os, "pidfd_open");
+        self._lock = threading.RLock();
+        self._observable = observer.Observable();
+        self._watchers = dict[str, int](); # name -> watch count
+        self._handles = dict[str, list[psutil.Process]](); # name -> live processes
+        self._pidfds = dict[int, tuple](); # pidfd -> ( name, process )
+        self._rescanDelay = minRescan;
+        self._nextRescan = 0.0;
+        self._scanCount = 0;
+        self._telemetry = dict[str, telemetry.ProcessTelemetry]();
+        self._telemetryObservable = observer.Observable();
+        self._control = threadcontrol.ThreadControl();
+        self._thread = None;
+
+    # starts watching name, returns whether it's running right now
+    def Watch(self, name : str) -> bool:
+        with self._lock:
+            if name in self._watchers:
+                self._watchers[name] += 1;
+                return len(self._handles[name]) > 0;
+            self._watchers[name] = 1;
+            self._handles[name] = [];
+            found = self._Scan([name]);
+            for proc in found[name]:
+                self._Track(name, proc);
+            if self._thread == None:
+                self._control = threadcontrol.ThreadControl();
+                self._thread = threading.Thread(target = self._MonitorThreadHandler, daemon = True, args = (self._control,), name = "ProcessMonitor");
+                self._thread.start();
+            return len(self._handles[name]) > 0;
+
+    def Unwatch(self, name : str):
+        thread = None;
+        with self._lock:
+            if not name in self._watchers:
+                return;
+            self._watchers[name] -= 1;
+            if self._watchers[name] > 0:
+                return;
+            del self._watchers[name];
+            del self._handles[name];
+            for fd in [fd for fd in self._pidfds if self._pidfds[fd][0] == name]:
+                self._Untrack(fd);
+            if len(self._watchers) == 0 and self._thread != None:
+                self._control.stop = True;
+                thread = self._thread;
+                self._thread = None;
+        if thread != None and thread != threading.current_thread():
+            thread.join();
+
+    # cached for watched names, a one-off scan otherwise
+    def IsRunning(self, name : str) -> bool:
+        return len(self.GetPids(name)) > 0;
+
+    def GetPids(self, name : str) -> list[int]:
+        with self._lock:
+            if name in self._handles:
+                return [proc.pid for proc in self._handles[name]];
+        return [proc.pid for proc in self._Scan([name])[name]];
+
+    def Subscribe(self, obs : observer.Observer):
+        with self._lock:
+            obs.Subscribe(self._observable);
+
+    def Unsubscribe(self, obs : observer.Observer):
+        with self._lock:
+            self._observable.Unsubscribe(obs);
+
+    # samples the processes of name while it's watched, returns the existing telemetry if it's already enabled
+    def EnableTelemetry(self, name : str, interval : float = telemetry.ProcessTelemetry.DEFAULT_INTERVAL, capacity : int = telemetry.ProcessTelemetry.DEFAULT_CAPACITY,
+                        thresholds : dict = None, sustain : int = telemetry.ProcessTelemetry.DEFAULT_SUSTAIN) -> telemetry.ProcessTelemetry:
+        with self._lock:
+            if not name in self._telemetry:
+                self._telemetry[name] = telemetry.ProcessTelemetry(name, interval, capacity, thresholds, sustain);
+            return self._telemetry[name];
+
+    def DisableTelemetry(self, name : str):
+        with self._lock:
+            self._telemetry.pop(name, None);
+
+    def GetTelemetry(self, name : str) -> telemetry.ProcessTelemetry:
+        with self._lock:
+            return self._telemetry.get(name);
+
+    def SubscribeTelemetry(self, obs : observer.Observer):
+        with self._lock:
+            obs.Subscribe(self._telemetryObservable);
+
+    def UnsubscribeTelemetry(self, obs : observer.Observer):
+        with self._lock:
+            self._telemetryObservable.Unsubscribe(obs);
+
+    def GetStats(self) -> dict:
+        with self._lock:
+            return { "watched" : len(self._watchers), "processes" : sum(len(v) for v in self._handles.values()),
+                     "scans" : self._scanCount, "mode" : "pidfd" if self._usePidfd else "poll" };
+
+    # one pass over the process list for every name given
+    def _Scan(self, names : list[str]) -> dict[str, list[psutil.Process]]:
+        found = { name : [] for name in names };
+        for proc in psutil.process_iter(["name"]):
+            procName = proc.info["name"];
+            if procName in found:
+                found[procName].append(proc);
+        with self._lock:
+            self._scanCount += 1;
+        return found;
+
+    def _Track(self, name : str, proc : psutil.Process):
+        if self._usePidfd:
+            try:
+                fd = os.pidfd_open(proc.pid);
+            except OSError:
+                return; # exited in the meantime
+            if self._IsExited(proc):
+                os.close(fd); # the pid was reused between the scan and the open, or it's a zombie nobody reaped yet
+                return;
+            self._pidfds[fd] = (name, proc);
+        elif self._IsExited(proc):
+            return;
+        self._handles[name].append(proc);
+
+    def _Untrack(self, fd : int):
+        self._pidfds.pop(fd, None);
+        os.close(fd);
+
+    def _IsExited(self, proc : psutil.Process) -> bool:
+        try:
+            return not proc.is_running() or proc.status() == psutil.STATUS_ZOMBIE;
+        except psutil.Error:
+            return True;
+
+    # processes that exited since the last call, waits up to waitTime for one
+    def _WaitExited(self, waitTime : float) -> list[tuple]:
+        exited = [];
+        if self._usePidfd:
+            with self._lock:
+                fds = list(self._pidfds.keys());
+            if len(fds) > 0:
+                try:
+                    ready, _, _ = select.select(fds, [], [], waitTime);
+                except (OSError, ValueError):
+                    ready = []; # a pidfd was closed by Unwatch, the next pass picks up the remaining ones
+            else:
+                ready = [];
+                time.sleep(waitTime);
+            with self._lock:
+                for fd in ready:
+                    if fd in self._pidfds:
+                        exited.append(self._pidfds[fd]);
+                        self._Untrack(fd);
+        else:
+            time.sleep(waitTime);
+            with self._lock:
+                for name in self._handles:
+                    for proc in self._handles[name]:
+                        if self._IsExited(proc):
+                            exited.append((name, proc));
+        return exited;
+
+    def _MonitorThreadHandler(self, control : threadcontrol.ThreadControl):
+        while not control.stop:
+            waitTime = ProcessMonitor.WAIT_STEP if self._usePidfd else self._frameTime;
+            with self._lock:
+                if any(len(self._handles[name]) == 0 for name in self._handles):
+                    waitTime = min(waitTime, max(self._nextRescan - time.monotonic(), 0.0));
+                for name in self._telemetry:
+                    if name in self._handles:
+                        waitTime = min(waitTime, max(self._telemetry[name].GetNextSample() - time.monotonic(), 0.0));
+            events = [];
+            exited = self._WaitExited(waitTime);
+            with self._lock:
+                for name, proc in exited:
+                    if name in self._handles and proc in self._handles[name]:
+                        self._handles[name].remove(proc);
+                        if len(self._handles[name]) == 0:
+                            events.append((name, False));
+                            # a crashed server is usually brought back quickly, look for it soon
+                            self._rescanDelay = self._minRescan;
+                            self._nextRescan = time.monotonic() + self._minRescan;
+                missing = [name for name in self._handles if len(self._handles[name]) == 0];
+                isRescanDue = len(missing) > 0 and time.monotonic() >= self._nextRescan;
+            if isRescanDue:
+                found = self._Scan(missing);
+                with self._lock:
+                    isFound = False;
+                    for name in missing:
+                        if not name in self._handles:
+                            continue; # unwatched during the scan
+                        for proc in found[name]:
+                            self._Track(name, proc);
+                        if len(self._handles[name]) > 0:
+                            events.append((name, True));
+                            isFound = True;
+                    if isFound:
+                        self._rescanDelay = self._minRescan;
+                    self._nextRescan = time.monotonic() + self._rescanDelay;
+                    self._rescanDelay = min(self._rescanDelay * 2, self._maxRescan);
+            for event in events:
+                with self._lock:
+                    self._observable.Raise(event);
+            self._SampleTelemetry();
+
+    def _SampleTelemetry(self):
+        with self._lock:
+            due = [(self._telemetry[name], list(self._handles[name])) for name in self._telemetry if name in self._handles];
+        now = time.monotonic();
+        for tel, procs in due:
+            for metric, isHigh, value, limit in tel.Sample(procs, now):
+                with self._lock:
+                    self._telemetryObservable.Raise((tel.GetName(), metric, isHigh, value, limit));
+
+# every watchdog and plugin shares this one, so the process list is scanned once for all of them
+SharedMonitor = ProcessMonitor();
+
 class ProcessWatchdog:
-    def __init__(self, processName : int, frameTime = 0.1):
+    """ Raises WD_EVENT_* for one process name, driven by a ProcessMonitor, SharedMonitor unless given. """
+    def __init__(self, processName : str, frameTime = ProcessMonitor.DEFAULT_FRAME_TIME, monitor : ProcessMonitor = None):
         self._observable = observer.Observable();
         self._processName = processName;
-        self._frameTime = frameTime;
+        self._frameTime = frameTime; # the monitor sets the pace, kept for callers
+        self._monitor = monitor if monitor != None else SharedMonitor;
+        self._monitorObserver = observer.Observer(self._OnMonitorEvent);
         self._isRunning = False;
-        self._watcherControl = threadcontrol.ThreadControl();
-        self._controlLock    = threading.Lock();
-        self._watchThread    = threading.Thread(target=self._WatchThreadHandler, daemon=True, args=(self._frameTime,));
-
-    def _WatchThreadHandler(self, frameTime):
-        frameTimeout    = timeout.Timeout();
-        isAlive         = False;
-        hasDied         = False;
-
-        pid = self._GetPid();
-        if pid != -1:
-            isAlive = True;
-            self._observable.Raise(WD_EVENT_PROCESS_EXISTING);
-        else:
-            self._observable.Raise(WD_EVENT_PROCESS_UNAVAILABLE);
-        
-        while True:
-            with self._controlLock:
-                if self._watcherControl.stop:
-                    break;
-            frameTimeout.Set(frameTime);
-
-            if pid != -1:
-                if psutil.pid_exists(pid):
-                    if not isAlive:
-                        self._observable.Raise(WD_EVENT_PROCESS_STARTED);
-                        isAlive = True;
-                    if hasDied:
-                        self._observable.Raise(WD_EVENT_PROCESS_RESTARTED);
-                        hasDied = False;    
-                else:
-                    if isAlive:
-                        self._observable.Raise(WD_EVENT_PROCESS_DIED);
-                        isAlive = False;
-                        hasDied  = True;
-                    pid = -1;
-            else:
-                if isAlive:
-                    isAlive = False;
-                    hasDied = True;
-                pid = self._GetPid();
-            
-            time.sleep(frameTimeout.Left());
-
-    def _GetPid(self) -> int:
-        pid = -1;
-        for proc in psutil.process_iter():
-            if proc.name() == self._processName:
-                pid = proc.pid;
-        return pid;
+        self._isAlive = False;
+        self._hasDied = False;
+        self._controlLock = threading.Lock();
+
+    def _OnMonitorEvent(self, event):
+        name, isAlive = event;
+        if name != self._processName:
+            return;
+        with self._controlLock:
+            if not self._isRunning:
+                return;
+            if isAlive:
+                if not self._isAlive:
+                    self._observable.Raise(WD_EVENT_PROCESS_STARTED);
+                    self._isAlive = True;
+                if self._hasDied:
+                    self._observable.Raise(WD_EVENT_PROCESS_RESTARTED);
+                    self._hasDied = False;
+            elif self._isAlive:
+                self._observable.Raise(WD_EVENT_PROCESS_DIED);
+                self._isAlive = False;
+                self._hasDied = True;
 
     def Start(self):
         if not self._isRunning:
-            self._watchThread.start();
-            self._isRunning = True;
+            # the monitor raises holding its own lock, so it's never called with _controlLock held
+            self._monitor.Subscribe(self._monitorObserver);
+            isAlive = self._monitor.Watch(self._processName);
+            with self._controlLock:
+                self._isRunning = True;
+                self._isAlive = isAlive;
+                self._hasDied = False;
+                if self._isAlive:
+                    self._observable.Raise(WD_EVENT_PROCESS_EXISTING);
+                else:
+                    self._observable.Raise(WD_EVENT_PROCESS_UNAVAILABLE);
 
     def Stop(self):
         if self._isRunning:
             with self._controlLock:
-                self._watcherControl.stop = True;
-            self._isRunning = False;
-            self._watchThread.join();
+                self._isRunning = False;
+            self._monitor.Unsubscribe(self._monitorObserver);
+            self._monitor.Unwatch(self._processName);
+
+    def IsAlive(self) -> bool:
+        return self._isAlive;
 
     # LE FACADEE
     def Subscribe(self, observer : observer.Observer):
         observer.Subscribe(self._observable);
 
     def Unsubscribe(self, observer : observer.Observer):
-        self._observable.Unsubscribe(observer);
\ No newline at end of file
+        self._observable.Unsubscribe(observer);
@@ -9,8 +9,80 @@ from lib.shared.colors import StripColorCodes
 
 Log = logging.getLogger(__name__)
 
+class RttEstimator(object):
+    """ Smoothed round trip time and variance per remote, TCP-style ( RFC 6298 ), used to derive retransmit timeouts. """
+
+    ALPHA = 0.125;
+    BETA = 0.25;
+    K = 4;
+    GRANULARITY = 0.01;
+
+    def __init__(self, initialTimeout = 1.0, minTimeout = 0.2, maxTimeout = 4.0):
+        self._lock = threading.Lock();
+        self._initialTimeout = initialTimeout;
+        self._minTimeout = minTimeout;
+        self._maxTimeout = maxTimeout;
+        self._srtt = None;
+        self._rttvar = None;
+        self._rto = initialTimeout;
+        self._samples = 0;
+        self._lastRtt = None;
+        self._minRtt = None;
+        self._maxRtt = None;
+        self._timeouts = 0;
+        self._failures = 0;
+
+    def _Clamp(self, value : float) -> float:
+        return max(self._minTimeout, min(value, self._maxTimeout));
+
+    def AddSample(self, rtt : float):
+        with self._lock:
+            if self._srtt == None:
+                self._srtt = rtt;
+                self._rttvar = rtt / 2;
+            else:
+                self._rttvar = (1 - RttEstimator.BETA) * self._rttvar + RttEstimator.BETA * abs(self._srtt - rtt);
+                self._srtt = (1 - RttEstimator.ALPHA) * self._srtt + RttEstimator.ALPHA * rtt;
+            self._rto = self._Clamp(self._srtt + max(RttEstimator.GRANULARITY, RttEstimator.K * self._rttvar));
+            self._samples += 1;
+            self._lastRtt = rtt;
+            self._minRtt = rtt if self._minRtt == None else min(self._minRtt, rtt);
+            self._maxRtt = rtt if self._maxRtt == None else max(self._maxRtt, rtt);
+
+    def GetTimeout(self, attempt : int = 0) -> float:
+        """ Retransmit timeout for the given attempt, exponential backoff from the current estimate, capped. """
+        with self._lock:
+            return self._Clamp(self._rto * (2 ** attempt));
+
+    def OnTimeout(self):
+        with self._lock:
+            self._timeouts += 1;
+
+    def OnFailure(self):
+        with self._lock:
+            self._failures += 1;
+
+    def GetStats(self) -> dict:
+        with self._lock:
+            return {
+                "srtt" : self._srtt,
+                "rttvar" : self._rttvar,
+                "rto" : self._rto,
+                "lastRtt" : self._lastRtt,
+                "minRtt" : self._minRtt,
+                "maxRtt" : self._maxRtt,
+                "samples" : self._samples,
+                "timeouts" : self._timeouts,
+                "failures" : self._failures,
+            };
+
+
 class RCON(object):
-    def __init__(self, address, bindAddr, password):
+
+    DEFAULT_MAX_RETRIES = 5;
+    MAP_LOAD_TIMEOUT = 120; # commands that may load a map are answered only once it's loaded, retransmitting would load it again
+
+    def __init__(self, address, bindAddr, password, minTimeout = 0.2, maxTimeout = 4.0, maxRetries = DEFAULT_MAX_RETRIES):
         self._address = address;
         self._bindAddr = bindAddr;
         self._password = bytes(password, "UTF-8");
@@ -24,6 +96,8 @@ class RCON(object):
         self._requestTimeout = timeout.Timeout();
         self._responseParserLock = threading.Lock();
         self._responseParser = None; # a crunch method to see if the response from server is complete ( command is executed )
+        self._rtt = RttEstimator(minTimeout = minTimeout, maxTimeout = maxTimeout);
+        self._maxRetries = maxRetries;
     
     def __del__(self):
         if self._isOpened:
@@ -118,36 +192,55 @@ class RCON(object):
                     return True;
         return False;
 
-    # waits for response, ensures delivery
-    def Request(self, payload, responseSize = 4096, timeout = 1, responseParser = None ) -> bytes:
+    # waits for response, retransmits with RTT derived timeouts up to maxRetries times
+    # timeout = None uses the adaptive estimate, an explicit timeout is used as is for known long running commands
+    def Request(self, payload, responseSize = 4096, timeout = None, responseParser = None, maxRetries = None) -> bytes:
+        result = b'';
         if self.IsOpened():
             #print("Request with payload %s"%payload);
-            result = b'';
-            #startTime = time.time();
+            if maxRetries == None:
+                maxRetries = self._maxRetries;
             isOk = False;
+            attempt = 0;
             with self._sockLock:
                 if responseParser != None:
                     self._responseParser = responseParser;
                 self._inBuf.Drop(); # cleanup previous calls data ( junk )
-                while not isOk:
+                while not isOk and attempt <= maxRetries:
+                    curTimeout = self._rtt.GetTimeout(attempt) if timeout == None else timeout;
                     try:
+                        startTime = time.time();
                         self._Send(payload);
-                        if not self._ReadResponse(responseSize, timeout):
-                            Log.warn(f'Message with payload {str(payload)} not received after {timeout} seconds, will attempt to resend.')
-                            timeout *= 2;
+                        if not self._ReadResponse(responseSize, curTimeout):
+                            self._rtt.OnTimeout();
+                            attempt += 1;
+                            Log.warning(f'Message with payload {str(payload)} not received after {curTimeout:.3f} seconds, attempt {attempt} of {maxRetries + 1}.')
                             continue;
                         else:
+                            # Karn's algorithm, retransmitted requests are ambiguous and multi-packet responses measure transfer, not RTT.
+                            # An explicit timeout marks a long running command ( map load ), its reply time is not a round trip either
+                            if attempt == 0 and responseParser == None and timeout == None:
+                                self._rtt.AddSample(time.time() - startTime);
                             result = self._PopUnread();
                             #print("Result from request %s"%result);
                             isOk = True;
                     except Exception as ex:
                         print("Exception at Request in rcon %s" %str(ex));
                         break;
-            #print("Request time %f" % (time.time() - startTime));
+                if not isOk:
+                    self._rtt.OnFailure();
+                    Log.error(f'Message with payload {str(payload)} was not answered after {attempt} attempts, giving up.');
             if self._responseParser != None:
                 self._responseParser = None;
+        if result == None:
+            result = b'';
         return result;
 
+    def GetRttStats(self) -> dict:
+        stats = self._rtt.GetStats();
+        stats["address"] = "%s:%s" % (self._address[0], self._address[1]);
+        return stats;
+
     def IsOpened(self)->bool:
         return self._isOpened;
 
@@ -173,12 +266,14 @@ class RCON(object):
             clientId = bytes(clientId, "UTF-8")
         return self.Request(b"\xff\xff\xff\xffrcon %b svtell %b %b" % (self._password, clientId, msg));
 
-    def MbMode(self, cmd, mapToChange=None):
-        """ Changes to the given MbMode (0 = Open, 1 = Semi Authentic, 2 = Full Authentic, 3 = Duel, 4 = Legends). If mapToChange is provided, also changes to that map. """
+    def MbMode(self, cmd, mapToChange=None, timeout = MAP_LOAD_TIMEOUT):
+        """ Changes to the given MbMode (0 = Open, 1 = Semi Authentic, 2 = Full Authentic, 3 = Duel, 4 = Legends). If mapToChange is provided, also changes to that map, sent like MapReload then. """
         if mapToChange == None:
             mapToChange = b""
         if not type(mapToChange) == bytes and mapToChange != b"":
             mapToChange = bytes(mapToChange, "UTF-8")
+        if mapToChange != b"":
+            return self.Request(b"\xff\xff\xff\xffrcon %b mbmode %i %b" % (self._password, cmd, mapToChange), 1024*32, timeout, maxRetries = 0)
         return self.Request(b"\xff\xff\xff\xffrcon %b mbmode %i %b" % (self._password, cmd, mapToChange))
     
     def ClientMute(self, player_id : int, minutes : int = 10):
@@ -301,19 +396,14 @@ class RCON(object):
         """ (DEPRECATED, DO NOT USE) """
         return self.Request(b"\xff\xff\xff\xffrcon %b map_restart %i" % (self._password, delay))
 
-    def _MapReloadParser(self, bb : bytes) -> bool:
-        return True if bb.decode("UTF-8", "ignore").rfind("InitGame:") != -1 else False;
-
-    def MapReload(self, mapName):
-        """ USE THIS """
+    def MapReload(self, mapName, timeout = MAP_LOAD_TIMEOUT):
+        """ USE THIS, the server answers only once the map is loaded so the request gets a long fixed timeout and no retransmits. Completion is confirmed by the InitGame log line, see RconInterface.MapReload """
         if not type(mapName) == bytes:
             mapName = bytes(mapName, "UTF-8")
-        response =  self.Request(b"\xff\xff\xff\xffrcon %b map %b" % (self._password, mapName), 1024*32, 120, self._MapReloadParser);
-        time.sleep(5); # man, this is hard, 5 just in case, we cant be sure when it ends because there is no strict protocol
-        #self._ClearInputSocket();
-        return response;
+        return self.Request(b"\xff\xff\xff\xffrcon %b map %b" % (self._password, mapName), 1024*32, timeout, maxRetries = 0);
 
     def GetCurrentMap(self):
+        mapName = None
         response = self.Request(b"\xff\xff\xff\xffrcon %b mapname" % (self._password))
         if response != None and len(response) > 0:
             response = response.removeprefix(b'\xff\xff\xff\xffprint\n^9Cvar ^7mapname = ^9"^7')
@@ -349,7 +439,8 @@ class RCON(object):
         res = self.Request(b"\xff\xff\xff\xffrcon %b cvarlist" % (self._password), responseParser=self._CvarListParser)
         if len(res) == 0:
             return None;
-        res = res.decode("UTF-8", "ignore");
+        # every packet of a multi packet response carries its own header, often in the middle of a line
+        res = res.replace(b"\xff\xff\xff\xffprint\n", b"").decode("UTF-8", "ignore");
         #print("Cvarlist time taken %f"%(time.time() - start));
         return res
     
@@ -389,12 +480,13 @@ class RCON(object):
             msg = bytes(msg, "UTF-8")
         return self.Request(b"\xff\xff\xff\xffrcon %b smsay %s" % (self._password, msg));
 
-    def ExecFile(self, filename : str, quiet : bool = False):
+    def ExecFile(self, filename : str, quiet : bool = False, timeout = MAP_LOAD_TIMEOUT):
         """
         Executes a script file with the given filename.
         If the filename does not have a file extension, .cfg will be added to the end of the filename.
         The file must be in the /MBII/ directory prior to the server starting. After the file is indexed
         by the server however, the contents can be changed and changes will be reflected.
+        A script may load a map and must not run twice, so it's sent like MapReload, with a long fixed timeout and no retransmits.
         """
         if not type(filename) == bytes:
             filename = bytes(filename, "UTF-8")
@@ -402,7 +494,7 @@ class RCON(object):
             cmd = b'execq'
         else:
             cmd = b'exec'
-        return self.Request(b"\xff\xff\xff\xffrcon %b %b %b" % (self._password, cmd, filename))
+        return self.Request(b"\xff\xff\xff\xffrcon %b %b %b" % (self._password, cmd, filename), 1024*32, timeout, maxRetries = 0)
 
     def MarkTK(self, player_id : int, time : int):
         if not type(player_id) == bytes:
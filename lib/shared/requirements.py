@@ -0,0 +1,122 @@
+import os;
+import sys;
+import json;
+import site;
+import hashlib;
+import logging;
+import lib.shared.lazyimport as lazyimport;
+
+# only needed when a requirements file is not in the manifest, which on most starts is none of them
+metadata = lazyimport.LazyModule("importlib.metadata");
+_packaging = lazyimport.LazyModule("packaging.requirements");
+_vendoredPackaging = lazyimport.LazyModule("pip._vendor.packaging.requirements"); # pip always ships it
+
+Log = logging.getLogger(__name__);
+
+DEFAULT_MANIFEST_PATH = "requirements.manifest.json";
+MANIFEST_VERSION = 1;
+
+# Non requirement lines of a requirements file : blanks, comments and pip options
+def GetRequirementLines(content : str) -> list[str]:
+    lines = [];
+    for line in content.splitlines():
+        line = line.split(" #", 1)[0].strip();
+        if len(line) == 0 or line.startswith("#") or line.startswith("-"):
+            continue;
+        lines.append(line);
+    return lines;
+
+# True when line is installed in this interpreter with a version matching its specifier.
+# Standard library modules count as installed, so "asyncio" doesn't pull the old PyPI backport.
+def IsSatisfied(line : str) -> bool:
+    packaging = _GetPackaging();
+    if packaging != None:
+        try:
+            req = packaging.Requirement(line);
+        except packaging.InvalidRequirement:
+            Log.warning("Unable to parse requirement %s, leaving it to pip" % line);
+            return False;
+        if req.marker != None and not req.marker.evaluate():
+            return True; # not meant for this platform or python
+        name = req.name;
+        specifier = req.specifier;
+    else:
+        name = line;
+        for sep in "[<>=!~; ":
+            name = name.split(sep, 1)[0];
+        specifier = None;
+    try:
+        version = metadata.version(name);
+    except metadata.PackageNotFoundError:
+        return name in getattr(sys, "stdlib_module_names", ());
+    if specifier == None or len(specifier) == 0:
+        return True;
+    return specifier.contains(version, prereleases = True);
+
+def _GetPackaging():
+    for module in (_packaging, _vendoredPackaging):
+        if module.IsAvailable():
+            return module;
+    return None;
+
+def GetMissing(lines : list[str]) -> list[str]:
+    return [line for line in lines if not IsSatisfied(line)];
+
+# Changes whenever packages are installed or removed : interpreter, prefix and the modification times of the site directories
+def GetEnvironmentKey() -> str:
+    parts = [sys.executable, sys.prefix, sys.version];
+    dirs = list(site.getsitepackages()) if hasattr(site, "getsitepackages") else [];
+    if site.ENABLE_USER_SITE:
+        dirs.append(site.getusersitepackages());
+    for dir in dirs:
+        try:
+            parts.append("%s:%i" % (dir, os.stat(dir).st_mtime_ns));
+        except OSError:
+            continue;
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest();
+
+class RequirementsManifest():
+    """
+    Remembers requirements files that were fully satisfied, keyed by a hash of the file content and the environment,
+    so on later starts they are skipped without looking up a single distribution. Installing or removing any package
+    touches a site directory and changes the environment key, which invalidates every entry.
+    """
+    def __init__(self, path : str = DEFAULT_MANIFEST_PATH):
+        self._path = path;
+        self._entries = dict[str, str](); # requirements file -> key it was satisfied with
+        self._isDirty = False;
+        self._envKey = None;
+
+    def Load(self):
+        try:
+            with open(self._path, "r", encoding = "utf-8") as f:
+                data = json.load(f);
+            if data.get("version") == MANIFEST_VERSION:
+                self._entries = data.get("entries", {});
+        except (OSError, ValueError):
+            self._entries = {};
+
+    def Save(self):
+        if not self._isDirty:
+            return;
+        try:
+            with open(self._path, "w", encoding = "utf-8") as f:
+                json.dump({ "version" : MANIFEST_VERSION, "entries" : self._entries }, f, indent = 4);
+            self._isDirty = False;
+        except OSError as ex:
+            Log.warning("Unable to write requirements manifest %s : %s" % (self._path, str(ex)));
+
+    def InvalidateEnvironment(self):
+        self._envKey = None;
+
+    def _GetKey(self, content : str) -> str:
+        if self._envKey == None:
+            self._envKey = GetEnvironmentKey();
+        return hashlib.sha256((self._envKey + "\n" + content).encode("utf-8")).hexdigest();
+
+    def IsSatisfied(self, rqsPath : str, content : str) -> bool:
+        return self._entries.get(os.path.abspath(rqsPath)) == self._GetKey(content);
+
+    def Record(self, rqsPath : str, content : str):
+        self._entries[os.path.abspath(rqsPath)] = self._GetKey(content);
+        self._isDirty = True;
@@ -1,19 +1,25 @@
 import threading
 import lib.shared.pk3 as pk3;
+import lib.shared.assetcatalog as assetcatalog;
 import godfingerAPI;
 import lib.shared.rcon as rcon;
 import cvar;
 import godfingerinterface;
 
+# ( alias, help ) lists of chat and smod commands shown by !help, filled through RegisterCommands
+COMMAND_VARS = ("registeredCommands", "registeredSmodCommands")
+
 class ServerData():
 
-    def __init__(self, pk3mngr : pk3.Pk3Manager, cvarManager : cvar.CvarManager, API : godfingerAPI.API, iface : godfingerinterface.IServerInterface, args):
+    def __init__(self, pk3mngr : pk3.Pk3Manager, cvarManager : cvar.CvarManager, API : godfingerAPI.API, iface : godfingerinterface.IServerInterface, args, assetCatalog : assetcatalog.AssetCatalog = None):
         self.pk3Manager = pk3mngr;
+        self.assetCatalog = assetCatalog; # maps, team configs, campaign rotations and characters found in the archives
         self.cvarManager = cvarManager;
         self.API = API;
         self.args = args;
         self.lock = threading.Lock()
         self.serverVars = {}
+        self._commandOwners = {} # ( var, owner ) -> entries the owner registered
         # self.rcon = rcon;
         self.interface = iface;
         self.maxPlayers = 0;
@@ -39,6 +45,35 @@ class ServerData():
         with self.lock:
             self.serverVars[var] = val
     
+    # Appends entries to the list in var in one step under the lock, plugins initialize concurrently and a get then set
+    # would drop what another plugin added in between. owner is the plugin module, so a reload can take its entries back.
+    # The list is replaced rather than changed in place, a list a reader got earlier stays as it was.
+    def RegisterCommands(self, var, entries : list, owner : str = None) -> None:
+        with self.lock:
+            current = self.serverVars.get(var)
+            self.serverVars[var] = (list(current) if current != None else []) + list(entries)
+            if owner != None:
+                self._commandOwners.setdefault((var, owner), []).extend(entries)
+
+    # Removes entries from the list in var, all the ones owner registered when entries is None
+    def UnregisterCommands(self, var, entries : list = None, owner : str = None) -> None:
+        with self.lock:
+            if entries == None:
+                entries = self._commandOwners.pop((var, owner), [])
+            elif owner != None and (var, owner) in self._commandOwners:
+                owned = self._commandOwners[(var, owner)]
+                for entry in entries:
+                    if entry in owned:
+                        owned.remove(entry)
+            current = self.serverVars.get(var)
+            if current == None:
+                return
+            remaining = list(current)
+            for entry in entries:
+                if entry in remaining:
+                    remaining.remove(entry)
+            self.serverVars[var] = remaining
+
     def UnsetServerVar(self, var) -> bool:
         with self.lock:
             if var in self.serverVars:
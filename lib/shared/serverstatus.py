@@ -0,0 +1,148 @@
+import time;
+import threading;
+import lib.shared.colors as colors;
+
+# Typed view of the "status notrunc" output, parsed by line labels instead of fixed line indexes:
+#
+# hostname: My Server^7
+# version : 1.0.1.1 26
+# game    : MBII
+# udp/ip  : 0.0.0.0:29070 os(Linux) type(public dedicated)
+# map     : mb2_dotf gametype(7)
+# players : 2 humans, 0 bots (32 max)
+# uptime  : 1h2m3s
+# cl score ping name            address                                 rate
+# -- ----- ---- --------------- --------------------------------------- -----
+#  0     5   50 (Padawan)^7 127.0.0.1:29071 25000
+
+DEFAULT_MAX_PLAYERS = 32;
+
+class StatusPlayer():
+    def __init__(self, id : int, score : int, ping : int, name : str, address : str):
+        self.id = id;
+        self.score = score;
+        self.ping = ping;
+        self.name = name;
+        self.address = address;
+
+    def __repr__(self):
+        return f"StatusPlayer {self.id} {self.name} ({self.address}) score {self.score} ping {self.ping}";
+
+class ServerStatus():
+    def __init__(self):
+        self.hostName = "";
+        self.version = "";
+        self.gameType = "";
+        self.mapName = "";
+        self.mode = -1;
+        self.maxPlayers = DEFAULT_MAX_PLAYERS;
+        self.players = dict[int, StatusPlayer]();
+        self.isValid = False;
+        self.timestamp = 0.0;
+
+    def GetPlayer(self, id : int) -> StatusPlayer:
+        return self.players.get(id);
+
+    def GetPlayerCount(self) -> int:
+        return len(self.players);
+
+    def __repr__(self):
+        return f"ServerStatus {self.mapName} mode {self.mode} players {len(self.players)}/{self.maxPlayers} valid {self.isValid}";
+
+def _ParseName(name : str) -> str:
+    if name.endswith("^7"):
+        name = name[:-2].strip();
+    if len(name) > 1 and name[0] == '(' and name[-1] == ')':
+        name = name[1:-1]; # strip only first and last '(' and ')' chars
+    return name;
+
+def _ParsePlayerLine(line : str) -> StatusPlayer:
+    split = line.split();
+    if len(split) < 6: # cl score ping name.. address rate
+        return None;
+    try:
+        id = int(split[0]);
+        score = int(split[1]);
+        ping = int(split[2]) if split[2].lstrip("-").isdigit() else -1; # CNCT / ZMBI for connecting and zombie slots
+    except ValueError:
+        return None;
+    return StatusPlayer(id, score, ping, _ParseName(" ".join(split[3:-2])), split[-2]);
+
+def ParseStatus(statusStr : str) -> ServerStatus:
+    result = ServerStatus();
+    result.timestamp = time.time();
+    if statusStr == None:
+        return result;
+    inPlayers = False;
+    for line in statusStr.splitlines():
+        stripped = line.strip();
+        if inPlayers:
+            player = _ParsePlayerLine(stripped);
+            if player != None:
+                result.players[player.id] = player;
+            continue;
+        if stripped.startswith("--"):
+            inPlayers = True;
+            continue;
+        label, sep, value = stripped.partition(":");
+        if sep == "":
+            continue;
+        label = label.strip();
+        value = value.strip();
+        if label == "hostname":
+            result.hostName = colors.StripColorCodes(value);
+        elif label == "version":
+            result.version = "_".join(value.split()[0:2]);
+        elif label == "game":
+            result.gameType = value.split()[0] if len(value) > 0 else "";
+        elif label == "map":
+            mapSplit = value.split();
+            if len(mapSplit) > 0:
+                result.mapName = mapSplit[0];
+                result.isValid = True;
+            if len(mapSplit) > 1:
+                modeStr = mapSplit[1];
+                try:
+                    result.mode = int(modeStr[modeStr.find("(")+1:modeStr.rfind(")")]);
+                except ValueError:
+                    pass;
+        elif label == "players":
+            startIndex = value.find("(");
+            endIndex = value.find(" max");
+            if startIndex != -1 and endIndex != -1:
+                try:
+                    result.maxPlayers = int(value[startIndex+1:endIndex]);
+                except ValueError:
+                    pass;
+    return result;
+
+class StatusCache():
+    """ Short lived cache of the parsed status, concurrent callers within the TTL share a single request. """
+    def __init__(self, fetchFunction, ttl : float = 1.0):
+        self._fetch = fetchFunction;
+        self._ttl = ttl;
+        self._lock = threading.Lock();
+        self._snapshot : ServerStatus = None;
+        self.requests = 0;
+        self.hits = 0;
+
+    def Get(self, maxAge : float = None) -> ServerStatus:
+        if maxAge == None:
+            maxAge = self._ttl;
+        snapshot = self._snapshot;
+        if snapshot != None and time.time() - snapshot.timestamp <= maxAge:
+            self.hits += 1;
+            return snapshot;
+        with self._lock:
+            # someone else may have refreshed it while we waited for the lock
+            snapshot = self._snapshot;
+            if snapshot != None and time.time() - snapshot.timestamp <= maxAge:
+                self.hits += 1;
+                return snapshot;
+            self.requests += 1;
+            snapshot = ParseStatus(self._fetch());
+            self._snapshot = snapshot;
+            return snapshot;
+
+    def Invalidate(self):
+        self._snapshot = None;
@@ -1,8 +1,41 @@
 
 import traceback;
 
+# Parses .mbtc content in a single pass over its lines.
+# Returns ( name, classesAllowed, timePeriod, EUAllowed, classes, subClasses ), name is None when the file doesn't set one.
+# Takes bytes or a memoryview and only returns builtins, so it can run in a worker process.
+def ParseTeamConfig(byte_buffer) -> tuple:
+    name = None;
+    classesAllowed = 0;
+    timePeriod = 0;
+    EUAllowed = 0;
+    classes = {};
+    subClasses = {};
+    for line in str(byte_buffer, "utf-8").splitlines():
+        splitted = line.split(None, 2);
+        if len(splitted) < 2:
+            continue; # empty lines and lines without a value
+        paramName = splitted[0];
+        if paramName[0] == "/" or paramName[0] == "#":
+            continue; # commented lines
+        paramValue = splitted[1];
+        if paramName.startswith("class"):
+            classes[paramName] = paramValue;
+        elif paramName.startswith("Subclass"):
+            subClasses[paramName] = paramValue;
+        elif paramName == "name":
+            name = paramValue;
+        elif paramName == "ClassesAllowed":
+            classesAllowed = int(paramValue);
+        elif paramName == "TimePeriod":
+            timePeriod = int(paramValue);
+        elif paramName == "EUAllowed":
+            EUAllowed = int(paramValue);
+    return (name, classesAllowed, timePeriod, EUAllowed, classes, subClasses);
+
 class TeamConfig():
-    
+    __slots__ = ("_name", "_classesAllowedNum", "_timePeriodNum", "_EUAllowedNum", "_classes", "_subClasses", "_isLoaded", "_pathName", "_filename");
+
     def __init__(self, name = None, pathName = None):
         self._name = name;
         self._classesAllowedNum = 0;
@@ -23,38 +56,45 @@ class TeamConfig():
     def LoadBytes(self, byte_buffer) -> bool:
         if self._isLoaded:
             return True;
-    
-        strContents = byte_buffer.decode();
-        lines = strContents.splitlines();
-        for line in lines:
-            line = line.strip();
-            if len(line) < 1:
-                continue; # skip empty lines 
-            if line.startswith("/"): # skip / commented lines
-                continue;
-            if line.startswith("#"):
-                continue; # skip # commented lines
-            splitted = line.split();
-            if len(splitted) > 1:
-                paramName = splitted[0];
-                paramValue = splitted[1];
-                if paramName == "name":
-                    self._name = paramValue;
-                elif paramName == "ClassesAllowed":
-                    self._classesAllowedNum = int(paramValue);
-                elif paramName == "TimePeriod":
-                    self._timePeriodNum = int(paramValue);
-                elif paramName == "EUAllowed":
-                    self._EUAllowedNum = int(paramValue);
-                elif paramName.startswith("class"):
-                    self._classes[paramName] = paramValue;
-                elif paramName.startswith("Subclass"):
-                    self._subClasses[paramName] = paramValue;
+        return self.LoadParsed(ParseTeamConfig(byte_buffer)); # bytes or a memoryview straight from the archive
 
+    # parsed is a ParseTeamConfig result, possibly shared through a cache, its dicts are copied so callers can't change the cached ones
+    def LoadParsed(self, parsed : tuple) -> bool:
+        if self._isLoaded:
+            return True;
+        if parsed[0] != None:
+            self._name = parsed[0];
+        self._classesAllowedNum = parsed[1];
+        self._timePeriodNum = parsed[2];
+        self._EUAllowedNum = parsed[3];
+        self._classes = dict(parsed[4]);
+        self._subClasses = dict(parsed[5]);
         self._isLoaded = True;
-
         return True;
 
+    def IsLoaded(self) -> bool:
+        return self._isLoaded;
+
+    def GetName(self) -> str:
+        return self._name;
+
+    def GetClassesAllowed(self) -> int:
+        return self._classesAllowedNum;
+
+    def GetTimePeriod(self) -> int:
+        return self._timePeriodNum;
+
+    def GetEUAllowed(self) -> int:
+        return self._EUAllowedNum;
+
+    # class slot ( "class1" ... ) -> character file name
+    def GetClasses(self) -> dict[str, str]:
+        return self._classes;
+
+    # subclass slot ( "Subclass1_1" ... ) -> character file name
+    def GetSubClasses(self) -> dict[str, str]:
+        return self._subClasses;
+
     def LoadFile(self, pathName) -> bool:
         if not self._isLoaded:
             try:
@@ -0,0 +1,192 @@
+import array;
+import math;
+import time;
+import psutil;
+
+METRIC_CPU = "cpu"; # percent of one core, summed over the processes of the name
+METRIC_RSS = "rss"; # resident memory in bytes
+METRIC_THREADS = "threads";
+METRIC_READ = "read"; # bytes read per second
+METRIC_WRITE = "write"; # bytes written per second
+METRIC_FILES = "files"; # open file descriptors, handles on Windows
+METRICS = (METRIC_CPU, METRIC_RSS, METRIC_THREADS, METRIC_READ, METRIC_WRITE, METRIC_FILES);
+
+class TimeSeries():
+    """ Fixed size ring of ( time, value ) samples in two arrays of doubles, the oldest samples are overwritten. """
+    def __init__(self, capacity : int):
+        self._capacity = capacity;
+        self._times = array.array("d", bytes(8 * capacity));
+        self._values = array.array("d", bytes(8 * capacity));
+        self._next = 0;
+        self._count = 0;
+
+    def Append(self, t : float, value : float):
+        self._times[self._next] = t;
+        self._values[self._next] = value;
+        self._next = (self._next + 1) % self._capacity;
+        if self._count < self._capacity:
+            self._count += 1;
+
+    def __len__(self):
+        return self._count;
+
+    def GetCapacity(self) -> int:
+        return self._capacity;
+
+    # values oldest first, only the ones not older than since when it's given
+    def GetValues(self, since : float = None) -> list[float]:
+        start = (self._next - self._count) % self._capacity;
+        order = [(start + i) % self._capacity for i in range(self._count)];
+        if since == None:
+            return [self._values[i] for i in order];
+        return [self._values[i] for i in order if self._times[i] >= since];
+
+    def GetSamples(self) -> list[tuple]:
+        start = (self._next - self._count) % self._capacity;
+        return [(self._times[(start + i) % self._capacity], self._values[(start + i) % self._capacity]) for i in range(self._count)];
+
+    def GetLast(self) -> float:
+        if self._count == 0:
+            return None;
+        return self._values[(self._next - 1) % self._capacity];
+
+    # linear interpolation between the closest ranks, p in 0 .. 100
+    def Percentile(self, p : float, since : float = None) -> float:
+        values = sorted(self.GetValues(since));
+        if len(values) == 0:
+            return None;
+        rank = (len(values) - 1) * min(max(p, 0.0), 100.0) / 100.0;
+        low = math.floor(rank);
+        high = math.ceil(rank);
+        return values[low] + (values[high] - values[low]) * (rank - low);
+
+    def GetSummary(self, since : float = None) -> dict:
+        values = sorted(self.GetValues(since));
+        if len(values) == 0:
+            return {};
+        summary = { "count" : len(values), "min" : values[0], "max" : values[-1], "mean" : sum(values) / len(values) };
+        for p in (50, 95, 99):
+            rank = (len(values) - 1) * p / 100.0;
+            low = math.floor(rank);
+            summary["p%i" % p] = values[low] + (values[math.ceil(rank)] - values[low]) * (rank - low);
+        return summary;
+
+class ProcessTelemetry():
+    """
+    Resource samples of the processes of one name, a TimeSeries per metric, taken by the ProcessMonitor every interval seconds.
+    thresholds maps a metric to a limit, a metric becomes high after sustain samples in a row above its limit
+    and normal again on the first sample at or below it, each change is returned by Sample as ( metric, isHigh, value, limit ).
+    """
+
+    DEFAULT_INTERVAL = 5.0;
+    DEFAULT_CAPACITY = 720; # an hour at the default interval
+    DEFAULT_SUSTAIN = 2;
+
+    def __init__(self, name : str, interval : float = DEFAULT_INTERVAL, capacity : int = DEFAULT_CAPACITY, thresholds : dict = None, sustain : int = DEFAULT_SUSTAIN):
+        self._name = name;
+        self._interval = interval;
+        self._series = { metric : TimeSeries(capacity) for metric in METRICS };
+        self._thresholds = { k : v for k, v in (thresholds if thresholds != None else {}).items() if k in self._series and v != None and v > 0 };
+        self._sustain = max(sustain, 1);
+        self._above = dict.fromkeys(self._thresholds, 0);
+        self._isHigh = dict.fromkeys(self._thresholds, False);
+        self._previous = dict[int, tuple](); # pid -> ( time, cpu seconds, read bytes, write bytes )
+        self._nextSample = 0.0;
+        self._sampleCost = 0.0; # cpu seconds the sampling thread spent in Sample
+        self._sampleCount = 0;
+
+    def GetName(self) -> str:
+        return self._name;
+
+    def GetInterval(self) -> float:
+        return self._interval;
+
+    def GetNextSample(self) -> float:
+        return self._nextSample;
+
+    def GetSeries(self, metric : str) -> TimeSeries:
+        return self._series.get(metric);
+
+    def GetLast(self) -> dict:
+        return { metric : self._series[metric].GetLast() for metric in self._series };
+
+    # summaries of every metric, over the last window seconds when it's given
+    def GetSummary(self, window : float = None) -> dict:
+        since = time.time() - window if window != None else None;
+        return { metric : self._series[metric].GetSummary(since) for metric in self._series };
+
+    def IsHigh(self, metric : str) -> bool:
+        return self._isHigh.get(metric, False);
+
+    def GetOverhead(self) -> dict:
+        return { "samples" : self._sampleCount, "cpuSeconds" : self._sampleCost,
+                 "perSampleMs" : self._sampleCost * 1000 / self._sampleCount if self._sampleCount > 0 else 0.0 };
+
+    def Reset(self):
+        self._previous.clear();
+
+    # samples procs if the interval has passed, returns the threshold changes
+    def Sample(self, procs : list[psutil.Process], now : float) -> list[tuple]:
+        if now < self._nextSample:
+            return [];
+        self._nextSample = now + self._interval;
+        if len(procs) == 0:
+            self._previous.clear();
+            return [];
+        costStart = time.thread_time();
+        wallNow = time.time();
+        totals = dict.fromkeys(METRICS, 0.0);
+        hasRates = False;
+        previous = dict[int, tuple]();
+        for proc in procs:
+            try:
+                with proc.oneshot():
+                    cpuTimes = proc.cpu_times();
+                    totals[METRIC_RSS] += proc.memory_info().rss;
+                    totals[METRIC_THREADS] += proc.num_threads();
+                    try:
+                        totals[METRIC_FILES] += proc.num_fds() if hasattr(proc, "num_fds") else proc.num_handles();
+                    except psutil.AccessDenied:
+                        pass; # another user's process
+                    try:
+                        io = proc.io_counters();
+                        readBytes, writeBytes = io.read_bytes, io.write_bytes;
+                    except (AttributeError, psutil.AccessDenied):
+                        readBytes, writeBytes = 0, 0; # not available on macOS, or for another user's process
+            except psutil.Error:
+                continue;
+            cpu = cpuTimes.user + cpuTimes.system;
+            previous[proc.pid] = (now, cpu, readBytes, writeBytes);
+            last = self._previous.get(proc.pid);
+            if last != None and now > last[0]:
+                elapsed = now - last[0];
+                totals[METRIC_CPU] += (cpu - last[1]) * 100.0 / elapsed;
+                totals[METRIC_READ] += max(readBytes - last[2], 0) / elapsed;
+                totals[METRIC_WRITE] += max(writeBytes - last[3], 0) / elapsed;
+                hasRates = True;
+        self._previous = previous;
+        if len(previous) == 0:
+            return [];
+
+        changes = [];
+        for metric in METRICS:
+            if not hasRates and metric in (METRIC_CPU, METRIC_READ, METRIC_WRITE):
+                continue; # first sample of a process only sets the baseline
+            value = totals[metric];
+            self._series[metric].Append(wallNow, value);
+            limit = self._thresholds.get(metric);
+            if limit == None:
+                continue;
+            if value > limit:
+                self._above[metric] += 1;
+                if not self._isHigh[metric] and self._above[metric] >= self._sustain:
+                    self._isHigh[metric] = True;
+                    changes.append((metric, True, value, limit));
+            else:
+                self._above[metric] = 0;
+                if self._isHigh[metric]:
+                    self._isHigh[metric] = False;
+                    changes.append((metric, False, value, limit));
+        self._sampleCost += time.thread_time() - costStart;
+        self._sampleCount += 1;
+        return changes;
@@ -7,7 +7,13 @@ import traceback;
 import os;
 import subprocess;
 import sys;
+import queue;
+import threading;
+import concurrent.futures;
 import lib.shared.util as util;
+import lib.shared.requirements as requirements;
+import lib.shared.importprofile as importprofile;
+import lib.shared.serverdata as serverdata;
 
 Log = logging.getLogger(__name__);
 
@@ -22,6 +28,8 @@ class Plugin():
         self._onFinish = None;
         self._isFinished = False;
         self._exports = pluginExports.ExportTable();
+        self._dispatchLock = threading.RLock(); # a reload detaches the plugin from another thread
+        self._isDetached = False;
 
     def __del__(self):
         if not self._isFinished:
@@ -69,49 +77,194 @@ class Plugin():
         return rslt;
 
     def Loop(self):
-        try:
-            self._onLoop();
-        except Exception as ex:
-            Log.error("Exception [%s] caught on Loop tick for plugin [%s]\n %s", str(ex), self._module.__name__, traceback.format_exc());
+        with self._dispatchLock:
+            if self._isDetached:
+                return;
+            try:
+                self._onLoop();
+            except Exception as ex:
+                Log.error("Exception [%s] caught on Loop tick for plugin [%s]\n %s", str(ex), self._module.__name__, traceback.format_exc());
 
     def Event(self, event) -> bool:
-        try:
-            return self._onEvent(event);
-        except Exception as ex:
-            Log.error("Exception [%s] caught on Event call for plugin [%s]\n %s", str(ex), self._module.__name__, traceback.format_exc());
-        finally:
-            return False; 
+        with self._dispatchLock:
+            if self._isDetached:
+                return False;
+            try:
+                return self._onEvent(event);
+            except Exception as ex:
+                Log.error("Exception [%s] caught on Event call for plugin [%s]\n %s", str(ex), self._module.__name__, traceback.format_exc());
+            finally:
+                return False; 
+
+    # stops Loop and Event calls, once the one in progress returns
+    def Detach(self):
+        with self._dispatchLock:
+            self._isDetached = True;
+
+    def IsFinished(self) -> bool:
+        return self._isFinished;
+
+    def IsDetached(self) -> bool:
+        return self._isDetached;
+
+    # state the plugin hands to its reloaded module through the optional OnReloadSave hook, None without one
+    def SaveState(self) -> any:
+        onReloadSaveFunc = getattr(self._module, "OnReloadSave", None);
+        if onReloadSaveFunc == None:
+            return None;
+        return onReloadSaveFunc();
+
+    # gives the reloaded module what the previous one saved, through the optional OnReloadRestore hook
+    def RestoreState(self, state : any):
+        onReloadRestoreFunc = getattr(self._module, "OnReloadRestore", None);
+        if onReloadRestoreFunc != None and state != None:
+            onReloadRestoreFunc(state);
+
+    def GetModule(self):
+        return self._module;
 
     def GetExports(self):
         return self._exports.copy();
 
 class PluginManager():
-    def __init__(self):
+    """
+    Loads plugins concurrently on a thread pool. A plugin module may list the plugins it needs in a module level
+    DEPENDENCIES list, a plugin config entry may add more with "dependsOn", a plugin is initialized only after
+    all of its dependencies were, independent plugins are imported and initialized at the same time.
+    Plugins keep the config order for Start, Loop and Event whatever order they finished loading in.
+    A plugin is available to GetPlugin as soon as its OnInitialize succeeded, so plugins initializing later can find it.
+    """
+
+    DEFAULT_INIT_WORKERS = 4;
+
+    def __init__(self, requirementsManifest : str = requirements.DEFAULT_MANIFEST_PATH):
         self._isInit = False;
-        self._plugins = {};
+        self._plugins = {}; # started ones, in config order, Start Loop and Event go through them on the main thread
+        self._available = {}; # initialized ones, for GetPlugin from any thread
+        self._availableLock = threading.Lock();
         self._isFinished = False;
+        self._manifest = requirements.RequirementsManifest(requirementsManifest);
+        self._requirementsLock = threading.Lock(); # pip installs and the manifest are not safe to share between loads
+        self._loadTimes = {};
+        self._data = None;
+        self._reloads = dict[str, threading.Thread]();
+        self._reloadLock = threading.Lock();
+        self._reloadResults = queue.Queue(); # finished reloads, attached by Loop on the main thread
 
     def __del__(self):
         pass
 
-    def Initialize(self, targetPlugins : list, data : any) -> bool:
+    def Initialize(self, targetPlugins : list, data : any, workers : int = DEFAULT_INIT_WORKERS) -> bool:
         if not self._isInit:
             Log.info("Loading plugins...");
-            totalLoaded = 0;
+            self._data = data;
+            self._manifest.Load();
+            configDeps = {};
             for targetPlug in targetPlugins:
                 pluginPath = targetPlug["path"];
                 # Check if plugin is already loaded
-                if pluginPath in self._plugins:
+                if pluginPath in self._plugins or pluginPath in configDeps:
                     Log.warning("Plugin %s is already loaded, skipping duplicate load.", pluginPath);
                     continue;
-                plug = self.LoadPlugin(pluginPath, data);
-                if plug != None:
-                    self._plugins[pluginPath] = plug;
-                    totalLoaded += 1;
-            Log.info("Loaded total %d plugins. "% (totalLoaded));
+                configDeps[pluginPath] = list(targetPlug.get("dependsOn", []));
+            workers = max(1, min(workers, len(configDeps)));
+            startTime = time.perf_counter();
+            with concurrent.futures.ThreadPoolExecutor(max_workers = workers, thread_name_prefix = "PluginLoad") as pool:
+                loaded = self._LoadPlugins(pool, configDeps, data, startTime);
+            for pluginPath in configDeps:
+                if pluginPath in loaded:
+                    self._plugins[pluginPath] = loaded[pluginPath];
+            self._manifest.Save();
+            Log.info("Loaded total %d plugins in %.2f seconds with %d workers." % (len(loaded), time.perf_counter() - startTime, workers));
+            self._ReportLoadTimes(loaded);
             self._isInit = True;
         return self._isInit;
 
+    # import futures are all submitted at once, an init future as soon as the plugin is imported and its dependencies are initialized
+    def _LoadPlugins(self, pool : concurrent.futures.Executor, configDeps : dict, data : any, startTime : float) -> dict:
+        self._loadTimes = { name : { "import" : 0.0, "imported" : 0.0, "init" : 0.0, "ready" : 0.0, "deps" : [] } for name in configDeps };
+        futures = {};
+        for name in configDeps:
+            futures[pool.submit(self._ImportPlugin, name)] = (name, False);
+        modules = {}; # imported and waiting for dependencies
+        loaded = {};
+        failed = set();
+        while len(futures) > 0:
+            done, _ = concurrent.futures.wait(futures, return_when = concurrent.futures.FIRST_COMPLETED);
+            for future in done:
+                name, isInit = futures.pop(future);
+                result = future.result();
+                times = self._loadTimes[name];
+                if isInit:
+                    times["init"] = result[1];
+                    times["ready"] = time.perf_counter() - startTime;
+                    if result[0] != None:
+                        loaded[name] = result[0];
+                    else:
+                        failed.add(name);
+                else:
+                    times["import"] = result[1];
+                    times["imported"] = time.perf_counter() - startTime;
+                    if result[0] == None:
+                        failed.add(name);
+                        continue;
+                    deps = [];
+                    for dep in list(getattr(result[0], "DEPENDENCIES", [])) + configDeps[name]:
+                        if dep not in deps:
+                            deps.append(dep);
+                    times["deps"] = deps;
+                    unknown = [dep for dep in deps if dep not in configDeps];
+                    if len(unknown) > 0:
+                        Log.error("Plugin %s depends on %s which %s not in the plugin list, skipping it." % (name, ", ".join(unknown), "is" if len(unknown) == 1 else "are"));
+                        failed.add(name);
+                        continue;
+                    modules[name] = result[0];
+            # settle what was waiting : skip plugins with a failed dependency, start the ones that have all of theirs
+            isChanged = True;
+            while isChanged:
+                isChanged = False;
+                for name in list(modules):
+                    deps = self._loadTimes[name]["deps"];
+                    brokenDeps = [dep for dep in deps if dep in failed];
+                    if len(brokenDeps) > 0:
+                        Log.error("Plugin %s is skipped, its dependency %s failed to load." % (name, ", ".join(brokenDeps)));
+                        del modules[name];
+                        failed.add(name);
+                        isChanged = True;
+                    elif all(dep in loaded for dep in deps):
+                        futures[pool.submit(self._InitializePlugin, name, modules.pop(name), data, True)] = (name, True);
+        for name in modules:
+            waiting = [dep for dep in self._loadTimes[name]["deps"] if dep not in loaded];
+            Log.error("Plugin %s is skipped, it is in a dependency cycle with %s." % (name, ", ".join(waiting)));
+        return loaded;
+
+    def _ReportLoadTimes(self, loaded : dict):
+        if len(loaded) == 0:
+            return;
+        # walk back from the last plugin ready through the dependency that finished last, the chain the load waited on
+        path = [];
+        name = max(loaded, key = lambda n : self._loadTimes[n]["ready"]);
+        while name != None:
+            path.insert(0, name);
+            times = self._loadTimes[name];
+            blocker = max(times["deps"], key = lambda n : self._loadTimes[n]["ready"], default = None);
+            # the import may have been what held the plugin back rather than any dependency
+            if blocker != None and self._loadTimes[blocker]["ready"] < times["imported"]:
+                blocker = None;
+            name = blocker;
+        total = sum(self._loadTimes[n]["import"] + self._loadTimes[n]["init"] for n in loaded);
+        lines = ["Plugin load times, %.2f seconds of work, * marks the critical path :" % total];
+        for name in self._loadTimes:
+            if name not in loaded:
+                continue;
+            times = self._loadTimes[name];
+            lines.append("%s %-50s import %6.2fs  init %6.2fs  ready at %6.2fs" % ("*" if name in path else " ", name, times["import"], times["init"], times["ready"]));
+        lines.append("Critical path %.2f seconds : %s" % (self._loadTimes[path[-1]]["ready"], " -> ".join(path)));
+        Log.info("\n".join(lines));
+
+    def GetLoadTimes(self) -> dict:
+        return { name : dict(times) for name, times in self._loadTimes.items() };
+
     def Start(self) -> bool:
         rslt = True;
         for targetPlug in self._plugins:
@@ -122,72 +275,215 @@ class PluginManager():
         return rslt;
 
     def LoadPlugin(self, name, data : any):
+        mod, _ = self._ImportPlugin(name);
+        if mod == None:
+            return None;
+        plugin, _ = self._InitializePlugin(name, mod, data, True);
+        return plugin;
+
+    # None unpublishes
+    def _Publish(self, name, plugin : Plugin):
+        with self._availableLock:
+            if plugin != None:
+                self._available[name] = plugin;
+            else:
+                self._available.pop(name, None);
+
+    # returns the module and seconds it took to check its requirements and import it
+    # isReload imports a fresh module even if it's imported already, the previous one is put back if that fails
+    def _ImportPlugin(self, name, isReload : bool = False) -> tuple:
         Log.info("Loading plugin %s...", name);
-        plugin = None;
+        startTime = time.perf_counter();
         plugSpec = importlib.util.find_spec(name);
         if plugSpec == None:
             Log.error("Unable to locate plugin %s" % name);
-            return None;
+            return None, time.perf_counter() - startTime;
+        plugPath = plugSpec.origin;
+        Log.debug("Full path to target module %s" % plugPath);
+        dirPath = os.path.dirname(plugPath);
+        rqsPath = os.path.join(dirPath, "requirements.txt");
+        if os.path.exists(rqsPath):
+            with self._requirementsLock:
+                self._CheckRequirements(name, rqsPath);
         else:
-            plugPath = plugSpec.origin;
-            Log.debug("Full path to target module %s" % plugPath);
-            dirPath = os.path.dirname(plugPath);
-            rqsPath = os.path.join(dirPath, "requirements.txt");
-            if os.path.exists(rqsPath):
-                fr = open(rqsPath, "r");
-                if fr != None:
-                    lines = fr.readlines();
-                    fr.close();
-                    Log.debug("requirements content : %s "  % lines);
-                    missing = [];
-                    for dep in lines:
-                        dep = dep.replace('\n', '');
-                        try:
-                            subprocess.check_call([sys.executable, "-m", "pip", "show", "--quiet", dep]);
-                        except subprocess.CalledProcessError as ex:
-                            if ex.returncode == 1:
-                                missing.append(dep);
-                            else:
-                                Log.error("Unhandled exception on getting pip show of dependancy %s" % dep);
-                    if len(missing) > 0:
-                        Log.debug("Trying to install dependancies for %s" % name);
-                        subprocess.check_call([sys.executable, "-m", "pip", "install",] + missing)
-            else:
-                Log.debug("Requirements file is not found, assuming no specific dependancies."); 
-            
-            mod = importlib.import_module(name, package=None);
-            if mod != None:
-                newPlug = Plugin(mod);
-                startTime = time.time();
-                rslt = newPlug.Inititalize(data);
-                if rslt:
-                    Log.info("Plugin %s has been Loaded and Initialized in %.2f seconds." % (mod.__name__, time.time() - startTime));
-                    plugin = newPlug;
-            else:
-                Log.error("Plugin %s was unable to load." % (name));
-            return plugin;
+            Log.debug("Requirements file is not found, assuming no specific dependancies."); 
+        previous = None;
+        if isReload:
+            previous = sys.modules.pop(name, None);
+            importlib.invalidate_caches();
+        try:
+            with importprofile.Attribute(name):
+                mod = importlib.import_module(name, package=None);
+        except BaseException:
+            if previous != None:
+                sys.modules[name] = previous;
+            raise;
+        if mod == None:
+            Log.error("Plugin %s was unable to load." % (name));
+        return mod, time.perf_counter() - startTime;
+
+    # returns the plugin, None if its OnInitialize failed, and seconds it took
+    # isPublished makes it available to GetPlugin right away, before the other plugins finished loading
+    def _InitializePlugin(self, name, mod, data : any, isPublished : bool = False) -> tuple:
+        newPlug = Plugin(mod);
+        startTime = time.perf_counter();
+        with importprofile.Attribute(name):
+            rslt = newPlug.Inititalize(data);
+        elapsed = time.perf_counter() - startTime;
+        if rslt:
+            Log.info("Plugin %s has been Loaded and Initialized in %.2f seconds." % (mod.__name__, elapsed));
+            if isPublished:
+                self._Publish(name, newPlug);
+            return newPlug, elapsed;
+        Log.error("Plugin %s failed to initialize." % name);
+        return None, elapsed;
+
+    # installed distributions are checked in process, pip only runs when something is missing
+    def _CheckRequirements(self, name, rqsPath):
+        with open(rqsPath, "r", encoding="utf-8") as fr:
+            content = fr.read();
+        if self._manifest.IsSatisfied(rqsPath, content):
+            Log.debug("Requirements of %s unchanged and satisfied." % name);
+            return;
+        lines = requirements.GetRequirementLines(content);
+        Log.debug("requirements content : %s "  % lines);
+        missing = requirements.GetMissing(lines);
+        if len(missing) > 0:
+            Log.info("Trying to install dependancies %s for %s" % (str(missing), name));
+            try:
+                subprocess.check_call([sys.executable, "-m", "pip", "install",] + missing);
+            except subprocess.CalledProcessError as ex:
+                Log.error("Failed to install dependancies for %s : %s" % (name, str(ex)));
+            importlib.invalidate_caches();
+            self._manifest.InvalidateEnvironment();
+            missing = requirements.GetMissing(missing);
+        if len(missing) == 0:
+            self._manifest.Record(rqsPath, content);
+        else:
+            Log.warning("Dependancies %s of %s are still missing." % (str(missing), name));
 
     def Finish(self):
         if not self._isFinished:
             Log.info("Finishing plugin manager...");
+            with self._reloadLock:
+                reloads = list(self._reloads.values());
+            for thread in reloads:
+                thread.join();
+            while not self._reloadResults.empty():
+                newPlugin = self._reloadResults.get_nowait()[2];
+                if newPlugin != None:
+                    newPlugin.Finish(); # initialized but never started
             for plugin in self._plugins:
-                self._plugins[plugin].Finish();
+                if not self._plugins[plugin].IsFinished():
+                    self._plugins[plugin].Finish();
             self._plugins.clear();
+            with self._availableLock:
+                self._available.clear();
             self._isFinished = True;
             self._isInit = False;
             Log.info("Finished plugin manager.");
 
     def Loop(self):
+        if not self._reloadResults.empty():
+            self._ProcessReloads();
         for plugin in self._plugins:
             self._plugins[plugin].Loop();
 
+    def ReloadPlugin(self, name, callback = None) -> bool:
+        """
+        Reloads a plugin while the others keep running. The module is imported again on a thread, the running
+        plugin keeps getting events meanwhile and stays if the import fails. Then the old plugin is detached,
+        hands over its state through its optional OnReloadSave hook and finishes, and the new one is initialized
+        against the same server data. Loop starts it, passes the state to its optional OnReloadRestore hook and
+        puts it back in its place in the plugin order. callback( name, isReloaded ) is called from Loop at the end.
+        Returns False when the plugin isn't loaded or is already reloading.
+        """
+        if not self._isInit or name not in self._plugins:
+            Log.error("Unable to reload plugin %s, it is not loaded." % name);
+            return False;
+        with self._reloadLock:
+            if name in self._reloads:
+                Log.warning("Plugin %s is already reloading." % name);
+                return False;
+            thread = threading.Thread(target = self._ReloadThreadHandler, args = (name, self._plugins[name], callback), name = "PluginReload", daemon = True);
+            self._reloads[name] = thread;
+        Log.info("Reloading plugin %s..." % name);
+        thread.start();
+        return True;
+
+    def IsReloading(self, name) -> bool:
+        with self._reloadLock:
+            return name in self._reloads;
+
+    def _ReloadThreadHandler(self, name, oldPlugin : Plugin, callback):
+        startTime = time.perf_counter();
+        newPlugin = None;
+        state = None;
+        try:
+            mod, _ = self._ImportPlugin(name, isReload = True);
+            with self._requirementsLock:
+                self._manifest.Save();
+            if mod != None:
+                oldPlugin.Detach();
+                try:
+                    state = oldPlugin.SaveState();
+                except Exception as ex:
+                    Log.error("Exception [%s] caught saving state of plugin [%s]\n %s", str(ex), name, traceback.format_exc());
+                oldPlugin.Finish();
+                # the new module registers its !help entries again from OnInitialize
+                if hasattr(self._data, "UnregisterCommands"):
+                    for var in serverdata.COMMAND_VARS:
+                        self._data.UnregisterCommands(var, owner = name);
+                newPlugin, _ = self._InitializePlugin(name, mod, self._data);
+        except Exception as ex:
+            Log.error("Exception [%s] caught reloading plugin [%s]\n %s", str(ex), name, traceback.format_exc());
+        self._reloadResults.put((name, oldPlugin, newPlugin, state, callback, startTime));
+
+    # main thread side of reloads : start the new plugins and put them in place of the old ones
+    def _ProcessReloads(self):
+        while not self._reloadResults.empty():
+            name, oldPlugin, newPlugin, state, callback, startTime = self._reloadResults.get_nowait();
+            with self._reloadLock:
+                del self._reloads[name];
+            isReloaded = False;
+            if newPlugin != None:
+                try:
+                    isReloaded = newPlugin.Start();
+                    if isReloaded:
+                        newPlugin.RestoreState(state);
+                except Exception as ex:
+                    Log.error("Exception [%s] caught starting reloaded plugin [%s]\n %s", str(ex), name, traceback.format_exc());
+                    isReloaded = False;
+                if isReloaded:
+                    self._plugins[name] = newPlugin; # same key, keeps its place in the order
+                    self._Publish(name, newPlugin);
+                    Log.info("Plugin %s has been reloaded in %.2f seconds." % (name, time.perf_counter() - startTime));
+                    dependents = [n for n in self._plugins if name in self._loadTimes.get(n, {}).get("deps", [])];
+                    if len(dependents) > 0:
+                        Log.warning("Plugins %s depend on %s and may hold on to its previous exports, reload them as well." % (", ".join(dependents), name));
+                else:
+                    newPlugin.Finish();
+            if not isReloaded and oldPlugin.IsDetached():
+                Log.error("Plugin %s failed to reload and is unloaded." % name);
+                del self._plugins[name];
+                self._Publish(name, None);
+            elif not isReloaded:
+                Log.error("Plugin %s failed to reload, the running one is kept." % name);
+            if callback != None:
+                callback(name, isReloaded);
+
     def Event(self, event):
         for plugin in self._plugins:
             if self._plugins[plugin].Event(event): # handle hard capture return
                 return;
 
+    # loaded plugin paths matching query : the exact path, else the path or its last part ignoring case
+    def FindPlugins(self, query : str) -> list[str]:
+        if query in self._plugins:
+            return [query];
+        query = query.lower();
+        return [name for name in self._plugins if name.lower() == query or name.rsplit(".", 1)[-1].lower() == query];
+
     def GetPlugin(self, plugName):
-        if plugName in self._plugins:
-            return self._plugins[plugName];
-        else:
-            return None;
+        with self._availableLock:
+            return self._available.get(plugName, None);
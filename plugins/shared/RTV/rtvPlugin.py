@@ -50,10 +50,10 @@ import json
 import logging
 import os
 import re
+from bisect import bisect_left, bisect_right
 from math import ceil, floor
 from random import sample
 from time import sleep, time
-from zipfile import ZipFile
 
 # Import Godfinger Event system and shared libraries
 import godfingerEvent
@@ -61,6 +61,7 @@ import lib.shared.client as client
 import lib.shared.config as config
 import lib.shared.player as player
 import lib.shared.serverdata as serverdata
+import lib.shared.assetcatalog as assetcatalog
 import lib.shared.teams as teams
 import lib.shared.colors as colors
 from lib.shared.player import Player
@@ -78,7 +79,6 @@ DEFAULT_CFG = None
 
 # Fallback configuration if config file doesn't exist
 CONFIG_FALLBACK = '''{
-    "MBIIPath": "your/mbii/path/here",
     "pluginThemeColor": "green",
     "MessagePrefix": "[RTV]^7: ",
     "RTVPrefix": "!",
@@ -255,39 +255,60 @@ class MapContainer(object):
         self._mapCount = 0
         self._mapDict = {}
         self._pages = []
+        self._pageStarts = [] # name of the first map of each page
         self.plugin : RTV = pluginInstance
         
         # Get configuration from plugin instance
-        primaryMapList = [x.lower() for x in self.plugin._config.cfg["rtv"]["primaryMaps"]]
-        secondaryMapList = [x.lower() for x in self.plugin._config.cfg["rtv"]["secondaryMaps"]]
-        mapBanList = [x.lower() for x in self.plugin._config.cfg["rtv"]["mapBanList"]]
-        useSecondaryMaps = self.plugin._config.cfg["rtv"]["useSecondaryMaps"]
-        automaticMaps = self.plugin._config.cfg["rtv"]["automaticMaps"]
+        self._primaryMapList = [x.lower() for x in self.plugin._config.cfg["rtv"]["primaryMaps"]]
+        self._secondaryMapList = [x.lower() for x in self.plugin._config.cfg["rtv"]["secondaryMaps"]]
+        self._mapBanList = [x.lower() for x in self.plugin._config.cfg["rtv"]["mapBanList"]]
+        self._useSecondaryMaps = self.plugin._config.cfg["rtv"]["useSecondaryMaps"]
+        self._automaticMaps = self.plugin._config.cfg["rtv"]["automaticMaps"]
         
-        # Process maps based on configuration
-        if automaticMaps:
-            # Include all maps with auto priority
-            for m in mapArray:
-                m.SetPriority(MapPriorityType.MAPTYPE_AUTO)
+        # Process maps based on configuration, kept sorted by name so pages can be rebuilt from the first changed one
+        for m in mapArray:
+            if self._Accept(m):
                 self._mapDict[m.GetMapName()] = m
-        else:
-            # Filter maps based on primary/secondary lists
-            for m in mapArray:
-                if m.GetMapName().lower() in primaryMapList:
-                    m.SetPriority(MapPriorityType.MAPTYPE_PRIMARY)
-                    self._mapDict[m.GetMapName()] = m
-                elif m.GetMapName().lower() in secondaryMapList and useSecondaryMaps > 0:
-                    m.SetPriority(MapPriorityType.MAPTYPE_SECONDARY)
-                    self._mapDict[m.GetMapName()] = m
-        
-        # Apply ban list
-        for m in list(self._mapDict.keys()):
-            mLower = m.lower()
-            if (mLower in mapBanList):
-                del self._mapDict[m]
+        self._mapDict = dict(sorted(self._mapDict.items()))
         
         self._mapCount = len(self._mapDict.keys())
         self._CreatePages()
+
+    def _Accept(self, m : Map) -> bool:
+        """Apply the map lists and ban list to a map, sets its priority when it's accepted"""
+        mLower = m.GetMapName().lower()
+        if mLower in self._mapBanList:
+            return False
+        if self._automaticMaps:
+            # Include all maps with auto priority
+            m.SetPriority(MapPriorityType.MAPTYPE_AUTO)
+            return True
+        # Filter maps based on primary/secondary lists
+        if mLower in self._primaryMapList:
+            m.SetPriority(MapPriorityType.MAPTYPE_PRIMARY)
+            return True
+        elif mLower in self._secondaryMapList and self._useSecondaryMaps > 0:
+            m.SetPriority(MapPriorityType.MAPTYPE_SECONDARY)
+            return True
+        return False
+
+    def ApplyChanges(self, addedMaps : list[Map], removedNames : list[str]) -> int:
+        """Add and remove maps after archives changed, only the pages from the first affected map on are rebuilt. Returns how many maps changed"""
+        changed = []
+        for name in removedNames:
+            if name in self._mapDict:
+                del self._mapDict[name]
+                changed.append(name)
+        for m in addedMaps:
+            if self._Accept(m):
+                self._mapDict[m.GetMapName()] = m
+                changed.append(m.GetMapName())
+        if len(changed) == 0:
+            return 0
+        self._mapDict = dict(sorted(self._mapDict.items()))
+        self._mapCount = len(self._mapDict.keys())
+        self._CreatePages(min(changed))
+        return len(changed)
     
     def GetAllMaps(self) -> list[Map]:
         """Get all available maps"""
@@ -328,20 +349,34 @@ class MapContainer(object):
                 return self._mapDict[m]
         return None
 
-    def _CreatePages(self) -> None:
-        """Generate cached pages for map list"""
-        pages = []
+    def _CreatePages(self, fromName : str = None) -> None:
+        """Generate cached pages for map list, with fromName the pages before the one holding it are kept"""
+        names = list(self._mapDict.keys())
+        pageIndex = 0
+        if fromName is not None:
+            pageIndex = max(bisect_right(self._pageStarts, fromName) - 1, 0)
+        if pageIndex > 0:
+            # page breaks only depend on the maps before them, so everything up to this page is unchanged
+            start = bisect_left(names, self._pageStarts[pageIndex])
+        else:
+            start = 0
+        pages = self._pages[:pageIndex]
+        pageStarts = self._pageStarts[:pageIndex]
         pageStr = ""
-        for map in self._mapDict.values():
+        for name in names[start:]:
+            if len(pageStr) == 0:
+                pageStarts.append(name)
             if len(pageStr) < self.plugin._config.cfg["maxMapPageSize"]:
-                pageStr += map.GetMapName() + ", "
+                pageStr += name + ", "
             else:
                 pageStr = pageStr[:-2]
                 pages.append(pageStr)
-                pageStr = map.GetMapName() + ", "
+                pageStr = name + ", "
+                pageStarts.append(name)
         if len(pageStr) > 2:
             pages.append(pageStr[:-2])
         self._pages = pages
+        self._pageStarts = pageStarts
     
     def GetPageCount(self) -> int:
         """Get total number of pages"""
@@ -434,7 +469,7 @@ class RTV(object):
         self._messagePrefix : str = colors.COLOR_CODES[self._themeColor] + self._config.cfg["MessagePrefix"]
         
         # Map management
-        self._mapContainer = MapContainer(GetAllMaps(), self)
+        self._mapContainer = MapContainer(GetAllMaps(serverData.assetCatalog), self)
         
         # Command definitions
         self._commandList = \
@@ -1208,7 +1243,19 @@ class RTV(object):
             else:
                 Log.warning(f"Player ID {dcPlayerId} does not exist in RTV players but there was an attempt to remove it")
         return False
-    
+
+    def OnAssetsChanged(self, assets : dict) -> bool:
+        """Handle pk3 archives changing while running - update the map list with the maps that were added or removed"""
+        maps = assets.get(assetcatalog.AssetCatalog.MAPS)
+        if maps is None:
+            return False
+        # a changed asset comes from another archive now, replace its entry
+        removedNames = [x.GetName().lower() for x in maps["removed"] + maps["changed"]]
+        addedMaps = [Map(x.GetName().lower(), x.GetFilename()) for x in maps["added"] + maps["changed"]]
+        count = self._mapContainer.ApplyChanges(addedMaps, removedNames)
+        Log.info(f"Map list updated, {len(maps['added'])} added, {len(maps['removed'])} removed, {count} entries changed, {self._mapContainer.GetMapCount()} maps available")
+        return False
+
     def OnEmptyServer(self, data, isStartup):
         """Handle empty server event - switch to default map/mode"""
         doMap = self._config.cfg["rtv"]["emptyServerMap"]["enabled"]
@@ -1460,25 +1507,18 @@ def OnInitialize(serverData : serverdata.ServerData, exports=None):
     
     # Register SMOD commands
     new_smod_commands = []
-    r_smod_commands = serverData.GetServerVar("registeredSmodCommands")
-    if r_smod_commands:
-        new_smod_commands.extend(r_smod_commands)
-    
     for cmd in PluginInstance._smodCommandList:
         for alias in cmd:
             new_smod_commands.append((alias, PluginInstance._smodCommandList[cmd][0]))
-    SERVER_DATA.SetServerVar("registeredSmodCommands", new_smod_commands)
+    SERVER_DATA.RegisterCommands("registeredSmodCommands", new_smod_commands, __name__)
 
     # Register commands with server
     newVal = []
-    rCommands = PluginInstance._serverData.GetServerVar("registeredCommands")
-    if rCommands != None:
-        newVal.extend(rCommands)
     for cmd in PluginInstance._commandList[teams.TEAM_GLOBAL]:
         for i in cmd:
             if not i.isdecimal():
                 newVal.append((i, PluginInstance._commandList[teams.TEAM_GLOBAL][cmd][0]))
-    SERVER_DATA.SetServerVar("registeredCommands", newVal)
+    SERVER_DATA.RegisterCommands("registeredCommands", newVal, __name__)
     return True  # indicate plugin load success
 
 def API_StartRTVVote(allowNoChange=True):
@@ -1519,50 +1559,18 @@ def OnEvent(event) -> bool:
         return PluginInstance.OnSmsay(event.playerName, event.smodID, event.adminIP, event.message)
     elif event.type == godfingerEvent.GODFINGER_EVENT_TYPE_SERVER_EMPTY:
         return PluginInstance.OnEmptyServer(event.data, event.isStartup)    
+    elif event.type == godfingerEvent.GODFINGER_EVENT_TYPE_ASSETS_CHANGED:
+        return PluginInstance.OnAssetsChanged(event.assets)
     return False
 
-# Helper function to get all map names from currently installed PK3 files located in MBII directory and base directory next to MBII
-def GetAllMaps() -> list[Map]:
-    """Scan PK3 files in MBII directories to discover available maps"""
-    # Start by assuming the MBII directory is not found
-    mbiiDir = os.path.abspath(DEFAULT_CFG.cfg["MBIIPath"])
-    if not os.path.exists(mbiiDir):
-        # Try to find the MBII directory relatively (this is now the primary method)
-        Log.info("Attempting to find MBII directory relative to the current working directory...")
-        searchDir = os.getcwd()
-        while True:
-            if os.path.exists(os.path.join(searchDir, "MBII")):
-                mbiiDir = os.path.join(searchDir, "MBII")
-                Log.info(f"SUCCESS! Found MBII directory at {mbiiDir}.")
-                break
-            else:
-                oldDir = searchDir
-                searchDir = os.path.dirname(searchDir)
-                if oldDir == searchDir:
-                    # We've hit the top without finding the directory
-                    Log.error("FAILURE. No MBII directory found through relative search.")
-                    break
-
-    # Check if a path was successfully found
-    if mbiiDir is None:
-        Log.error("Cannot proceed as the MBII directory could not be located.")
+# Helper function to get all maps installed in the MBII and base directories, from the asset catalog godfinger builds at startup
+def GetAllMaps(assetCatalog : assetcatalog.AssetCatalog) -> list[Map]:
+    """Get available maps from the shared asset catalog"""
+    if assetCatalog is None:
+        Log.error("No asset catalog available, the map list will be empty.")
         return []
-
-    mapList = []
-    dirsToProcess = [mbiiDir, os.path.normpath(os.path.join(mbiiDir, "../base"))]; # base comes next so it wont override MBII dir contents if files match
-    for sub_dir in dirsToProcess:
-        for filename in os.listdir(sub_dir):
-            if filename.endswith(".pk3"):
-                with ZipFile(os.path.join(sub_dir, filename)) as file:
-                    zipNameList = file.namelist()
-                    for name in zipNameList:
-                        # Process BSP files as map objects
-                        if name.endswith(".bsp") and not name in [x.GetMapName() for x in mapList]:
-                            path = name
-                            name = name.lower().replace("maps/", "").replace(".bsp", "")
-                            newMap = Map(name, path)
-                            mapList.append(newMap)
-    return mapList
+    # map names are unique in the catalog, the archive that wins each path is the one the server loads
+    return [Map(asset.GetName().lower(), asset.GetFilename()) for asset in assetCatalog.GetMaps()]
 
 
 if __name__ == "__main__":
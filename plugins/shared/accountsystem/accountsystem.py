@@ -10,7 +10,7 @@ from time import time
 from typing import Dict, List, Optional
 from godfingerEvent import Event
 from lib.shared.serverdata import ServerData
-from database import DatabaseManager
+from database import DatabaseManager, MigrationRunner
 from lib.shared.player import Player
 import lib.shared.teams as teams
 import lib.shared.colors as colors
@@ -23,11 +23,6 @@ DB_NAME = os.path.basename(DB_PATH)
 Log = logging.getLogger(__name__)
 
 
-def escape_sql_apostrophes(s: str) -> str:
-    """Escapes single apostrophes in a string for SQL insertion by doubling them."""
-    return s.replace("'", "''")
-
-
 class Account:
 
     def __init__(self, user_id: int, player_id: int, player_name: str,
@@ -113,16 +108,22 @@ class AccountManager:
             last_login TIMESTAMP
         )
         """
-        self.accounts_db.ExecuteQuery(create_user_credentials_table)
+        migrations = MigrationRunner(self.accounts_db, "accounts")
+        migrations.Register(1, "user_credentials table", [create_user_credentials_table])
+        # load_account looks up by name and ip, create_account by name alone, both served by the same index
+        migrations.Register(2, "index user_credentials by player_name, ip_address",
+                            ["CREATE INDEX IF NOT EXISTS idx_user_credentials_name_ip ON user_credentials (player_name, ip_address)"])
+        if not migrations.Run():
+            Log.error("Failed to migrate accounts database")
 
     def get_account_by_user_id(self, user_id: int) -> Optional[Dict]:
         """Retrieve account data from database by user_id"""
-        query = f"""
+        query = """
         SELECT user_id, player_name, ip_address, last_login_ip, totp_secret, last_login
         FROM user_credentials
-        WHERE user_id = {user_id}
+        WHERE user_id = ?
         """
-        result = self.accounts_db.ExecuteQuery(query, withResponse=True)
+        result = self.accounts_db.ExecuteQuery(query, withResponse=True, params=(user_id,))
         if not result or len(result) == 0:
             return None
         data = {
@@ -143,9 +144,8 @@ class AccountManager:
 
     def load_account(self, player_name: str,
                      ip_address: str, client: Optional[Player] = None) -> Optional[Account]:
-        esc_name = escape_sql_apostrophes(player_name)
-        query = f"SELECT user_id, player_name, ip_address, last_login_ip, totp_secret, last_login FROM user_credentials WHERE player_name = '{esc_name}' AND ip_address = '{ip_address}'"
-        result = self.accounts_db.ExecuteQuery(query, withResponse=True)
+        query = "SELECT user_id, player_name, ip_address, last_login_ip, totp_secret, last_login FROM user_credentials WHERE player_name = ? AND ip_address = ?"
+        result = self.accounts_db.ExecuteQuery(query, withResponse=True, params=(player_name, ip_address))
         if result and len(result) > 0:
             res = result[0]
             user_id = res[0]
@@ -161,12 +161,12 @@ class AccountManager:
             new_acc.last_login = last_login
 
             # Update last_login and last_login_ip in the database
-            update_query = f"""
+            update_query = """
                 UPDATE user_credentials
-                SET last_login = CURRENT_TIMESTAMP, last_login_ip = '{ip_address}'
-                WHERE user_id = {user_id}
+                SET last_login = CURRENT_TIMESTAMP, last_login_ip = ?
+                WHERE user_id = ?
             """
-            self.accounts_db.ExecuteQuery(update_query)
+            self.accounts_db.ExecuteQuery(update_query, params=(ip_address, user_id))
             return new_acc
         else:
             Log.error("Unable to retrieve new user ID from database")
@@ -177,14 +177,13 @@ class AccountManager:
         """Create a new account"""
 
         totp_secret = os.urandom(16).hex()
-        esc_name = escape_sql_apostrophes(player_name)
-        insert_query = f"""
+        insert_query = """
         INSERT INTO user_credentials (player_name, ip_address, last_login_ip, totp_secret)
-        VALUES ('{esc_name}', '{ip_address}', '{ip_address}', '{totp_secret}')
+        VALUES (?, ?, ?, ?)
         """
-        self.accounts_db.ExecuteQuery(insert_query)
-        query = f"SELECT user_id FROM user_credentials WHERE player_name = '{esc_name}'"
-        result = self.accounts_db.ExecuteQuery(query, withResponse=True)
+        self.accounts_db.ExecuteQuery(insert_query, params=(player_name, ip_address, ip_address, totp_secret))
+        query = "SELECT user_id FROM user_credentials WHERE player_name = ?"
+        result = self.accounts_db.ExecuteQuery(query, withResponse=True, params=(player_name,))
         if result and len(result) > 0:
             user_id = result[0][0]
             Log.info(
@@ -403,25 +402,18 @@ class AccountPlugin:
         }
         # Register commands with server
         newVal = []
-        rCommands = self.server_data.GetServerVar("registeredCommands")
-        if rCommands != None:
-            newVal.extend(rCommands)
         for cmd in self._command_list[teams.TEAM_GLOBAL]:
             for i in cmd:
                 if not i.isdecimal():
                     newVal.append((i, self._command_list[teams.TEAM_GLOBAL][cmd][0]))
-        self.server_data.SetServerVar("registeredCommands", newVal)
+        self.server_data.RegisterCommands("registeredCommands", newVal, __name__)
 
         # Register SMOD commands
         new_smod_commands = []
-        r_smod_commands = self.server_data.GetServerVar("registeredSmodCommands")
-        if r_smod_commands:
-            new_smod_commands.extend(r_smod_commands)
-        
         for cmd in self._smodCommandList:
             for alias in cmd:
                 new_smod_commands.append((alias, self._smodCommandList[cmd][0]))
-        self.server_data.SetServerVar("registeredSmodCommands", new_smod_commands)
+        self.server_data.RegisterCommands("registeredSmodCommands", new_smod_commands, __name__)
 
     def _handle_get_uid(self, client, team_id, args):
         pid = client.GetId()
@@ -9,11 +9,12 @@ import logging
 import os
 import time
 from typing import Dict, Optional
-from zipfile import ZipFile
 from random import sample
+from bisect import bisect_left
 from godfingerEvent import Event
 from lib.shared.serverdata import ServerData
-from database import DatabaseManager, ADatabase
+from lib.shared.assetcatalog import AssetCatalog
+from database import DatabaseManager, ADatabase, MigrationRunner
 from lib.shared.player import Player
 import lib.shared.teams as teams
 import lib.shared.colors as colors
@@ -24,6 +25,9 @@ import json # Required for json.loads()
 # Initialize logger
 Log = logging.getLogger(__name__)
 
+# Plugins that must be initialized before this one
+DEPENDENCIES = ["plugins.shared.accountsystem.accountsystem"]
+
 # Global server data instance
 SERVER_DATA = None
 
@@ -55,7 +59,6 @@ CONFIG_FALLBACK = \
         "enabled": false,
         "credits": 10
     },
-    "MBIIPath": "your/mbii/path/here",
     "siegeteamBanList": [],
     "siegeteamBanListIsWhitelist": false,
     "priceOverride": {},
@@ -179,28 +182,51 @@ class SiegeTeamContainer:
         self.plugin = plugin_instance
         self._teams = {}
         self._pages = []
-        ban_list = [x.lower() for x in plugin_instance.config.cfg.get("siegeteamBanList", [])]
-        is_whitelist = plugin_instance.config.cfg.get("siegeteamBanListIsWhitelist", False)
-        price_override = plugin_instance.config.cfg.get("priceOverride", {})
-        default_price = plugin_instance.config.cfg.get("defaultTeamPrice", 1000)
+        self._page_starts = [] # lower case name of the first team of each page
+        self._ban_list = [x.lower() for x in plugin_instance.config.cfg.get("siegeteamBanList", [])]
+        self._is_whitelist = plugin_instance.config.cfg.get("siegeteamBanListIsWhitelist", False)
+        self._price_override = plugin_instance.config.cfg.get("priceOverride", {})
+        self._default_price = plugin_instance.config.cfg.get("defaultTeamPrice", 1000)
         
         for team in team_array:
-            team_lower = team.GetName().lower()
-            is_banned = team_lower in ban_list
+            if self._accept(team):
+                self._teams[team.GetName()] = team
+        
+        self._CreatePages()
 
-            if (is_whitelist and not is_banned) or (not is_whitelist and is_banned):
-                continue
-            
-            # Set default price
-            team._price = default_price
+    def _accept(self, team):
+        """Apply the ban list or whitelist to a team and set its price when it's accepted"""
+        team_lower = team.GetName().lower()
+        is_banned = team_lower in self._ban_list
 
-            # Apply price override if exists
-            if team.GetName() in price_override:
-                team._price = price_override[team.GetName()]
-                
-            self._teams[team.GetName()] = team
+        if (self._is_whitelist and not is_banned) or (not self._is_whitelist and is_banned):
+            return False
         
-        self._CreatePages()
+        # Set default price
+        team._price = self._default_price
+
+        # Apply price override if exists
+        if team.GetName() in self._price_override:
+            team._price = self._price_override[team.GetName()]
+        return True
+
+    def apply_changes(self, added_teams, removed_names):
+        """Add and remove teams after archives changed, only the pages from the first affected team on are rebuilt. Returns how many teams changed"""
+        changed = []
+        by_lower = {k.lower(): k for k in self._teams}
+        for name in removed_names:
+            key = by_lower.pop(name.lower(), None)
+            if key is not None:
+                del self._teams[key]
+                changed.append(key.lower())
+        for team in added_teams:
+            if self._accept(team):
+                self._teams[team.GetName()] = team
+                changed.append(team.GetName().lower())
+        if not changed:
+            return 0
+        self._CreatePages(min(changed))
+        return len(changed)
     
     def GetAllTeams(self):
         return list(self._teams.values())
@@ -211,16 +237,25 @@ class SiegeTeamContainer:
     def FindTeamWithName(self, name):
         return self._teams.get(name)
 
-    def _CreatePages(self):
-        self._pages = []
+    def _CreatePages(self, from_name=None):
+        # with from_name only the pages whose contents can change are rebuilt. A page ends at the first team that doesn't fit,
+        # so its break depends on the team right after it, a change at the first team of a page can move the break of the page before
         all_teams = sorted(self.GetAllTeams(), key=lambda t: t.GetName().lower())
+        page_index = 0
+        if from_name is not None:
+            page_index = max(bisect_left(self._page_starts, from_name) - 1, 0)
+        start = 0
+        if page_index > 0:
+            start = bisect_left([t.GetName().lower() for t in all_teams], self._page_starts[page_index])
+        self._pages = self._pages[:page_index]
+        self._page_starts = self._page_starts[:page_index]
         if not all_teams:
             return
 
         page_str = ""
         max_len = 900 
 
-        for team in all_teams:
+        for team in all_teams[start:]:
             team_name = team.GetName()
             team_price = team.GetPrice()
             entry = f"{team_name} ({colors.ColorizeText(str(team_price), self.plugin.themecolor)})"
@@ -230,9 +265,11 @@ class SiegeTeamContainer:
                     page_str += ", " + entry
                 else:
                     page_str = entry
+                    self._page_starts.append(team_name.lower())
             else:
                 self._pages.append(page_str)
                 page_str = entry
+                self._page_starts.append(team_name.lower())
         
         if page_str:
             self._pages.append(page_str)
@@ -263,42 +300,18 @@ class SiegeTeam:
     def __str__(self):
         return f"{self._name}"
 
-def GetAllTeams() -> list[SiegeTeam]:
-    """Scan PK3 files in MBII directories to discover available teams"""
-    mbiiDir = os.path.abspath(DEFAULT_CFG.cfg["MBIIPath"])
-    if not os.path.exists(mbiiDir):
-        Log.info("Attempting to find MBII directory relative to the current working directory...")
-        searchDir = os.getcwd()
-        while True:
-            if os.path.exists(os.path.join(searchDir, "MBII")):
-                mbiiDir = os.path.join(searchDir, "MBII")
-                Log.info(f"SUCCESS! Found MBII directory at {mbiiDir}.")
-                break
-            else:
-                oldDir = searchDir
-                searchDir = os.path.dirname(searchDir)
-                if oldDir == searchDir:
-                    Log.error("FAILURE. No MBII directory found through relative search.")
-                    break
-
-    if mbiiDir is None:
-        Log.error("Cannot proceed as the MBII directory could not be located.")
+def GetAllTeams(assetCatalog : AssetCatalog) -> list[SiegeTeam]:
+    """Get available teams from the shared asset catalog"""
+    if assetCatalog is None:
+        Log.error("No asset catalog available, the team list will be empty.")
         return []
+    return [team for team in (TeamFromAsset(asset) for asset in assetCatalog.GetTeams()) if team is not None]
 
-    team_list = []
-    dirsToProcess = [mbiiDir, os.path.normpath(os.path.join(mbiiDir, "../base"))];
-    for sub_dir in dirsToProcess:
-        for filename in os.listdir(sub_dir):
-            if filename.endswith(".pk3"):
-                try:
-                    with ZipFile(os.path.join(sub_dir, filename)) as pk3:
-                        for name in pk3.namelist():
-                            if name.endswith(".mbtc") and not name.startswith("Sup_"):
-                                team_name = os.path.basename(name).replace(".mbtc", "")
-                                team_list.append(SiegeTeam(team_name, name))
-                except Exception as e:
-                    logging.error(f"Error reading PK3 {filename}: {str(e)}")
-    return team_list
+def TeamFromAsset(asset) -> SiegeTeam:
+    # Sup_ team configs are support files, not playable teams
+    if asset.GetName().startswith("Sup_"):
+        return None
+    return SiegeTeam(asset.GetName(), asset.GetFilename())
 
 class BankingPlugin:
 
@@ -306,8 +319,6 @@ class BankingPlugin:
 
         # START OF MODIFIED CODE FOR CONFIG LOADING
         # Check if config loading failed and use fallback data
-        if DEFAULT_CFG is None or DEFAULT_CFG.cfg.get("MBIIPath") in [None, "your/mbii/path/here"]:
-            Log.error("MBIIPath is not configured in bankingConfig.json. The GetAllTeams function will not work.")
         if DEFAULT_CFG is None:
             Log.warning("Default config failed to load from file. Using fallback configuration.")
             # Create a minimal mock config object to prevent AttributeError: 'NoneType' object has no attribute 'cfg'
@@ -337,7 +348,7 @@ class BankingPlugin:
         self.active_bounties : dict[int, Bounty] = {}  # target_id: Bounty
         self.player_rounds : dict[int, int] = {}  # player_id: rounds_played
         self.player_class_by_pid : dict[int, str] = {}  # player_id: current character/class name
-        self.team_container = SiegeTeamContainer(GetAllTeams(), self)
+        self.team_container = SiegeTeamContainer(GetAllTeams(server_data.assetCatalog), self)
         self._register_commands()
         # self.initialize_banking_table()
 
@@ -366,7 +377,9 @@ class BankingPlugin:
                 ("teamlist", "tl"): ("!teamlist <page> - List available teams with prices",
                                       self._handle_teamlist),
                 ("teamsearch", "ts"): ("!teamsearch <term> - Search for teams by name",
-                                          self._handle_teamsearch)
+                                          self._handle_teamsearch),
+                ("teaminfo", "ti"): ("!teaminfo <teamname> - Show a team's price and classes",
+                                      self._handle_teaminfo)
             },
             teams.TEAM_GOOD: {},
             teams.TEAM_EVIL: {},
@@ -381,25 +394,18 @@ class BankingPlugin:
         }
         # Register commands with server
         newVal = []
-        rCommands = self.server_data.GetServerVar("registeredCommands")
-        if rCommands != None:
-            newVal.extend(rCommands)
         for cmd in self._command_list[teams.TEAM_GLOBAL]:
             for i in cmd:
                 if not i.isdecimal():
                     newVal.append((i, self._command_list[teams.TEAM_GLOBAL][cmd][0]))
-        self.server_data.SetServerVar("registeredCommands", newVal)
+        self.server_data.RegisterCommands("registeredCommands", newVal, __name__)
 
         # Register SMOD commands
         new_smod_commands = []
-        r_smod_commands = self.server_data.GetServerVar("registeredSmodCommands")
-        if r_smod_commands:
-            new_smod_commands.extend(r_smod_commands)
-        
         for cmd in self._smodCommandList:
             for alias in cmd:
                 new_smod_commands.append((alias, self._smodCommandList[cmd][0]))
-        self.server_data.SetServerVar("registeredSmodCommands", new_smod_commands)
+        self.server_data.RegisterCommands("registeredSmodCommands", new_smod_commands, __name__)
 
     def has_pending_action(self, player_id: int) -> bool:
         """Check if player has any pending actions"""
@@ -687,11 +693,15 @@ class BankingPlugin:
             ORDER BY b.credits DESC
             LIMIT 10
         """
-        result = db.ExecuteQuery(query, withResponse=True)
+        # runs off the main loop, the reply is sent from the callback on the next tick
+        db.Submit(query, callback=self._on_baltop_result)
+        return True
 
+    def _on_baltop_result(self, future) -> None:
+        result = future.result()
         if not result:
             self.SvSay("No balance data available")
-            return True
+            return
 
         top_players = []
         for row in result:
@@ -701,7 +711,6 @@ class BankingPlugin:
             top_players.append(f"{name}^7 (ID: {uid}): {colors.ColorizeText('$' + str(credits_val), self.themecolor)}")
 
         self.Say("Top 10 Credits Balances: " + ", ".join(top_players))
-        return True
 
     def _handle_credrank(self, player: Player, team_id: int, args: list[str]) -> bool:
         """Handle !credrank command"""
@@ -718,29 +727,25 @@ class BankingPlugin:
             self.SvTell(player_id, "Could not retrieve your balance.")
             return True
 
-        # Get player's rank
-        rank_query = f"""
-            SELECT COUNT(*) + 1 as rank
-            FROM banking
-            WHERE credits > {credits}
+        # Get player's rank and the total in one statement, off the main loop
+        rank_query = """
+            SELECT (SELECT COUNT(*) + 1 FROM banking WHERE credits > ?), (SELECT COUNT(*) FROM banking)
         """
-        rank_result = self.db_connection.ExecuteQuery(rank_query, withResponse=True)
-
-        # Get total players
-        total_query = "SELECT COUNT(*) FROM banking"
-        total_result = self.db_connection.ExecuteQuery(total_query, withResponse=True)
+        self.db_connection.Submit(rank_query, params=(credits,),
+                                  callback=lambda future: self._on_credrank_result(future, player_id, credits))
+        return True
 
-        if rank_result and total_result:
-            rank = rank_result[0][0]
-            total = total_result[0][0]
+    def _on_credrank_result(self, future, player_id: int, credits: int) -> None:
+        result = future.result()
+        if result:
+            rank = result[0][0]
+            total = result[0][1]
             credits_text = colors.ColorizeText(str(credits), self.themecolor)
 
             self.SvTell(player_id, f"Your balance rank: #{rank} of {total} (Credits: {credits_text})")
         else:
             self.SvTell(player_id, "Rank data unavailable.")
 
-        return True
-
     def _handle_mod_credits(self, playerName, smodId, adminIP, cmdArgs):
         """Handle smod !modifycredits command - modify a player's credits"""
         Log.info(f"SMOD {playerName} (ID: {smodId}, IP: {adminIP}) executing modifycredits command with args: {cmdArgs}")
@@ -960,7 +965,14 @@ class BankingPlugin:
                     credits INTEGER DEFAULT 0
                 )
             """
-            self.db_connection.ExecuteQuery(create_table_query)
+            migrations = MigrationRunner(self.db_connection, "banking")
+            migrations.Register(1, "banking table", [create_table_query])
+            # !baltop orders by credits and !credrank counts the balances above one, without it both scan the table
+            migrations.Register(2, "index banking by credits",
+                                ["CREATE INDEX IF NOT EXISTS idx_banking_credits ON banking (credits)"])
+            if not migrations.Run():
+                Log.error("Failed to migrate banking table")
+                return False
             Log.info("Banking table initialized successfully.")
             return True
         except Exception as e:
@@ -984,16 +996,16 @@ class BankingPlugin:
             return None
 
         user_id = account.user_id
-        query = f"SELECT credits FROM banking WHERE user_id = {user_id}"
-        result = self.db_connection.ExecuteQuery(query, withResponse=True)
+        query = "SELECT credits FROM banking WHERE user_id = ?"
+        result = self.db_connection.ExecuteQuery(query, withResponse=True, params=(user_id,))
         if result and len(result) > 0:
             credits = result[0][0]
             self.set_account_data_val_by_pid(player_id, 'credits', credits)
             return credits
         else:
             self.set_account_data_val_by_pid(player_id, 'credits', 0)
-            query = f"INSERT INTO banking (user_id, credits) VALUES ({user_id}, {0})"
-            result = self.db_connection.ExecuteQuery(query, withResponse=True)
+            query = "INSERT INTO banking (user_id, credits) VALUES (?, 0)"
+            result = self.db_connection.ExecuteQuery(query, withResponse=True, params=(user_id,))
             return 0
 
     def set_credits(self, player_id: int, amount: int) -> bool:
@@ -1011,8 +1023,8 @@ class BankingPlugin:
 
         # Update database
         db = self.db_connection
-        query = f"UPDATE banking SET credits = {amount} WHERE user_id = {user_id}"
-        result = db.ExecuteQuery(query)
+        query = "UPDATE banking SET credits = ? WHERE user_id = ?"
+        result = db.ExecuteQuery(query, params=(amount, user_id))
 
         # Update account_data cache
         self.set_account_data_val_by_pid(player_id, 'credits', amount)
@@ -1309,6 +1321,37 @@ class BankingPlugin:
         self.Say(f"Available Teams (Page {page_num}/{page_count}): {page_content}")
         return True
 
+    def _handle_teaminfo(self, player: Player, team_id: int, args: list[str]) -> bool:
+        """Handle !teaminfo command - show price and classes of a team"""
+        if len(args) < 2:
+            self.SvTell(player.GetId(), 
+                      f"Usage: {colors.ColorizeText('!teaminfo <teamname>', self.themecolor)}")
+            return True
+
+        team_name = ' '.join(args[1:])
+        team = None
+        for available_team in self.team_container.GetAllTeams():
+            if available_team.GetName().lower() == team_name.lower():
+                team = available_team
+                break
+
+        if not team:
+            self.SvTell(player.GetId(), f"Team '{team_name}' not found.")
+            return True
+
+        # team configs are parsed once at startup, this is a cache lookup
+        team_config = None
+        if self.server_data.assetCatalog is not None:
+            team_config = self.server_data.assetCatalog.LoadTeamConfig(team.GetName())
+        price = colors.ColorizeText(str(team.GetPrice()), self.themecolor)
+        if team_config is None:
+            self.SvTell(player.GetId(), f"{team.GetName()} ({price}): no class details available.")
+            return True
+
+        classes = ", ".join(team_config.GetClasses().values())
+        self.SvTell(player.GetId(), f"{team.GetName()} ({price}): {len(team_config.GetClasses())} classes, {team_config.GetClassesAllowed()} allowed: {classes}")
+        return True
+
     def _handle_teamsearch(self, player: Player, team_id: int, args: list[str]) -> bool:
         """Handle !teamsearch command - search for teams by name"""
         try:
@@ -1539,6 +1582,17 @@ class BankingPlugin:
             self.SvTell(event.client.GetId(), f"You have been awarded {self.config.cfg['objectiveCredits']['credits']} credits ({colors.ColorizeText(str(self.get_credits(event.client.GetId())), self.themecolor)}) for completing the objective!")
         return True
 
+    def _on_assets_changed(self, event : Event):
+        teams_diff = event.assets.get(AssetCatalog.TEAMS)
+        if teams_diff is None:
+            return False
+        # a changed asset comes from another archive now, replace its entry
+        removed_names = [x.GetName() for x in teams_diff["removed"] + teams_diff["changed"]]
+        added_teams = [team for team in (TeamFromAsset(x) for x in teams_diff["added"] + teams_diff["changed"]) if team is not None]
+        count = self.team_container.apply_changes(added_teams, removed_names)
+        Log.info(f"Team shop updated, {count} entries changed, {len(self.team_container.GetAllTeams())} teams available")
+        return False
+
     def _on_map_change(self, event : Event):
         # Refund any purchased teams that weren't applied (because RTV didn't happen)
         for team_var in ["team1_purchased_teams", "team2_purchased_teams"]:
@@ -1643,6 +1697,8 @@ def OnEvent(event: Event) -> bool:
         banking_plugin._on_objective(event)
     elif event.type == godfingerEvent.GODFINGER_EVENT_TYPE_MAPCHANGE:
         banking_plugin._on_map_change(event)
+    elif event.type == godfingerEvent.GODFINGER_EVENT_TYPE_ASSETS_CHANGED:
+        banking_plugin._on_assets_changed(event)
     return False
 
 
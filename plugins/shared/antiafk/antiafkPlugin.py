@@ -419,6 +419,26 @@ def OnFinish():
     pass
 
 
+def OnReloadSave():
+    """Hand the spectator round counters over to the reloaded plugin"""
+    if PluginInstance == None:
+        return None
+    return {
+        "players": {pid: (player.GetSpectatorRounds(), player.IsSmodLoggedIn()) for pid, player in PluginInstance._players.items()},
+        "smod_ip_to_client": dict(PluginInstance._smod_ip_to_client)
+    }
+
+
+def OnReloadRestore(state):
+    """Take over the counters of the plugin before the reload, for players that are still connected"""
+    for pid, (spectator_rounds, is_smod_logged_in) in state["players"].items():
+        player = PluginInstance._players.get(pid)
+        if player != None:
+            player._spectator_rounds = spectator_rounds
+            player.SetSmodLoggedIn(is_smod_logged_in)
+    PluginInstance._smod_ip_to_client.update(state["smod_ip_to_client"])
+
+
 def OnEvent(event) -> bool:
     """Route events to appropriate handlers"""
     global PluginInstance
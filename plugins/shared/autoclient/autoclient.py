@@ -27,6 +27,7 @@ import lib.shared.config as config
 import lib.shared.client as client
 import lib.shared.colors as colors
 import lib.shared.teams as teams
+import lib.shared.pswd as pswd
 
 Log = logging.getLogger(__name__)
 
@@ -111,6 +112,8 @@ class AutoClientPlugin:
 
         self._messagePrefix = self.config.cfg.get("messagePrefix", "^6[AutoClient]^7: ")
         self._runtimeEnabled = self.config.cfg.get("enabled", True)
+        self._serverProcessName = self.config.cfg.get("serverProcessName", "mbiided.x86.exe")
+        self._isWatchingServer = False
 
         # Client tracking
         self._fakeClients = {}  # pid -> FakeClient
@@ -136,19 +139,8 @@ class AutoClientPlugin:
         if not IS_WINDOWS:
             return False
 
-        try:
-            # Use tasklist to check for the process
-            process_name = self.config.cfg.get("serverProcessName", "mbiided.x86.exe")
-            result = subprocess.run(
-                ["tasklist", "/FI", f"IMAGENAME eq {process_name}"],
-                capture_output=True,
-                text=True,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            return process_name.lower() in result.stdout.lower()
-        except Exception as e:
-            Log.error(f"Error checking server process: {e}")
-            return False
+        # Watched by the shared process monitor since Start, this doesn't scan the process list
+        return pswd.SharedMonitor.IsRunning(self._serverProcessName)
 
     def _IsLocalhost(self, client_ip: str) -> bool:
         """Check if IP is localhost (fake client)"""
@@ -429,7 +421,8 @@ class AutoClientPlugin:
             self._runtimeEnabled = False
             return True
 
-        if not self._IsServerRunning():
+        self._isWatchingServer = True
+        if not pswd.SharedMonitor.Watch(self._serverProcessName):
             Log.warning("AutoClient: Server process not detected, will wait for it to start")
 
         # Set sv_maxconnections to match maxFakeClients
@@ -461,6 +454,9 @@ class AutoClientPlugin:
         """Called when plugin shuts down"""
         if not IS_WINDOWS:
             return
+        if self._isWatchingServer:
+            pswd.SharedMonitor.Unwatch(self._serverProcessName)
+            self._isWatchingServer = False
 
         # Use PowerShell to force kill all mbii.x86.exe processes
         # This is more reliable than trying to kick/terminate individually
@@ -687,11 +683,11 @@ def OnInitialize(serverData: serverdata.ServerData, exports=None):
     PluginInstance = AutoClientPlugin(serverData)
 
     # Register SMOD commands
-    registeredSmodCommands = serverData.GetServerVar("registeredSmodCommands") or []
+    registeredSmodCommands = []
     for aliases, (help_text, handler) in PluginInstance._smodCommandList.items():
         for alias in aliases:
             registeredSmodCommands.append((alias, help_text))
-    serverData.SetServerVar("registeredSmodCommands", registeredSmodCommands)
+    serverData.RegisterCommands("registeredSmodCommands", registeredSmodCommands, __name__)
 
     return True
 
@@ -171,14 +171,11 @@ def OnInitialize(serverData : serverdata.ServerData, exports = None) -> bool:
         pass;
 
     newCommands = []
-    rChatCommands = SERVER_DATA.GetServerVar("registeredCommands")
-    if rChatCommands is not None:
-        newCommands.extend(rChatCommands)
     for cmd in PluginInstance._commandList[teams.TEAM_GLOBAL]:
         for alias in cmd:
             if not alias.isdecimal():
                 newCommands.append((alias, PluginInstance._commandList[teams.TEAM_GLOBAL][cmd][0]))
-    SERVER_DATA.SetServerVar("registeredCommands", newCommands)
+    SERVER_DATA.RegisterCommands("registeredCommands", newCommands, __name__)
 
     return True; # indicate plugin load success
 
@@ -483,14 +483,11 @@ def OnInitialize(serverData: serverdata.ServerData, exports=None) -> bool:
 
     # Register SMOD commands
     newVal = []
-    rCommands = SERVER_DATA.GetServerVar("registeredSmodCommands")
-    if rCommands != None:
-        newVal.extend(rCommands)
     for cmd in PluginInstance._smodCommandList:
         for alias in cmd:
             if not alias.isdecimal():
                 newVal.append((alias, PluginInstance._smodCommandList[cmd][0]))
-    SERVER_DATA.SetServerVar("registeredSmodCommands", newVal)
+    SERVER_DATA.RegisterCommands("registeredSmodCommands", newVal, __name__)
 
     return True
 
@@ -516,14 +516,11 @@ def OnInitialize(serverData: serverdata.ServerData, exports=None) -> bool:
     
     # Register command help mapping
     newVal = []
-    rCommands = SERVER_DATA.GetServerVar("registeredCommands")
-    if rCommands != None:
-        newVal.extend(rCommands)
     for cmd in PluginInstance._commandList[teams.TEAM_GLOBAL]:
         for alias in cmd:
             if not alias.isdecimal():
                 newVal.append((alias, PluginInstance._commandList[teams.TEAM_GLOBAL][cmd][0]))
-    SERVER_DATA.SetServerVar("registeredCommands", newVal)
+    SERVER_DATA.RegisterCommands("registeredCommands", newVal, __name__)
     
     return True
 
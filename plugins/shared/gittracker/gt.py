@@ -11,10 +11,11 @@ import sys
 import os
 import time
 import shutil
-import psutil
-import requests
 import threading
 import platform
+import lib.shared.lazyimport as lazyimport
+
+requests = lazyimport.LazyModule("requests") # only the commit checks need it, it is slow to import
 
 SERVER_DATA = None;
 GODFINGER = "godfinger"
@@ -781,24 +782,18 @@ def OnInitialize(serverData : serverdata.ServerData, exports = None) -> bool:
     PluginInstance = gitTrackerPlugin(serverData)
 
     newVal = []
-    rCommands = SERVER_DATA.GetServerVar("registeredCommands")
-    if rCommands != None:
-        newVal.extend(rCommands)
     for cmd in PluginInstance._commandList[teams.TEAM_GLOBAL]:
         for alias in cmd:
             if not alias.isdecimal():
                 newVal.append((alias, PluginInstance._commandList[teams.TEAM_GLOBAL][cmd][0]))
-    SERVER_DATA.SetServerVar("registeredCommands", newVal)
+    SERVER_DATA.RegisterCommands("registeredCommands", newVal, __name__)
 
     newVal = []
-    rCommands = SERVER_DATA.GetServerVar("registeredSmodCommands")
-    if rCommands != None:
-        newVal.extend(rCommands)
     for cmd in PluginInstance._smodCommandList:
         for alias in cmd:
             if not alias.isdecimal():
                 newVal.append((alias, PluginInstance._smodCommandList[cmd][0]))
-    SERVER_DATA.SetServerVar("registeredSmodCommands", newVal)
+    SERVER_DATA.RegisterCommands("registeredSmodCommands", newVal, __name__)
 
     return True; # indicate plugin load success
 
@@ -758,6 +758,7 @@ def OnInitialize(serverData : serverdata.ServerData, exports = None) -> bool:
     else:
         Log.info("No persistent cooldown file found, proceeding as normal.")
 
+    thread.start()
     return True
 
 # Called once when platform starts, after platform is done with loading internal data and preparing
@@ -879,5 +880,5 @@ def OnEvent(event) -> bool:
 def run_bot():
     bot.run(BOT_TOKEN)
 
-thread = threading.Thread(target=run_bot, daemon=True)
-thread.start()
\ No newline at end of file
+# started by OnInitialize, not on import
+thread = threading.Thread(target=run_bot, daemon=True)
\ No newline at end of file
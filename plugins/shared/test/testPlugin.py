@@ -76,6 +76,14 @@ def OnLoop():
 def OnFinish():
     pass;
 
+# Optional, called on the plugin being reloaded after it stopped getting events and before OnFinish, whatever it returns goes to OnReloadRestore of the reloaded module
+def OnReloadSave():
+    return MyCoolVariablesTable.myCoolVariable;
+
+# Optional, called on the reloaded module after its OnStart with what OnReloadSave of the previous one returned, use plain data, classes of the previous module are not the new ones
+def OnReloadRestore(state):
+    MyCoolVariablesTable.myCoolVariable = state;
+
 # Called from system on some event raising, return True to indicate event being captured in this module, False to continue tossing it to other plugins in chain
 def OnEvent(event) -> bool:
     #print("Calling OnEvent function from plugin with event %s!" % (str(event)));
@@ -148,24 +148,18 @@ def OnInitialize(serverData : serverdata.ServerData, exports = None) -> bool:
     PluginInstance = TKManagerPlugin(serverData)
     
     newVal = []
-    rCommands = SERVER_DATA.GetServerVar("registeredCommands")
-    if rCommands != None:
-        newVal.extend(rCommands)
     for cmd in PluginInstance._commandList[teams.TEAM_GLOBAL]:
         for alias in cmd:
             if not alias.isdecimal():
                 newVal.append((alias, PluginInstance._commandList[teams.TEAM_GLOBAL][cmd][0]))
-    SERVER_DATA.SetServerVar("registeredCommands", newVal)
+    SERVER_DATA.RegisterCommands("registeredCommands", newVal, __name__)
     
     newVal = []
-    rCommands = SERVER_DATA.GetServerVar("registeredSmodCommands")
-    if rCommands != None:
-        newVal.extend(rCommands)
     for cmd in PluginInstance._smodCommandList:
         for alias in cmd:
             if not alias.isdecimal():
                 newVal.append((alias, PluginInstance._smodCommandList[cmd][0]))
-    SERVER_DATA.SetServerVar("registeredSmodCommands", newVal)
+    SERVER_DATA.RegisterCommands("registeredSmodCommands", newVal, __name__)
     return True; # indicate plugin load success
 
 # Called once when platform starts, after platform is done with loading internal data and preparing
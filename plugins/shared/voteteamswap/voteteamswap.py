@@ -437,25 +437,19 @@ def OnInitialize(serverData: serverdata.ServerData, exports=None) -> bool:
 
     # Register SMOD commands (for !help display)
     newVal = []
-    rCommands = SERVER_DATA.GetServerVar("registeredSmodCommands")
-    if rCommands is not None:
-        newVal.extend(rCommands)
     for cmd in PluginInstance._smodCommandList:
         for alias in cmd:
             if not alias.isdecimal():
                 newVal.append((alias, PluginInstance._smodCommandList[cmd][0]))
-    SERVER_DATA.SetServerVar("registeredSmodCommands", newVal)
+    SERVER_DATA.RegisterCommands("registeredSmodCommands", newVal, __name__)
 
     # Register chat commands (for !help display)
     newCommands = []
-    rChatCommands = SERVER_DATA.GetServerVar("registeredCommands")
-    if rChatCommands is not None:
-        newCommands.extend(rChatCommands)
     for cmd in PluginInstance._commandList[teams.TEAM_GLOBAL]:
         for alias in cmd:
             if not alias.isdecimal():
                 newCommands.append((alias, PluginInstance._commandList[teams.TEAM_GLOBAL][cmd][0]))
-    SERVER_DATA.SetServerVar("registeredCommands", newCommands)
+    SERVER_DATA.RegisterCommands("registeredCommands", newCommands, __name__)
 
     return True
 
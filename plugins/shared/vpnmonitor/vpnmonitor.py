@@ -7,8 +7,10 @@ import lib.shared.config as config;
 import os;
 import database;
 import lib.shared.client as client;
-import requests;
 import ipaddress;
+import lib.shared.lazyimport as lazyimport;
+
+requests = lazyimport.LazyModule("requests"); # only the iphub lookups need it, it is slow to import
 
 SERVER_DATA = None;
 
@@ -124,7 +126,7 @@ class VPNMonitor():
                 return -1;
     
         Log.debug("Getting vpn associated with ip address %s", ip);
-        existing = self._database.ExecuteQuery("SELECT vpn FROM iplist WHERE ip=\""+ip+"\"", True);
+        existing = self._database.ExecuteQuery("SELECT vpn FROM iplist WHERE ip = ?", True, (ip,));
         vpnType = -1;
         if existing == None or len(existing) == 0:
             # not in the database, lets check on VPN detection service
@@ -134,8 +136,7 @@ class VPNMonitor():
                 jsonified = webRequest.json();
                 if "block" in jsonified:
                     vpnType = jsonified["block"];
-                    fmt = "INSERT INTO iplist (ip, vpn) VALUES (%s, %d);" % ("\""+ip+"\"", vpnType);
-                    self._database.ExecuteQuery(fmt);
+                    self._database.ExecuteQuery("INSERT INTO iplist (ip, vpn) VALUES (?, ?);", params = (ip, vpnType));
             else:
                 Log.error("Web request to VPN check service is failed with http code %d", webRequest.status_code);
         else: